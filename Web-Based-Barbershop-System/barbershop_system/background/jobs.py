@@ -0,0 +1,156 @@
+"""
+Database-backed job queue
+
+``enqueue()`` stores a job row (optionally scheduled and de-duplicated);
+the ``run_jobs`` worker claims due jobs and runs them on a thread pool so
+requests never wait on emails or other slow work.
+"""
+import logging
+import os
+import socket
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+from .outbox import retry_delay
+
+logger = logging.getLogger(__name__)
+
+
+class TaskRegistry:
+    """Maps task names to callables and their per-task concurrency limits"""
+
+    def __init__(self):
+        self._tasks = {}
+
+    def register(self, name, func=None, concurrency=None):
+        """Register ``func`` as task ``name``; usable as a decorator"""
+        def decorator(func):
+            self._tasks[name] = (func, concurrency)
+            return func
+        return decorator(func) if func is not None else decorator
+
+    def unregister(self, name):
+        self._tasks.pop(name, None)
+
+    def get(self, name):
+        return self._tasks[name][0]
+
+    def concurrency(self, name):
+        return self._tasks.get(name, (None, None))[1]
+
+
+registry = TaskRegistry()
+task = registry.register
+
+
+def enqueue(task_name, *args, run_at=None, queue='default', dedupe_key=None, max_attempts=5, **kwargs):
+    """
+    Queue ``task_name(*args, **kwargs)``.
+
+    Jobs with a ``dedupe_key`` are only queued once; a repeat returns None.
+    """
+    job = Job(
+        task=task_name,
+        queue=queue,
+        args=list(args),
+        kwargs=kwargs,
+        run_at=run_at or timezone.now(),
+        dedupe_key=dedupe_key,
+        max_attempts=max_attempts,
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return None
+    return job
+
+
+def enqueue_many(jobs, batch_size=500):
+    """
+    Bulk-insert unsaved Job instances, silently skipping duplicate dedupe keys.
+
+    Returns the jobs that were queued; their primary keys are not set.
+    """
+    keys = [job.dedupe_key for job in jobs if job.dedupe_key]
+    if keys:
+        existing = set(Job.objects.filter(dedupe_key__in=keys).values_list('dedupe_key', flat=True))
+        jobs = [job for job in jobs if job.dedupe_key not in existing]
+    # ignore_conflicts also covers a concurrent scheduler inserting the same keys
+    Job.objects.bulk_create(jobs, batch_size=batch_size, ignore_conflicts=True)
+    return jobs
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_jobs(limit, queue='default', worker=None, lease=timedelta(minutes=5)):
+    """
+    Claim up to ``limit`` due jobs for this worker.
+
+    Jobs whose lease expired (their worker died) are claimable again. Uses
+    SELECT ... FOR UPDATE SKIP LOCKED where supported so workers never
+    block on each other; per-task concurrency limits are honoured across
+    all workers.
+    """
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    worker = worker or worker_name()
+    with transaction.atomic():
+        due = Job.objects.filter(queue=queue, run_at__lte=now).filter(
+            Q(status='queued') | Q(status='running', locked_until__lt=now)
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        candidates = list(due.order_by('run_at', 'id')[:limit * 4])
+
+        running = Counter(
+            Job.objects.filter(status='running', locked_until__gt=now)
+            .values_list('task', flat=True)
+        )
+        claimed = []
+        for job in candidates:
+            limit_for_task = registry.concurrency(job.task)
+            if limit_for_task is not None and running[job.task] >= limit_for_task:
+                continue
+            running[job.task] += 1
+            claimed.append(job)
+            if len(claimed) == limit:
+                break
+
+        Job.objects.filter(pk__in=[job.pk for job in claimed]).update(
+            status='running', locked_by=worker, locked_until=now + lease
+        )
+    return claimed
+
+
+def run_job(job):
+    """Execute one claimed job and record the outcome"""
+    job.attempts += 1
+    try:
+        registry.get(job.task)(*job.args, **job.kwargs)
+    except Exception as exc:
+        logger.exception('Job %s (%s) failed', job.pk, job.task)
+        job.last_error = repr(exc)
+        if job.attempts >= job.max_attempts:
+            job.status = 'dead'
+        else:
+            job.status = 'queued'
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+    else:
+        job.status = 'succeeded'
+        job.finished_at = timezone.now()
+        job.last_error = ''
+    job.locked_by = ''
+    job.locked_until = None
+    job.save(update_fields=[
+        'status', 'attempts', 'run_at', 'last_error', 'finished_at', 'locked_by', 'locked_until'
+    ])
+    return job.status == 'succeeded'
@@ -0,0 +1,36 @@
+"""
+Background worker delivering outbox events to their handlers
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils.module_loading import autodiscover_modules
+
+from background.outbox import drain
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending outbox events to registered handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=1.0, help='Idle wait between polls in seconds')
+        parser.add_argument('--once', action='store_true', help='Drain what is due and exit')
+
+    def handle(self, *args, **options):
+        # Each app may register handlers in an ``outbox_handlers`` module
+        autodiscover_modules('outbox_handlers')
+
+        total = 0
+        while True:
+            handled = drain(options['batch_size'], options['max_attempts'])
+            total += handled
+            if options['once'] and handled < options['batch_size']:
+                break
+            if not handled:
+                close_old_connections()
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} outbox events.'))
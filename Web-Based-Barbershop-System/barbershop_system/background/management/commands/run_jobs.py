@@ -0,0 +1,71 @@
+"""
+Background worker running queued jobs on a thread pool
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.utils.module_loading import autodiscover_modules
+
+from background.jobs import claim_jobs, run_job, worker_name
+
+
+def _run_in_thread(job):
+    try:
+        return run_job(job)
+    finally:
+        # Each pool thread owns its own connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default='default')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Jobs run at once; 1 runs them in the main thread'
+        )
+        parser.add_argument('--sleep', type=float, default=1.0, help='Idle wait between polls in seconds')
+        parser.add_argument('--once', action='store_true', help='Run what is due and exit')
+
+    def handle(self, *args, **options):
+        # Each app may register tasks in a ``jobs`` module
+        autodiscover_modules('jobs')
+
+        worker = worker_name()
+        queue = options['queue']
+        concurrency = max(options['concurrency'], 1)
+        processed = 0
+
+        if concurrency == 1:
+            while True:
+                jobs = claim_jobs(1, queue=queue, worker=worker)
+                if jobs:
+                    run_job(jobs[0])
+                    processed += 1
+                elif options['once']:
+                    break
+                else:
+                    close_old_connections()
+                    time.sleep(options['sleep'])
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job') as pool:
+                running = set()
+                while True:
+                    for job in claim_jobs(concurrency - len(running), queue=queue, worker=worker):
+                        running.add(pool.submit(_run_in_thread, job))
+                    if not running:
+                        if options['once']:
+                            break
+                        close_old_connections()
+                        time.sleep(options['sleep'])
+                        continue
+                    done, running = wait(running, timeout=options['sleep'], return_when=FIRST_COMPLETED)
+                    processed += len(done)
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs.'))
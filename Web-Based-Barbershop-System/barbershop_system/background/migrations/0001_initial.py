@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:40
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(max_length=100)),
+                ('aggregate_type', models.CharField(max_length=100)),
+                ('aggregate_id', models.CharField(max_length=64)),
+                ('payload', models.JSONField(default=dict)),
+                ('idempotency_key', models.CharField(default=uuid.uuid4, max_length=200, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('dead', 'Dead')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'outbox_events',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'available_at', 'id'], name='outbox_even_status_7a3ca6_idx'), models.Index(fields=['aggregate_type', 'aggregate_id'], name='outbox_even_aggrega_d56a15_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('handler', models.CharField(max_length=200)),
+                ('delivered_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='background.outboxevent')),
+            ],
+            options={
+                'db_table': 'outbox_deliveries',
+                'constraints': [models.UniqueConstraint(fields=('event', 'handler'), name='outbox_delivery_once')],
+            },
+        ),
+    ]
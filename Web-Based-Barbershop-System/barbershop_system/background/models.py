@@ -0,0 +1,92 @@
+import uuid
+
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxEvent(models.Model):
+    """State change recorded in the same transaction as the change itself"""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('dead', 'Dead'),
+    ]
+
+    event_type = models.CharField(max_length=100)
+    aggregate_type = models.CharField(max_length=100)
+    aggregate_id = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    idempotency_key = models.CharField(max_length=200, unique=True, default=uuid.uuid4)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'outbox_events'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at', 'id']),
+            models.Index(fields=['aggregate_type', 'aggregate_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.aggregate_type}#{self.aggregate_id} ({self.status})"
+
+
+class OutboxDelivery(models.Model):
+    """Handlers that already succeeded for an event, so retries skip them"""
+
+    event = models.ForeignKey(OutboxEvent, on_delete=models.CASCADE, related_name='deliveries')
+    handler = models.CharField(max_length=200)
+    delivered_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'outbox_deliveries'
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'handler'], name='outbox_delivery_once'),
+        ]
+
+    def __str__(self):
+        return f"{self.handler} <- {self.event}"
+
+
+class Job(models.Model):
+    """Unit of background work, claimed and run by the ``run_jobs`` worker"""
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('dead', 'Dead'),
+    ]
+
+    task = models.CharField(max_length=200)
+    queue = models.CharField(max_length=50, default='default')
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    dedupe_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'background_jobs'
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(fields=['queue', 'status', 'run_at', 'id']),
+            models.Index(fields=['status', 'locked_until']),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
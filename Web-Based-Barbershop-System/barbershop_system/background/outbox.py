@@ -0,0 +1,138 @@
+"""
+Transactional outbox
+
+Model methods call ``publish()`` inside the transaction that changes
+state, so an event exists if and only if the change was committed. The
+``drain_outbox`` worker later hands events to registered handlers, keeping
+side effects (emails, audit trails, statistics) out of the request.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import OutboxDelivery, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+class HandlerRegistry:
+    """Maps event types to handler callables"""
+
+    def __init__(self):
+        self._handlers = {}
+
+    def register(self, event_type, func=None, name=None):
+        """Register ``func`` for ``event_type``; usable as a decorator"""
+        def decorator(func):
+            handler_name = name or f'{func.__module__}.{func.__qualname__}'
+            self._handlers.setdefault(event_type, {})[handler_name] = func
+            return func
+        return decorator(func) if func is not None else decorator
+
+    def unregister(self, event_type, name):
+        self._handlers.get(event_type, {}).pop(name, None)
+
+    def handlers_for(self, event_type):
+        return dict(self._handlers.get(event_type, {}))
+
+
+registry = HandlerRegistry()
+handler = registry.register
+
+
+def publish(event_type, instance, payload=None, idempotency_key=None):
+    """
+    Record an event for ``instance``. Must be called inside the transaction
+    that performs the state change.
+
+    Publishing twice with the same ``idempotency_key`` is a no-op.
+    """
+    event = OutboxEvent(
+        event_type=event_type,
+        aggregate_type=instance._meta.label_lower,
+        aggregate_id=str(instance.pk),
+        payload=payload or {},
+    )
+    if idempotency_key:
+        event.idempotency_key = idempotency_key
+        try:
+            with transaction.atomic():
+                event.save()
+        except IntegrityError:
+            return OutboxEvent.objects.get(idempotency_key=idempotency_key)
+    else:
+        event.save()
+    return event
+
+
+def claim_batch(batch_size, lease=timedelta(minutes=5)):
+    """
+    Lease a batch of due events to this worker.
+
+    The claim is a short transaction that pushes ``available_at`` forward by
+    ``lease``; handlers then run outside it, so no locks are held while side
+    effects execute. If the worker dies the lease simply expires. Uses
+    SELECT ... FOR UPDATE SKIP LOCKED where supported so concurrent workers
+    never claim the same rows.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboxEvent.objects.filter(status='pending', available_at__lte=now)
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        events = list(due.order_by('id')[:batch_size])
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+            available_at=now + lease
+        )
+    return events
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 2, 4, 8, ... seconds, capped at one hour"""
+    return timedelta(seconds=min(2 ** attempts, 3600))
+
+
+def dispatch(event, max_attempts=10):
+    """
+    Run every handler registered for ``event`` that has not succeeded yet.
+
+    Handlers receive the event and must be idempotent with respect to
+    ``event.idempotency_key``; successes are recorded so a retry only
+    re-runs the handlers that failed.
+    """
+    done = set(event.deliveries.values_list('handler', flat=True))
+    errors = []
+    for name, func in registry.handlers_for(event.event_type).items():
+        if name in done:
+            continue
+        try:
+            with transaction.atomic():
+                func(event)
+                OutboxDelivery.objects.create(event=event, handler=name)
+        except Exception as exc:
+            logger.exception('Outbox handler %s failed for event %s', name, event.pk)
+            errors.append(f'{name}: {exc!r}')
+
+    event.attempts += 1
+    if not errors:
+        event.status = 'processed'
+        event.processed_at = timezone.now()
+        event.last_error = ''
+    elif event.attempts >= max_attempts:
+        event.status = 'dead'
+        event.last_error = '\n'.join(errors)
+    else:
+        event.available_at = timezone.now() + retry_delay(event.attempts)
+        event.last_error = '\n'.join(errors)
+    event.save(update_fields=['status', 'attempts', 'available_at', 'last_error', 'processed_at'])
+    return not errors
+
+
+def drain(batch_size=100, max_attempts=10):
+    """Process one batch of due events; returns the number handled"""
+    events = claim_batch(batch_size)
+    for event in events:
+        dispatch(event, max_attempts=max_attempts)
+    return len(events)
@@ -0,0 +1,230 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from booking_management.jobs import enqueue_due_reminders
+from booking_management.models import Booking, Customer, Service
+from transaction.models import Payment
+from . import jobs
+from .models import Job, OutboxDelivery, OutboxEvent
+from .outbox import claim_batch, drain, publish, registry
+
+
+class OutboxTestMixin:
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name='Ivy', last_name='Moss', email='ivy@example.com', phone_number='1'
+        )
+        self.service = Service.objects.create(
+            name='Fade', description='', duration_minutes=30, price=Decimal('30.00')
+        )
+        self.booking = Booking.objects.create(
+            customer=self.customer, service=self.service,
+            booking_date=date.today() + timedelta(days=1), booking_time=time(10, 0)
+        )
+        self.calls = []
+
+    def register(self, event_type, func):
+        name = f'test.{func.__name__}'
+        registry.register(event_type, func, name=name)
+        self.addCleanup(registry.unregister, event_type, name)
+
+
+class OutboxPublishTests(OutboxTestMixin, TestCase):
+
+    def test_state_changes_publish_events(self):
+        self.booking.confirm()
+        self.booking.cancel('Sick')
+        payment = Payment.objects.create(booking=self.booking, amount=Decimal('30.00'), payment_method='cash')
+        payment.mark_completed()
+        payment.refund('Cancelled')
+
+        self.assertEqual(
+            list(OutboxEvent.objects.values_list('event_type', flat=True)),
+            ['booking.confirmed', 'booking.cancelled', 'payment.completed', 'payment.refunded']
+        )
+        cancelled = OutboxEvent.objects.get(event_type='booking.cancelled')
+        self.assertEqual(cancelled.aggregate_type, 'booking_management.booking')
+        self.assertEqual(cancelled.payload['previous_status'], 'confirmed')
+        self.assertEqual(cancelled.payload['reason'], 'Sick')
+
+    def test_rolled_back_change_publishes_nothing(self):
+        try:
+            with transaction.atomic():
+                self.booking.confirm()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_publish_is_idempotent_per_key(self):
+        first = publish('booking.reminder', self.booking, idempotency_key='reminder:1')
+        second = publish('booking.reminder', self.booking, idempotency_key='reminder:1')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+
+class OutboxWorkerTests(OutboxTestMixin, TestCase):
+
+    def test_drain_delivers_to_handlers(self):
+        def audit(event):
+            self.calls.append(event.payload['status'])
+
+        self.register('booking.confirmed', audit)
+        self.booking.confirm()
+        call_command('drain_outbox', once=True, stdout=StringIO())
+
+        self.assertEqual(self.calls, ['confirmed'])
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.status, 'processed')
+        self.assertIsNotNone(event.processed_at)
+
+    def test_failed_handler_is_retried_without_repeating_successes(self):
+        def audit(event):
+            self.calls.append('audit')
+
+        def flaky(event):
+            self.calls.append('flaky')
+            if self.calls.count('flaky') == 1:
+                raise ConnectionError('mail server down')
+
+        self.register('booking.confirmed', audit)
+        self.register('booking.confirmed', flaky)
+        self.booking.confirm()
+
+        drain()
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.status, 'pending')
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('mail server down', event.last_error)
+        self.assertGreater(event.available_at, timezone.now())
+
+        # Not due yet: backoff keeps it out of the next batch
+        self.assertEqual(drain(), 0)
+
+        OutboxEvent.objects.update(available_at=timezone.now())
+        drain()
+        event.refresh_from_db()
+        self.assertEqual(event.status, 'processed')
+        self.assertEqual(self.calls, ['audit', 'flaky', 'flaky'])
+        self.assertEqual(OutboxDelivery.objects.filter(event=event, handler__startswith='test.').count(), 2)
+
+    def test_event_is_dead_lettered_after_max_attempts(self):
+        def broken(event):
+            raise ValueError('bad payload')
+
+        self.register('booking.confirmed', broken)
+        self.booking.confirm()
+        for _ in range(2):
+            OutboxEvent.objects.update(available_at=timezone.now())
+            drain(max_attempts=2)
+        self.assertEqual(OutboxEvent.objects.get().status, 'dead')
+
+    def test_claimed_events_are_leased(self):
+        self.booking.confirm()
+        self.assertEqual(len(claim_batch(10)), 1)
+        # A second worker polling while the lease is held finds nothing to do
+        self.assertEqual(claim_batch(10), [])
+
+
+class JobQueueTests(OutboxTestMixin, TestCase):
+
+    def register_task(self, name, func, concurrency=None):
+        jobs.registry.register(name, func, concurrency=concurrency)
+        self.addCleanup(jobs.registry.unregister, name)
+
+    def test_dedupe_key_queues_once(self):
+        self.assertIsNotNone(jobs.enqueue('test.noop', dedupe_key='once'))
+        self.assertIsNone(jobs.enqueue('test.noop', dedupe_key='once'))
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_scheduled_jobs_wait_until_due(self):
+        jobs.enqueue('test.noop', run_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(jobs.claim_jobs(10), [])
+
+    def test_worker_runs_due_jobs(self):
+        self.register_task('test.record', lambda value: self.calls.append(value))
+        jobs.enqueue('test.record', 'a')
+        jobs.enqueue('test.record', 'b')
+        call_command('run_jobs', once=True, concurrency=1, stdout=StringIO())
+
+        self.assertEqual(self.calls, ['a', 'b'])
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {'succeeded'})
+
+    def test_failed_job_is_retried_then_dead(self):
+        def broken():
+            raise ConnectionError('mail server down')
+
+        self.register_task('test.broken', broken)
+        job = jobs.enqueue('test.broken', max_attempts=2)
+        for expected in ('queued', 'dead'):
+            Job.objects.update(run_at=timezone.now())
+            [claimed] = jobs.claim_jobs(1)
+            jobs.run_job(claimed)
+            job.refresh_from_db()
+            self.assertEqual(job.status, expected)
+        self.assertIn('mail server down', job.last_error)
+
+    def test_claims_respect_task_concurrency(self):
+        self.register_task('test.limited', lambda: None, concurrency=1)
+        for _ in range(3):
+            jobs.enqueue('test.limited')
+        self.assertEqual(len(jobs.claim_jobs(10)), 1)
+        # The running job holds the only slot until it finishes
+        self.assertEqual(jobs.claim_jobs(10), [])
+
+    def test_expired_lease_is_reclaimed(self):
+        jobs.enqueue('test.noop')
+        jobs.claim_jobs(1, worker='dead-worker')
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [job] = jobs.claim_jobs(1, worker='new-worker')
+        self.assertEqual(Job.objects.get(pk=job.pk).locked_by, 'new-worker')
+
+
+class BookingJobTests(OutboxTestMixin, TestCase):
+
+    def _booking_at(self, start):
+        start = timezone.localtime(start)
+        return Booking.objects.create(
+            customer=self.customer, service=self.service,
+            booking_date=start.date(), booking_time=start.time().replace(microsecond=0)
+        )
+
+    def test_reminders_are_queued_once_for_the_window(self):
+        # The setUp booking (tomorrow 10:00) is just outside the window
+        now = timezone.make_aware(datetime.combine(date.today(), time(8, 0)))
+        soon = self._booking_at(now + timedelta(hours=3))
+        self._booking_at(now + timedelta(days=3))
+        cancelled = self._booking_at(now + timedelta(hours=5))
+        cancelled.cancel()
+
+        self.assertEqual(enqueue_due_reminders(now=now, lead=timedelta(hours=24)), 1)
+        self.assertEqual(enqueue_due_reminders(now=now, lead=timedelta(hours=24)), 0)
+        job = Job.objects.get()
+        self.assertEqual(job.args, [soon.pk])
+        self.assertEqual(job.run_at, now)
+
+    def test_reminder_email_is_sent_by_worker(self):
+        booking = self._booking_at(timezone.now() + timedelta(hours=2))
+        enqueue_due_reminders()
+        call_command('run_jobs', once=True, concurrency=1, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.customer.email])
+        self.assertIn(booking.service.name, mail.outbox[0].body)
+
+    def test_confirmation_email_goes_through_outbox_and_queue(self):
+        self.booking.confirm()
+        call_command('drain_outbox', once=True, stdout=StringIO())
+        # Redelivering the event must not queue a second email
+        call_command('drain_outbox', once=True, stdout=StringIO())
+        self.assertEqual(Job.objects.filter(task='booking.send_status_email').count(), 1)
+
+        call_command('run_jobs', once=True, concurrency=1, stdout=StringIO())
+        self.assertEqual(mail.outbox[0].subject, 'Your booking is confirmed')
@@ -0,0 +1,203 @@
+"""
+Shared cache with an in-process tier and stampede protection
+
+``CACHES['default']`` is the shared cache every worker sees: Redis when
+``REDIS_URL`` is set, files under ``CACHE_DIR`` (shared by the workers on
+one host), or a local-memory stand-in for development. ``CACHES['local']``
+is a small per-process tier in front of it that keeps values for a few
+seconds, so hot keys don't cost a round trip on every request.
+
+``TieredCache.get_or_compute()`` keeps popular keys from stampeding the
+database. Each entry records when it expires and how long it took to
+compute; readers recompute early with a probability that rises as expiry
+nears (XFetch), so usually one request refreshes a hot key before it
+expires. Once an entry has expired, a lock in the shared cache lets one
+caller recompute while the others serve the stale value, or wait briefly
+for the new one when there is none.
+
+``cached_service`` applies this to service-layer functions. Results are
+grouped into namespaces, which model signals invalidate on change.
+"""
+import hashlib
+import os
+import random
+import time
+from functools import cached_property, wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+SHARED_CACHE = 'default'
+LOCAL_CACHE = 'local'
+NAMESPACE_KEY = 'cache:namespace:{}'
+
+DEFAULT_CACHE_TIERS = {
+    'L1_TIMEOUT': 5,        # seconds a value is served from process memory
+    'STALE_TIMEOUT': 60,    # seconds an expired value may be served while it is recomputed
+    'LOCK_TIMEOUT': 10,     # seconds one caller may hold the recompute lock
+    'POLL_INTERVAL': 0.05,  # seconds between checks while waiting for another caller
+    'BETA': 1.0,            # above 1 recomputes earlier, below 1 later
+}
+
+
+def cache_settings(env=None):
+    """Return CACHES for the shared backend chosen by the environment"""
+    env = os.environ if env is None else env
+    if env.get('REDIS_URL'):
+        shared = {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': env['REDIS_URL'],
+        }
+    elif env.get('CACHE_DIR'):
+        shared = {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': env['CACHE_DIR'],
+        }
+    else:
+        shared = {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'barbershop-shared',
+        }
+    shared['KEY_PREFIX'] = env.get('CACHE_KEY_PREFIX', 'barbershop')
+    return {
+        SHARED_CACHE: shared,
+        LOCAL_CACHE: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'barbershop-l1',
+            'OPTIONS': {'MAX_ENTRIES': 1000},
+        },
+    }
+
+
+def _expires_early(entry, now, beta):
+    """XFetch: recompute before expiry with a probability scaled by compute time"""
+    _, expires_at, delta = entry
+    return now + delta * beta * random.expovariate(1.0) >= expires_at
+
+
+class TieredCache:
+    """
+    Process-local tier in front of the shared cache.
+
+    Values are stored as ``(value, expires_at, compute_seconds)`` entries.
+    The local tier cannot be invalidated from other processes, so it only
+    holds entries for ``L1_TIMEOUT`` seconds.
+    """
+
+    def __init__(self, shared=SHARED_CACHE, local=LOCAL_CACHE, **options):
+        self.shared_alias = shared
+        self.local_alias = local
+        self._options = {key.upper(): value for key, value in options.items()}
+
+    @cached_property
+    def config(self):
+        return {**DEFAULT_CACHE_TIERS, **getattr(settings, 'CACHE_TIERS', {}), **self._options}
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    @property
+    def local(self):
+        return caches[self.local_alias]
+
+    def get_or_compute(self, key, compute, timeout=300):
+        """Return the cached value for ``key``, calling ``compute()`` at most once across workers"""
+        now = time.time()
+        entry = self.local.get(key)
+        if entry is not None and now < entry[1]:
+            return entry[0]
+
+        entry = self.shared.get(key)
+        if entry is not None:
+            self.local.set(key, entry, self.config['L1_TIMEOUT'])
+            if not _expires_early(entry, now, self.config['BETA']):
+                return entry[0]
+        return self._recompute(key, compute, timeout, stale=entry)
+
+    def _recompute(self, key, compute, timeout, stale):
+        lock_key = f'{key}:lock'
+        if self.shared.add(lock_key, 1, self.config['LOCK_TIMEOUT']):
+            try:
+                return self._store(key, compute, timeout)
+            finally:
+                self.shared.delete(lock_key)
+
+        # Another caller is recomputing
+        if stale is not None:
+            return stale[0]
+        deadline = time.monotonic() + self.config['LOCK_TIMEOUT']
+        while time.monotonic() < deadline:
+            time.sleep(self.config['POLL_INTERVAL'])
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry, self.config['L1_TIMEOUT'])
+                return entry[0]
+        # The lock holder died or is very slow; stop waiting for it
+        return self._store(key, compute, timeout)
+
+    def _store(self, key, compute, timeout):
+        started = time.monotonic()
+        value = compute()
+        entry = (value, time.time() + timeout, time.monotonic() - started)
+        # Kept past expiry so waiting callers have something to serve during a recompute
+        self.shared.set(key, entry, timeout + self.config['STALE_TIMEOUT'])
+        self.local.set(key, entry, self.config['L1_TIMEOUT'])
+        return value
+
+    def namespace_version(self, name):
+        key = NAMESPACE_KEY.format(name)
+        version = self.local.get(key)
+        if version is None:
+            version = self.shared.get(key)
+            if version is None:
+                self.shared.add(key, time.time_ns(), timeout=None)
+                version = self.shared.get(key, 0)
+            self.local.set(key, version, self.config['L1_TIMEOUT'])
+        return version
+
+    def invalidate(self, *names):
+        """Make every value cached under the given namespaces stale"""
+        def bump():
+            for name in names:
+                key = NAMESPACE_KEY.format(name)
+                self.shared.set(key, time.time_ns(), timeout=None)
+                self.local.delete(key)
+
+        bump()
+        # Bump again once committed, in case a reader cached the old rows meanwhile
+        transaction.on_commit(bump)
+
+
+tiered_cache = TieredCache()
+invalidate = tiered_cache.invalidate
+
+
+def cached_service(namespaces=(), timeout=300):
+    """
+    Cache a service function's result in the tiered cache.
+
+    The key is built from the function name and the ``repr`` of its
+    arguments, so pass ids and dates rather than model instances.
+    ``invalidate(namespace)`` drops every result cached under it.
+    """
+    if isinstance(namespaces, str):
+        namespaces = (namespaces,)
+
+    def decorator(func):
+        prefix = f'service:{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            versions = ':'.join(str(tiered_cache.namespace_version(name)) for name in namespaces)
+            digest = hashlib.blake2b(
+                repr((args, sorted(kwargs.items()))).encode(), digest_size=16
+            ).hexdigest()
+            return tiered_cache.get_or_compute(
+                f'{prefix}:{versions}:{digest}', lambda: func(*args, **kwargs), timeout
+            )
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,109 @@
+"""
+Database profiles
+
+``DB_PROFILE=sqlite`` (the default) suits a single-node shop: WAL
+journaling lets readers carry on while a booking is written, and a busy
+timeout plus IMMEDIATE transactions make concurrent writers queue instead
+of failing with "database is locked". ``DB_PROFILE=postgres`` reads its
+connection details from the environment and keeps connections open
+between requests, or hands them to psycopg's pool with
+``POSTGRES_POOL=1``.
+"""
+import os
+
+# Applied to every new SQLite connection by configure_connection()
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',    # safe with WAL; fsync at checkpoints only
+    'busy_timeout': 20000,      # milliseconds to wait for a lock
+    'mmap_size': 268435456,     # 256 MB of the file memory-mapped for reads
+    'cache_size': -20000,       # about 20 MB page cache per connection
+    'temp_store': 'memory',
+}
+
+
+def _flag(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def sqlite_profile(base_dir, env):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.get('SQLITE_PATH', base_dir / 'db.sqlite3'),
+        'OPTIONS': {
+            # Take the write lock at BEGIN so writers never fail upgrading a read lock
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+
+
+def postgres_profile(base_dir, env):
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env.get('POSTGRES_DB', 'barbershop'),
+        'USER': env.get('POSTGRES_USER', 'barbershop'),
+        'PASSWORD': env.get('POSTGRES_PASSWORD', ''),
+        'HOST': env.get('POSTGRES_HOST', 'localhost'),
+        'PORT': env.get('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(env.get('POSTGRES_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if _flag(env.get('POSTGRES_POOL', '')):
+        # The pool owns connection reuse, so persistent connections are turned off
+        config['CONN_MAX_AGE'] = 0
+        config['OPTIONS']['pool'] = {
+            'min_size': int(env.get('POSTGRES_POOL_MIN_SIZE', 2)),
+            'max_size': int(env.get('POSTGRES_POOL_MAX_SIZE', 10)),
+            'timeout': float(env.get('POSTGRES_POOL_TIMEOUT', 10)),
+        }
+    return config
+
+
+def replica_settings(profile, base_dir, env=None):
+    """
+    Return the DATABASES entry for the read replica, or None if none is set.
+
+    SQLite: ``SQLITE_REPLICA_PATH``; PostgreSQL: ``POSTGRES_REPLICA_HOST``
+    (and optionally ``POSTGRES_REPLICA_PORT``), other settings as the primary.
+    """
+    env = os.environ if env is None else env
+    config = database_settings(profile, base_dir, env)
+    if profile == 'sqlite' and env.get('SQLITE_REPLICA_PATH'):
+        config['NAME'] = env['SQLITE_REPLICA_PATH']
+        return config
+    if profile == 'postgres' and env.get('POSTGRES_REPLICA_HOST'):
+        config['HOST'] = env['POSTGRES_REPLICA_HOST']
+        config['PORT'] = env.get('POSTGRES_REPLICA_PORT', config['PORT'])
+        return config
+    return None
+
+
+PROFILES = {
+    'sqlite': sqlite_profile,
+    'postgres': postgres_profile,
+}
+
+
+def database_settings(profile, base_dir, env=None):
+    """Return the DATABASES['default'] entry for ``profile``"""
+    env = os.environ if env is None else env
+    try:
+        return PROFILES[profile](base_dir, env)
+    except KeyError:
+        raise ValueError(f'Unknown DB_PROFILE {profile!r}; choose from {", ".join(PROFILES)}')
+
+
+def apply_sqlite_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created receiver tuning each new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    from django.conf import settings
+
+    with connection.cursor() as cursor:
+        apply_sqlite_pragmas(cursor, getattr(settings, 'SQLITE_PRAGMAS', SQLITE_PRAGMAS))
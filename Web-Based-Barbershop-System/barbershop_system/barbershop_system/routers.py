@@ -0,0 +1,120 @@
+"""
+Read-replica routing
+
+Reads go to the replica only inside ``use_replica()`` (or functions
+decorated with ``reads_from_replica``) - dashboard statistics, analytics
+and reporting - and only when a replica is configured. Everything else,
+every write and every read inside a transaction on the primary uses the
+primary.
+
+Once code writes, later replica reads in the same pin scope go to the
+primary. PrimaryPinMiddleware opens a scope per request and sets a
+short-lived cookie so the same visitor's next requests stay on the
+primary too, until the replica has caught up with their change. Outside
+a request, each outermost ``use_replica()`` block is its own scope;
+``pin_scope()`` widens one over a longer job. The scope is shared by
+contexts copied from it, such as sync_to_async threads.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_requested = ContextVar('replica_requested', default=False)
+_pin_scope = ContextVar('primary_pin_scope', default=None)
+
+PIN_COOKIE = 'pin_primary'
+
+
+class PinScope:
+    """Whether code running in the scope has written"""
+
+    __slots__ = ('pinned',)
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def pin_scope(pinned=False):
+    """Send replica reads in this block to the primary once it has written"""
+    scope = PinScope(pinned)
+    token = _pin_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _pin_scope.reset(token)
+
+
+@contextmanager
+def use_replica():
+    """Let reads in this block go to the replica"""
+    token = _replica_requested.set(True)
+    try:
+        if _pin_scope.get() is None:
+            with pin_scope():
+                yield
+        else:
+            yield
+    finally:
+        _replica_requested.reset(token)
+
+
+def reads_from_replica(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not _replica_requested.get():
+            return None
+        scope = _pin_scope.get()
+        if scope is not None and scope.pinned:
+            return None
+        # A transaction must see its own uncommitted writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        # Reads after our own write must see it
+        scope = _pin_scope.get()
+        if scope is not None:
+            scope.pinned = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replica hold the same data
+        return True
+
+
+class PrimaryPinMiddleware:
+    """Keep a visitor on the primary for REPLICA_PIN_SECONDS after they write"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        already_pinned = PIN_COOKIE in request.COOKIES
+        with pin_scope(already_pinned) as scope:
+            response = self.get_response(request)
+        if scope.pinned and not already_pinned:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .caching import cache_settings
+from .database import database_settings, replica_settings
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,16 +46,27 @@ INSTALLED_APPS = [
     'security_management',
     'booking_management',
     'transaction',
+    'background',
+    'reporting',
+    'monitoring',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # After SecurityMiddleware, so assets get HSTS and the other security
+    # headers; ahead of the profilers, so asset hits stay out of the per-view metrics
+    'barbershop_system.staticfiles.StaticFilesMiddleware',
+    'monitoring.middleware.ProfilingMiddleware',
+    'monitoring.middleware.SamplingProfilerMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'security_management.middleware.PrincipalMiddleware',
+    'booking_management.middleware.CustomerProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'barbershop_system.routers.PrimaryPinMiddleware',
 ]
 
 ROOT_URLCONF = 'barbershop_system.urls'
@@ -69,6 +84,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.media',
                 'django.template.context_processors.static',
+                'security_management.context_processors.principal',
             ],
         },
     },
@@ -80,11 +96,35 @@ WSGI_APPLICATION = 'barbershop_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Database profile: 'sqlite' (tuned WAL mode) or 'postgres' (settings from
+# POSTGRES_* environment variables); see barbershop_system/database.py.
+# SQLite connections get database.SQLITE_PRAGMAS unless SQLITE_PRAGMAS is set
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_settings(DB_PROFILE, BASE_DIR),
+}
+
+# Optional read replica for dashboard, analytics and reporting reads
+# (SQLITE_REPLICA_PATH or POSTGRES_REPLICA_HOST). Visitors who just wrote
+# keep reading from the primary for REPLICA_PIN_SECONDS.
+REPLICA_DATABASE = 'replica'
+REPLICA_PIN_SECONDS = 5
+DATABASE_ROUTERS = ['barbershop_system.routers.ReplicaRouter']
+
+_replica = replica_settings(DB_PROFILE, BASE_DIR)
+if _replica:
+    DATABASES[REPLICA_DATABASE] = _replica
+
+
+# Cache
+# Shared cache: Redis (REDIS_URL), files under CACHE_DIR, or a per-process
+# stand-in; plus a short-lived in-process tier. See barbershop_system/caching.py.
+CACHES = cache_settings()
+CACHE_TIERS = {
+    'L1_TIMEOUT': 5,
+    'STALE_TIMEOUT': 60,
+    'LOCK_TIMEOUT': 10,
 }
 
 
@@ -124,9 +164,18 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_DIRS = [
-    BASE_DIR / 'core' / 'static',
-]
+# collectstatic minifies CSS, hashes every file name and writes gzip/brotli
+# copies; StaticFilesMiddleware serves them with immutable cache headers.
+# Brotli copies need the brotli package (pip install brotli).
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'barbershop_system.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+# Until collectstatic has run, {% static %} falls back to the source names in
+# development; elsewhere a missing manifest raises ValueError. The test runner
+# turns DEBUG off only after settings are loaded, so the suite keeps this on;
+# a test settings module with DEBUG off should set it itself.
+STATIC_UNHASHED_FALLBACK = DEBUG
 
 # Media files
 MEDIA_URL = '/media/'
@@ -144,3 +193,42 @@ AUTH_USER_MODEL = 'security_management.User'
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
+
+# Session principal: signed snapshot of the logged-in user's role and profile
+# ids, re-read from the database at most this often (seconds)
+PRINCIPAL_MAX_AGE = 300
+
+# Login throttling: failed attempts allowed per sliding window (seconds)
+LOGIN_THROTTLE = {
+    'WINDOW': 300,
+    'IP_LIMIT': 20,
+    'USERNAME_LIMIT': 5,
+}
+
+# LoginAttempt rows are buffered and written in batches off the request path
+LOGIN_ATTEMPT_BATCH_SIZE = 100
+LOGIN_ATTEMPT_FLUSH_INTERVAL = 2.0
+
+# Batch invoicing: tax rate in percent and days until an invoice is due
+INVOICE_TAX_RATE = '0.00'
+INVOICE_DUE_DAYS = 14
+
+# Payment gateway backend; charges time out after TIMEOUT seconds and are
+# retried by the job queue with the same idempotency key
+PAYMENT_GATEWAY = {
+    'BACKEND': 'transaction.gateways.FakeGateway',
+    'OPTIONS': {},
+    'TIMEOUT': 10,
+}
+
+# Columnar snapshots of bookings and payments for offline reporting
+ANALYTICS_EXPORT_DIR = BASE_DIR / 'exports'
+
+# Per-view request metrics, served in Prometheus format at /metrics/ to admins
+# and to scrapers sending "Authorization: Bearer <METRICS_TOKEN>"
+PROFILING_ENABLED = True
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Stack profiles of slow requests, written while the sampling profiler is
+# switched on in the admin (Monitoring > Sampling profiler settings)
+PROFILER_OUTPUT_DIR = BASE_DIR / 'profiles'
@@ -0,0 +1,226 @@
+"""
+Static asset pipeline
+
+collectstatic stores assets through CompressedManifestStaticFilesStorage:
+CSS is minified, every file gets a content hash in its name, and text
+assets get gzip and (when the brotli package is installed) brotli copies
+next to them, compressed once at build time at the highest levels.
+
+StaticFilesMiddleware serves the collected files from an index built at
+startup, after SecurityMiddleware has added its headers but before
+sessions, authentication or profiling run. Hashed names
+never change content, so they are sent with a year-long immutable
+Cache-Control and browsers do not even revalidate them; the negotiated
+precompressed copy goes out with sendfile where the server supports it.
+"""
+import gzip
+import mimetypes
+import re
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.xml', '.html')
+# A compressed copy is only kept when it saves at least this share of the bytes
+MIN_SAVING = 0.05
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Unhashed names may change with the next deploy
+REVALIDATE = 'public, max-age=60'
+# Preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_CSS_COMMENTS = re.compile(r'''("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|/\*(?!!).*?\*/''', re.S)
+_CSS_STRINGS = re.compile(r'''("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')''', re.S)
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r' ?([{};,>]) ?')
+
+
+def _squeeze(css):
+    css = _CSS_SPACE.sub(' ', css)
+    css = _CSS_PUNCTUATION.sub(r'\1', css)
+    # Only after colons: a space before one is a descendant combinator in selectors
+    return css.replace(': ', ':').replace(';}', '}')
+
+
+def minify_css(css):
+    """
+    Drop comments (except /*! ones) and the whitespace CSS does not need.
+
+    Strings are left alone; nothing is renamed or reordered, so the result
+    behaves exactly like the source.
+    """
+    css = _CSS_COMMENTS.sub(lambda match: match.group(1) or '', css)
+    parts = _CSS_STRINGS.split(css)
+    # split() puts the strings at the odd positions
+    return ''.join(part if n % 2 else _squeeze(part) for n, part in enumerate(parts)).strip()
+
+
+def compressed_variants(data):
+    """(suffix, bytes) for each encoding that is available and worth it"""
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    return [(suffix, body) for suffix, body in variants if len(body) <= len(data) * (1 - MIN_SAVING)]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that minifies CSS before hashing and precompresses the results"""
+
+    def stored_name(self, name):
+        # Until collectstatic has run, development (STATIC_UNHASHED_FALLBACK) uses the source names
+        if not self.hashed_files and getattr(settings, 'STATIC_UNHASHED_FALLBACK', settings.DEBUG):
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run, **options)
+            return
+
+        paths = dict(paths)
+        for name in paths:
+            if name.endswith('.css'):
+                self._rewrite(name, minify_css(self._read(name).decode('utf-8')).encode('utf-8'))
+                # Hash the minified copy rather than the source
+                paths[name] = (self, name)
+        yield from super().post_process(paths, dry_run, **options)
+
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE):
+                self._compress(name)
+
+    def _read(self, name):
+        with self.open(name) as file:
+            return file.read()
+
+    def _rewrite(self, name, content):
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(content))
+
+    def _compress(self, name):
+        data = self._read(name)
+        kept = set()
+        for suffix, body in compressed_variants(data):
+            self._rewrite(name + suffix, body)
+            kept.add(suffix)
+        for _, suffix in ENCODINGS:
+            if suffix not in kept and self.exists(name + suffix):
+                self.delete(name + suffix)
+
+
+StaticFile = namedtuple('StaticFile', ['path', 'size', 'headers', 'variants'])
+
+
+def _content_type(name):
+    content_type, _ = mimetypes.guess_type(name)
+    content_type = content_type or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+def index_static_files(root, hashed_names=()):
+    """URL-relative name -> StaticFile for every file under ``root``"""
+    root = Path(root)
+    hashed_names = set(hashed_names)
+    files = {}
+    for path in sorted(root.rglob('*')):
+        if not path.is_file():
+            continue
+        if path.suffix in ('.gz', '.br') and path.with_suffix('').is_file():
+            continue
+        name = path.relative_to(root).as_posix()
+        stat = path.stat()
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            variant = path.with_name(path.name + suffix)
+            if variant.is_file():
+                variants[encoding] = (variant, variant.stat().st_size)
+        headers = {
+            'Content-Type': _content_type(name),
+            'Cache-Control': IMMUTABLE if name in hashed_names else REVALIDATE,
+            'ETag': f'W/"{int(stat.st_mtime):x}-{stat.st_size:x}"',
+            'Last-Modified': http_date(stat.st_mtime),
+            'X-Content-Type-Options': 'nosniff',
+        }
+        if variants:
+            headers['Vary'] = 'Accept-Encoding'
+        files[name] = StaticFile(path, stat.st_size, headers, variants)
+    return files
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        quality = params.strip().replace(' ', '')
+        if quality.startswith('q=') and not quality[2:].strip('0.'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Serve files from STATIC_ROOT before the rest of the stack runs.
+
+    Put it directly after SecurityMiddleware, so assets keep HSTS and the
+    other security headers. Files are indexed when the process starts,
+    so restart after collectstatic (deploys do). Not used when nothing has
+    been collected or static files are served from another host.
+    """
+
+    def __init__(self, get_response):
+        root = settings.STATIC_ROOT
+        if not root or not Path(root).is_dir() or '://' in settings.STATIC_URL:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.files = index_static_files(root, getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            static_file = self.files.get(request.path[len(self.prefix):])
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    def serve(self, request, static_file):
+        if request.headers.get('If-None-Match') == static_file.headers['ETag']:
+            response = HttpResponseNotModified()
+            for header in ('Cache-Control', 'ETag', 'Vary'):
+                if header in static_file.headers:
+                    response[header] = static_file.headers[header]
+            return response
+
+        path, size, encoding = static_file.path, static_file.size, None
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        for candidate, _ in ENCODINGS:
+            if candidate in static_file.variants and (candidate in accepted or '*' in accepted):
+                (path, size), encoding = static_file.variants[candidate], candidate
+                break
+
+        if request.method == 'HEAD':
+            response = HttpResponse()
+        else:
+            response = FileResponse(path.open('rb'), content_type=static_file.headers['Content-Type'])
+            if response.has_header('Content-Disposition'):
+                del response['Content-Disposition']
+        for header, value in static_file.headers.items():
+            response[header] = value
+        response['Content-Length'] = str(size)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        return response
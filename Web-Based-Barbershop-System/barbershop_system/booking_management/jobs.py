@@ -0,0 +1,89 @@
+"""
+Background tasks for booking notifications
+"""
+from datetime import datetime, timedelta
+
+from django.core.mail import send_mail
+from django.db.models import Q
+from django.utils import timezone
+
+from background.jobs import enqueue_many, task
+from background.models import Job
+from .models import Booking, BookingQuerySet
+
+REMINDER_LEAD = timedelta(hours=24)
+
+STATUS_SUBJECTS = {
+    'booking.confirmed': 'Your booking is confirmed',
+    'booking.cancelled': 'Your booking was cancelled',
+}
+
+
+def _booking_start(booking_date, booking_time):
+    return timezone.make_aware(datetime.combine(booking_date, booking_time))
+
+
+@task('booking.send_reminder', concurrency=4)
+def send_reminder(booking_id):
+    booking = Booking.objects.with_display_relations().filter(pk=booking_id).first()
+    if booking is None or booking.status not in BookingQuerySet.ACTIVE_STATUSES:
+        return
+    if not booking.customer.email:
+        return
+    send_mail(
+        'Appointment reminder',
+        f'Hi {booking.customer.first_name}, this is a reminder of your {booking.service.name} '
+        f'appointment on {booking.booking_date:%B %d, %Y} at {booking.booking_time:%I:%M %p}.',
+        None,
+        [booking.customer.email],
+    )
+
+
+@task('booking.send_status_email', concurrency=4)
+def send_status_email(booking_id, event_type):
+    booking = Booking.objects.with_display_relations().filter(pk=booking_id).first()
+    if booking is None or not booking.customer.email:
+        return
+    send_mail(
+        STATUS_SUBJECTS[event_type],
+        f'Hi {booking.customer.first_name}, your {booking.service.name} appointment on '
+        f'{booking.booking_date:%B %d, %Y} at {booking.booking_time:%I:%M %p} is now '
+        f'{booking.get_status_display().lower()}.',
+        None,
+        [booking.customer.email],
+    )
+
+
+def enqueue_due_reminders(now=None, lead=REMINDER_LEAD):
+    """
+    Queue reminders for active bookings starting within ``lead`` of ``now``.
+
+    Only the window is queried (via the booking date/time index) and each
+    booking gets at most one reminder job, so the scheduler can run as
+    often as needed. Returns the number of jobs queued.
+    """
+    now = timezone.localtime(now or timezone.now())
+    end = now + lead
+    window = Q(booking_date__gt=now.date(), booking_date__lt=end.date())
+    if now.date() == end.date():
+        window |= Q(booking_date=now.date(), booking_time__gte=now.time(), booking_time__lte=end.time())
+    else:
+        window |= Q(booking_date=now.date(), booking_time__gte=now.time())
+        window |= Q(booking_date=end.date(), booking_time__lte=end.time())
+
+    bookings = (
+        Booking.objects.active()
+        .filter(window)
+        .exclude(customer__email='')
+        .values_list('pk', 'booking_date', 'booking_time')
+    )
+    jobs = [
+        Job(
+            task='booking.send_reminder',
+            args=[pk],
+            run_at=max(_booking_start(booking_date, booking_time) - lead, now),
+            dedupe_key=f'booking-reminder:{pk}',
+        )
+        for pk, booking_date, booking_time in bookings
+    ]
+    return len(enqueue_many(jobs))
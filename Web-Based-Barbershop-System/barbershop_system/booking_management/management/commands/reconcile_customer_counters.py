@@ -0,0 +1,93 @@
+"""
+Recompute customer booking counters from the bookings table
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+
+from booking_management.models import Booking, Customer
+
+
+class Command(BaseCommand):
+    help = 'Recompute total_bookings, lifetime_spend and last_visit_date for every customer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of customers recomputed per transaction'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted customers without writing'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+        last_id = 0
+        scanned = drifted = 0
+
+        while True:
+            # One short transaction per chunk; rows outside it stay writable
+            with transaction.atomic():
+                # Keyset pagination keeps each chunk an index range scan
+                customers = (
+                    Customer.objects.filter(id__gt=last_id)
+                    .order_by('id')
+                    .only('id', 'total_bookings', 'lifetime_spend', 'last_visit_date')
+                )
+                if not dry_run:
+                    # Counter updates from record_booking/record_visit wait for the new
+                    # values instead of being overwritten by them, and bookings whose
+                    # updates ran first are already in the totals below
+                    customers = customers.select_for_update()
+                customers = list(customers[:chunk_size])
+                if not customers:
+                    break
+                last_id = customers[-1].id
+                scanned += len(customers)
+
+                changed = self._reconcile_chunk(customers)
+                drifted += len(changed)
+                if changed and not dry_run:
+                    Customer.objects.bulk_update(
+                        changed, ['total_bookings', 'lifetime_spend', 'last_visit_date']
+                    )
+
+        verb = 'would be updated' if dry_run else 'updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} customers; {drifted} {verb}.'
+        ))
+
+    @staticmethod
+    def _reconcile_chunk(customers):
+        """Return the customers in the chunk whose counters disagree with their bookings"""
+        totals = {
+            row['customer_id']: row
+            for row in Booking.objects.filter(
+                customer_id__gte=customers[0].id,
+                customer_id__lte=customers[-1].id,
+            ).order_by().values('customer_id').annotate(
+                total_bookings=Count('id', filter=~Q(status='cancelled')),
+                lifetime_spend=Sum('service__price', filter=Q(status='completed')),
+                last_visit_date=Max('booking_date', filter=Q(status='completed')),
+            )
+        }
+
+        changed = []
+        for customer in customers:
+            row = totals.get(customer.id, {})
+            expected = (
+                row.get('total_bookings', 0),
+                row.get('lifetime_spend') or Decimal('0.00'),
+                row.get('last_visit_date'),
+            )
+            if (customer.total_bookings, customer.lifetime_spend, customer.last_visit_date) != expected:
+                customer.total_bookings, customer.lifetime_spend, customer.last_visit_date = expected
+                changed.append(customer)
+        return changed
@@ -0,0 +1,24 @@
+"""
+Queue reminder emails for upcoming bookings
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from booking_management.jobs import REMINDER_LEAD, enqueue_due_reminders
+
+
+class Command(BaseCommand):
+    help = 'Queue reminder jobs for bookings starting within the reminder lead time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=REMINDER_LEAD.total_seconds() / 3600,
+            help='How far ahead of the appointment to remind'
+        )
+
+    def handle(self, *args, **options):
+        queued = enqueue_due_reminders(lead=timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} reminders.'))
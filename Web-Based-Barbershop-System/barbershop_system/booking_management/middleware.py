@@ -0,0 +1,34 @@
+"""
+Request-scoped helpers for booking management
+"""
+from django.utils.functional import SimpleLazyObject
+
+from security_management.principal import get_principal
+from .models import Customer
+
+
+def get_customer(request):
+    """Return the current user's customer profile, resolving it at most once per request"""
+    if not hasattr(request, '_cached_customer'):
+        customer = None
+        principal = get_principal(request)
+        if principal.customer_id is not None:
+            customer = Customer.objects.filter(pk=principal.customer_id).first()
+        request._cached_customer = customer
+    return request._cached_customer
+
+
+class CustomerProfileMiddleware:
+    """
+    Attach a lazy ``request.customer`` to every request.
+
+    The profile is only queried when a view or template touches it, and the
+    result is reused for the rest of the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.customer = SimpleLazyObject(lambda: get_customer(request))
+        return self.get_response(request)
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('booking_management', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='barber',
+            field=models.ForeignKey(blank=True, limit_choices_to={'role': 'barber'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='barber_bookings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='customer_profile', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='booking_management.customer'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='barber',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='barber_reviews', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='booking',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='review', to='booking_management.booking'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='booking_management.customer'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='service',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='bookings', to='booking_management.service'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_date', 'booking_time'], name='bookings_booking_a7d490_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status'], name='bookings_status_51373b_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking_management', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['barber', 'booking_date', 'booking_time'], name='bookings_barber__afbd61_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer', 'booking_date', 'booking_time'], name='bookings_custome_ca5b00_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at'], name='bookings_created_118d3e_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:30
+
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def merge_duplicate_customers(apps, schema_editor):
+    """
+    Normalize customer emails and fold duplicates into the oldest record.
+
+    Bookings and reviews of the duplicates are re-pointed at the kept
+    customer, booking counters are summed and blank contact details are
+    filled in from the duplicates before they are deleted. An address
+    shared by customers linked to different user accounts is not merged,
+    as that would hand one account the other's bookings; the migration
+    stops and lists them for someone to resolve by hand.
+    """
+    Customer = apps.get_model('booking_management', 'Customer')
+    Booking = apps.get_model('booking_management', 'Booking')
+    Review = apps.get_model('booking_management', 'Review')
+
+    groups = defaultdict(list)
+    for customer in Customer.objects.order_by('id').iterator():
+        groups[(customer.email or '').strip().lower()].append(customer)
+
+    conflicts = [
+        f"{email} (customers {', '.join(str(c.pk) for c in duplicates)})"
+        for email, duplicates in groups.items()
+        if email and len({c.user_id for c in duplicates if c.user_id}) > 1
+    ]
+    if conflicts:
+        raise RuntimeError(
+            'These emails belong to customers of different user accounts; '
+            'change or merge them by hand before migrating: ' + '; '.join(conflicts)
+        )
+
+    for email, duplicates in groups.items():
+        keeper, others = duplicates[0], duplicates[1:]
+        if not email:
+            # Blank emails are allowed to repeat; only normalize whitespace
+            Customer.objects.filter(pk__in=[c.pk for c in duplicates]).update(email='')
+            continue
+
+        if others:
+            other_ids = [other.pk for other in others]
+            Booking.objects.filter(customer_id__in=other_ids).update(customer=keeper)
+            Review.objects.filter(customer_id__in=other_ids).update(customer=keeper)
+
+            for other in others:
+                keeper.total_bookings += other.total_bookings
+                keeper.phone_number = keeper.phone_number or other.phone_number
+                keeper.preferences = keeper.preferences or other.preferences
+                # At most one of the group has a user, as checked above
+                keeper.user_id = keeper.user_id or other.user_id
+
+            # The user link is one-to-one, so the duplicates go before it moves
+            Customer.objects.filter(pk__in=other_ids).delete()
+
+        keeper.email = email
+        keeper.save(update_fields=['email', 'user', 'total_bookings', 'phone_number', 'preferences'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking_management', '0003_booking_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_customers, migrations.RunPython.noop),
+    ]
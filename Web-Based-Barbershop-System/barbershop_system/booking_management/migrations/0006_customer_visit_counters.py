@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking_management', '0005_customer_unique_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='last_visit_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_spend',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Total price of completed bookings', max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='total_bookings',
+            field=models.PositiveIntegerField(default=0, help_text='Bookings that were not cancelled'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking_management', '0006_customer_visit_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
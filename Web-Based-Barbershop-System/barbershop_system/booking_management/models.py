@@ -1,12 +1,19 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
+from background.outbox import publish
 
 
 class Service(models.Model):
     """Barbershop services"""
 
+    # Widths of the resized copies made by core.images
+    IMAGE_WIDTHS = (320, 640, 960, 1280)
+
     name = models.CharField(max_length=200)
     description = models.TextField()
     duration_minutes = models.PositiveIntegerField(
@@ -15,6 +22,7 @@ class Service(models.Model):
     )
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     image = models.ImageField(upload_to='services/', null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     category = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -28,6 +36,44 @@ class Service(models.Model):
         return f"{self.name} - ${self.price}"
 
 
+class CustomerManager(models.Manager):
+    """Customer lookups keyed on the normalized email address"""
+
+    @staticmethod
+    def normalize_email(email):
+        """Lowercase and trim an email so lookups hit the unique index"""
+        return (email or '').strip().lower()
+
+    def get_or_create_by_email(self, email, defaults=None):
+        """
+        Insert-or-fetch a customer by email.
+
+        Relies on the unique email constraint: when two requests race to
+        create the same customer, the loser's insert fails and
+        ``get_or_create`` falls back to fetching the winner's row.
+        """
+        email = self.normalize_email(email)
+        if not email:
+            # Blank emails are not unique, so there is nothing to match on
+            return self.create(email='', **(defaults or {})), True
+        # Spelling out the index condition lets the planner use the partial index
+        return self.exclude(email='').get_or_create(email=email, defaults=defaults)
+
+    def record_booking(self, customer_id, delta=1):
+        """Atomically adjust the booking counter without a read-modify-write"""
+        customers = self.filter(pk=customer_id)
+        if delta < 0:
+            customers = customers.filter(total_bookings__gte=-delta)
+        return customers.update(total_bookings=F('total_bookings') + delta)
+
+    def record_visit(self, customer_id, amount, visit_date):
+        """Atomically add to lifetime spend and move the last visit forward"""
+        return self.filter(pk=customer_id).update(
+            lifetime_spend=F('lifetime_spend') + amount,
+            last_visit_date=Greatest(Coalesce('last_visit_date', Value(visit_date)), Value(visit_date)),
+        )
+
+
 class Customer(models.Model):
     """Customer information"""
 
@@ -43,22 +89,113 @@ class Customer(models.Model):
     email = models.EmailField()
     phone_number = models.CharField(max_length=17)
     preferences = models.TextField(blank=True, help_text="Customer preferences or notes")
-    total_bookings = models.PositiveIntegerField(default=0)
+    total_bookings = models.PositiveIntegerField(default=0, help_text="Bookings that were not cancelled")
+    lifetime_spend = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text="Total price of completed bookings"
+    )
+    last_visit_date = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CustomerManager()
+
     class Meta:
         db_table = 'customers'
         ordering = ['-created_at']
+        constraints = [
+            # Blank emails (walk-ins) are allowed to repeat
+            models.UniqueConstraint(
+                fields=['email'],
+                condition=~models.Q(email=''),
+                name='customers_unique_email',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def save(self, *args, **kwargs):
+        self.email = Customer.objects.normalize_email(self.email)
+        super().save(*args, **kwargs)
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
 
 
+class BookingQuerySet(models.QuerySet):
+    """Chainable, pre-optimized query building blocks for bookings"""
+
+    ACTIVE_STATUSES = ('pending', 'confirmed')
+
+    def active(self):
+        """Bookings that still occupy a slot (pending or confirmed)"""
+        return self.filter(status__in=self.ACTIVE_STATUSES)
+
+    def between(self, start_date=None, end_date=None):
+        """Bookings within an inclusive date range; open ends are ignored"""
+        queryset = self
+        if start_date:
+            queryset = queryset.filter(booking_date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(booking_date__lte=end_date)
+        return queryset
+
+    def upcoming(self, today=None):
+        """Active bookings from today onwards, soonest first"""
+        today = today or timezone.now().date()
+        return self.active().filter(
+            booking_date__gte=today
+        ).order_by('booking_date', 'booking_time')
+
+    def for_customer(self, customer):
+        return self.filter(customer=customer)
+
+    def for_user(self, user):
+        """Bookings of the customer profile linked to ``user`` (no profile lookup)"""
+        return self.filter(customer__user=user)
+
+    def for_barber_day(self, date, barber_id=None):
+        """
+        Active bookings occupying a barber's day, in start-time order.
+
+        Only the columns needed for slot checks are loaded; the ordering
+        follows the (barber, booking_date, booking_time) index.
+        """
+        queryset = self.active().filter(booking_date=date)
+        if barber_id:
+            queryset = queryset.filter(barber_id=barber_id)
+        return queryset.only('id', 'booking_time', 'end_time').order_by('booking_time')
+
+    def with_display_relations(self):
+        """Join the relations rendered by booking lists and detail pages"""
+        return self.select_related('customer', 'service', 'barber')
+
+    def newest_first(self):
+        return self.order_by('-booking_date', '-booking_time')
+
+    def recently_created(self):
+        return self.order_by('-created_at')
+
+    def stats(self):
+        """Status counts and completed revenue in a single aggregate query"""
+        return self.aggregate(
+            total_bookings=models.Count('id'),
+            pending_bookings=models.Count('id', filter=models.Q(status='pending')),
+            confirmed_bookings=models.Count('id', filter=models.Q(status='confirmed')),
+            completed_bookings=models.Count('id', filter=models.Q(status='completed')),
+            cancelled_bookings=models.Count('id', filter=models.Q(status='cancelled')),
+            revenue=Coalesce(
+                models.Sum('service__price', filter=models.Q(status='completed')),
+                Value(0),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+
 class Booking(models.Model):
     """Booking/Appointment model"""
 
@@ -92,12 +229,17 @@ class Booking(models.Model):
     confirmed_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    objects = BookingQuerySet.as_manager()
+
     class Meta:
         db_table = 'bookings'
         ordering = ['-booking_date', '-booking_time']
         indexes = [
             models.Index(fields=['booking_date', 'booking_time']),
             models.Index(fields=['status']),
+            models.Index(fields=['barber', 'booking_date', 'booking_time']),
+            models.Index(fields=['customer', 'booking_date', 'booking_time']),
+            models.Index(fields=['created_at']),
         ]
 
     def __str__(self):
@@ -110,25 +252,59 @@ class Booking(models.Model):
             start_datetime = datetime.combine(self.booking_date, self.booking_time)
             end_datetime = start_datetime + timedelta(minutes=self.service.duration_minutes)
             self.end_time = end_datetime.time()
-        super().save(*args, **kwargs)
+
+        # Keep the customer's counters in step with the booking row
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding and self.status != 'cancelled':
+                Customer.objects.record_booking(self.customer_id)
 
     def confirm(self):
         """Confirm the booking"""
+        previous_status = self.status
         self.status = 'confirmed'
         self.confirmed_at = timezone.now()
-        self.save()
+        with transaction.atomic():
+            self.save()
+            self._publish('booking.confirmed', previous_status)
 
     def complete(self):
         """Mark booking as completed"""
+        previous_status = self.status
         self.status = 'completed'
         self.completed_at = timezone.now()
-        self.save()
+        with transaction.atomic():
+            self.save()
+            if previous_status != 'completed':
+                Customer.objects.record_visit(self.customer_id, self.service.price, self.booking_date)
+            self._publish('booking.completed', previous_status)
 
     def cancel(self, reason=''):
         """Cancel the booking"""
+        previous_status = self.status
         self.status = 'cancelled'
         self.cancellation_reason = reason
-        self.save()
+        with transaction.atomic():
+            self.save()
+            if previous_status != 'cancelled':
+                Customer.objects.record_booking(self.customer_id, -1)
+            if previous_status == 'completed':
+                Customer.objects.filter(pk=self.customer_id).update(
+                    lifetime_spend=F('lifetime_spend') - self.service.price
+                )
+            self._publish('booking.cancelled', previous_status, reason=reason)
+
+    def _publish(self, event_type, previous_status, **extra):
+        """Record the status change in the outbox (same transaction)"""
+        publish(event_type, self, {
+            'booking_id': self.pk,
+            'customer_id': self.customer_id,
+            'barber_id': self.barber_id,
+            'previous_status': previous_status,
+            'status': self.status,
+            **extra,
+        })
 
     @property
     def is_upcoming(self):
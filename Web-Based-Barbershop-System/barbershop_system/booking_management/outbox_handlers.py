@@ -0,0 +1,17 @@
+"""
+Outbox handlers for booking events
+"""
+from background.jobs import enqueue
+from background.outbox import handler
+
+
+@handler('booking.confirmed')
+@handler('booking.cancelled')
+def queue_status_email(event):
+    # Keyed on the event so a redelivered event doesn't email twice
+    enqueue(
+        'booking.send_status_email',
+        int(event.aggregate_id),
+        event.event_type,
+        dedupe_key=f'booking-status-email:{event.pk}',
+    )
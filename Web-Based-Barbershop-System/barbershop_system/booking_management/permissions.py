@@ -0,0 +1,39 @@
+"""
+Object-level permissions for bookings
+"""
+from functools import wraps
+
+from django.contrib import messages
+from django.shortcuts import get_object_or_404, redirect
+
+from security_management.principal import get_principal
+from .middleware import get_customer
+from .models import Booking
+
+
+def can_access_booking(principal, booking):
+    """Staff and admins see every booking; customers only their own"""
+    return principal.is_staff_member or booking.customer.user_id == principal.user_id
+
+
+def booking_access_required(action):
+    """
+    Decorator that fetches the booking and checks ownership in one query.
+
+    The wrapped view receives the booking (with customer, service and barber
+    already joined) instead of ``booking_id``.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, booking_id, *args, **kwargs):
+            booking = get_object_or_404(Booking.objects.with_display_relations(), id=booking_id)
+
+            if not can_access_booking(get_principal(request), booking):
+                messages.error(request, f'You do not have permission to {action} this booking.')
+                if get_customer(request) is not None:
+                    return redirect('booking:my_bookings')
+                return redirect('booking:home')
+
+            return view_func(request, booking, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,9 +1,11 @@
 """
 Business logic layer for booking management
 """
-from django.db.models import Count, Q, Sum
-from django.utils import timezone
+from django.db import transaction
+from django.db.models import Count, Q
 from datetime import datetime, timedelta
+from barbershop_system.caching import cached_service
+from transaction import ledger
 from .models import Booking, Service, Customer, Review
 
 
@@ -13,36 +15,34 @@ class BookingService:
     @staticmethod
     def create_booking(customer_data, booking_data):
         """Create a new booking with customer information"""
-        # Get or create customer
-        customer, created = Customer.objects.get_or_create(
-            email=customer_data['email'],
-            defaults={
-                'first_name': customer_data['first_name'],
-                'last_name': customer_data['last_name'],
-                'phone_number': customer_data['phone_number']
-            }
-        )
-
-        # Create booking
-        booking = Booking.objects.create(
-            customer=customer,
-            service_id=booking_data['service_id'],
-            barber_id=booking_data.get('barber_id'),
-            booking_date=booking_data['booking_date'],
-            booking_time=booking_data['booking_time'],
-            notes=booking_data.get('notes', '')
-        )
-
-        customer.total_bookings += 1
-        customer.save()
+        with transaction.atomic():
+            # Get or create customer
+            customer, created = Customer.objects.get_or_create_by_email(
+                customer_data['email'],
+                defaults={
+                    'first_name': customer_data['first_name'],
+                    'last_name': customer_data['last_name'],
+                    'phone_number': customer_data['phone_number']
+                }
+            )
+
+            # Create booking; Booking.save() bumps the customer's counter
+            booking = Booking.objects.create(
+                customer=customer,
+                service_id=booking_data['service_id'],
+                barber_id=booking_data.get('barber_id'),
+                booking_date=booking_data['booking_date'],
+                booking_time=booking_data['booking_time'],
+                notes=booking_data.get('notes', '')
+            )
 
         return booking
 
     @staticmethod
+    @cached_service(('bookings', 'services'), timeout=60)
     def get_available_time_slots(date, service_id, barber_id=None):
         """Get available time slots for a given date and service"""
-        service = Service.objects.get(id=service_id)
-        duration = service.duration_minutes
+        duration = Service.objects.values_list('duration_minutes', flat=True).get(id=service_id)
 
         # Business hours (can be configured)
         start_hour = 9
@@ -58,18 +58,16 @@ class BookingService:
             current_time += timedelta(minutes=30)  # 30-minute intervals
 
         # Get existing bookings for the date
-        query = Q(booking_date=date, status__in=['pending', 'confirmed'])
-        if barber_id:
-            query &= Q(barber_id=barber_id)
-
-        existing_bookings = Booking.objects.filter(query)
+        occupied = list(
+            Booking.objects.for_barber_day(date, barber_id).values_list('booking_time', 'end_time')
+        )
 
         # Remove occupied slots
         available_slots = []
         for slot in slots:
             is_available = True
-            for booking in existing_bookings:
-                if booking.booking_time <= slot < booking.end_time:
+            for booking_time, booking_end in occupied:
+                if booking_time <= slot < booking_end:
                     is_available = False
                     break
             if is_available:
@@ -80,15 +78,12 @@ class BookingService:
     @staticmethod
     def get_upcoming_bookings(customer=None, barber=None, limit=None):
         """Get upcoming bookings"""
-        today = timezone.now().date()
-        query = Q(booking_date__gte=today, status__in=['pending', 'confirmed'])
+        bookings = Booking.objects.upcoming().with_display_relations()
 
         if customer:
-            query &= Q(customer=customer)
+            bookings = bookings.for_customer(customer)
         if barber:
-            query &= Q(barber=barber)
-
-        bookings = Booking.objects.filter(query).order_by('booking_date', 'booking_time')
+            bookings = bookings.filter(barber=barber)
 
         if limit:
             bookings = bookings[:limit]
@@ -96,29 +91,19 @@ class BookingService:
         return bookings
 
     @staticmethod
+    @cached_service('bookings', timeout=60)
     def get_booking_statistics(start_date=None, end_date=None):
-        """Get booking statistics for dashboard"""
-        query = Q()
-        if start_date:
-            query &= Q(booking_date__gte=start_date)
-        if end_date:
-            query &= Q(booking_date__lte=end_date)
-
-        bookings = Booking.objects.filter(query)
-
-        stats = {
-            'total_bookings': bookings.count(),
-            'pending_bookings': bookings.filter(status='pending').count(),
-            'confirmed_bookings': bookings.filter(status='confirmed').count(),
-            'completed_bookings': bookings.filter(status='completed').count(),
-            'cancelled_bookings': bookings.filter(status='cancelled').count(),
-            'revenue': bookings.filter(
-                status='completed'
-            ).aggregate(
-                total=Sum('service__price')
-            )['total'] or 0
-        }
-
+        """
+        Get booking statistics for dashboard.
+
+        ``revenue`` is list price of completed bookings; ``net_revenue``
+        comes from the ledger and accounts for refunds, discounts and tax.
+        Cached for a minute; booking changes clear it straight away. Read
+        from the primary: a lagging replica would put the stats from before
+        a change back in the cache for the full minute.
+        """
+        stats = Booking.objects.between(start_date, end_date).stats()
+        stats['net_revenue'] = ledger.net_revenue(start_date, end_date)
         return stats
 
     @staticmethod
@@ -144,13 +129,14 @@ class ServiceManagement:
         return Service.objects.filter(query).order_by('name')
 
     @staticmethod
+    @cached_service(('bookings', 'services'))
     def get_popular_services(limit=5):
         """Get most popular services"""
-        return Service.objects.filter(
+        return list(Service.objects.filter(
             is_active=True
         ).annotate(
             booking_count=Count('bookings')
-        ).order_by('-booking_count')[:limit]
+        ).order_by('-booking_count')[:limit])
 
 
 class ReviewService:
@@ -0,0 +1,39 @@
+"""
+Signal handlers for booking management
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from barbershop_system.caching import invalidate
+from core.images import queue_variants
+from security_management.principal import invalidate_principal
+from .models import Booking, Customer, Service
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def customer_profile_changed(sender, instance, **kwargs):
+    """The session principal caches the customer profile id"""
+    if instance.user_id:
+        invalidate_principal(instance.user_id)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    """Statistics and free time slots are cached by BookingService"""
+    invalidate('bookings')
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def service_changed(sender, instance, **kwargs):
+    invalidate('services')
+
+
+@receiver(post_save, sender=Service)
+def service_image_saved(sender, instance, update_fields=None, **kwargs):
+    """Resize a new image in the background, so the upload returns at once"""
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    queue_variants(instance, 'image', Service.IMAGE_WIDTHS)
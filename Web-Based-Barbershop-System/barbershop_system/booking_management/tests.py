@@ -1,3 +1,395 @@
-from django.test import TestCase
+from datetime import date, time, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from barbershop_system.caching import invalidate
+from security_management.models import User
+from security_management.principal import get_principal
+from . import views
+from .models import Booking, Customer, Service
+from .services import BookingService
+
+
+class BookingFixtureMixin:
+    """Shared fixture: one barber, two customers and a spread of bookings"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date.today()
+        cls.barber = User.objects.create_user('barber', password='pw', role='barber')
+        cls.other_barber = User.objects.create_user('barber2', password='pw', role='barber')
+        cls.user = User.objects.create_user('alice', password='pw', email='alice@example.com')
+        cls.customer = Customer.objects.create(
+            user=cls.user, first_name='Alice', last_name='Smith',
+            email='alice@example.com', phone_number='+15550001'
+        )
+        cls.other_customer = Customer.objects.create(
+            first_name='Bob', last_name='Jones', email='bob@example.com', phone_number='+15550002'
+        )
+        cls.haircut = Service.objects.create(
+            name='Haircut', description='Classic cut', duration_minutes=30, price=Decimal('25.00')
+        )
+        cls.shave = Service.objects.create(
+            name='Shave', description='Hot towel shave', duration_minutes=60, price=Decimal('40.00')
+        )
+
+        def book(customer, service, day, hour, status='pending', barber=None):
+            return Booking.objects.create(
+                customer=customer, service=service, barber=barber or cls.barber,
+                booking_date=day, booking_time=time(hour, 0), status=status
+            )
+
+        tomorrow = cls.today + timedelta(days=1)
+        cls.pending = book(cls.customer, cls.haircut, tomorrow, 9)
+        cls.confirmed = book(cls.customer, cls.shave, tomorrow, 11, status='confirmed')
+        cls.other_barber_booking = book(
+            cls.other_customer, cls.haircut, tomorrow, 14, barber=cls.other_barber
+        )
+        cls.completed = book(cls.customer, cls.shave, cls.today - timedelta(days=3), 10, 'completed')
+        cls.cancelled = book(cls.other_customer, cls.haircut, tomorrow, 15, 'cancelled')
+
+
+class BookingQuerySetTests(BookingFixtureMixin, TestCase):
+
+    def test_active_excludes_finished_bookings(self):
+        with self.assertNumQueries(1):
+            ids = set(Booking.objects.active().values_list('id', flat=True))
+        self.assertEqual(ids, {self.pending.id, self.confirmed.id, self.other_barber_booking.id})
+
+    def test_between_is_inclusive_and_open_ended(self):
+        with self.assertNumQueries(1):
+            past = list(Booking.objects.between(end_date=self.today))
+        self.assertEqual(past, [self.completed])
+        self.assertEqual(Booking.objects.between(self.today, self.today).count(), 0)
+
+    def test_upcoming_orders_by_date_and_time(self):
+        with self.assertNumQueries(1):
+            bookings = list(Booking.objects.upcoming(today=self.today))
+        self.assertEqual(bookings, [self.pending, self.confirmed, self.other_barber_booking])
+
+    def test_for_customer_and_for_user_agree(self):
+        with self.assertNumQueries(2):
+            by_customer = set(Booking.objects.for_customer(self.customer))
+            by_user = set(Booking.objects.for_user(self.user))
+        self.assertEqual(by_customer, by_user)
+        self.assertEqual(len(by_user), 3)
+
+    def test_for_barber_day_defers_unneeded_columns(self):
+        tomorrow = self.today + timedelta(days=1)
+        with self.assertNumQueries(1):
+            bookings = list(Booking.objects.for_barber_day(tomorrow, self.barber.id))
+        self.assertEqual(bookings, [self.pending, self.confirmed])
+        self.assertIn('notes', bookings[0].get_deferred_fields())
+
+    def test_with_display_relations_avoids_n_plus_one(self):
+        with self.assertNumQueries(1):
+            for booking in Booking.objects.with_display_relations():
+                booking.customer.full_name
+                booking.service.name
+                booking.barber and booking.barber.get_full_name()
+
+    def test_stats_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            stats = Booking.objects.stats()
+        self.assertEqual(stats['total_bookings'], 5)
+        self.assertEqual(stats['pending_bookings'], 2)
+        self.assertEqual(stats['confirmed_bookings'], 1)
+        self.assertEqual(stats['completed_bookings'], 1)
+        self.assertEqual(stats['cancelled_bookings'], 1)
+        self.assertEqual(stats['revenue'], Decimal('40.00'))
+
+    def test_stats_on_empty_range(self):
+        stats = Booking.objects.between(self.today + timedelta(days=30)).stats()
+        self.assertEqual(stats['total_bookings'], 0)
+        self.assertEqual(stats['revenue'], 0)
+
+
+class BookingServiceQueryTests(BookingFixtureMixin, TestCase):
+
+    def setUp(self):
+        invalidate('bookings', 'services')
+
+    def test_available_time_slots(self):
+        tomorrow = self.today + timedelta(days=1)
+        with self.assertNumQueries(2):
+            slots = BookingService.get_available_time_slots(tomorrow, self.haircut.id, self.barber.id)
+        self.assertNotIn(time(9, 0), slots)
+        self.assertNotIn(time(11, 30), slots)
+        self.assertIn(time(14, 0), slots)
+
+    def test_time_slots_are_cached_until_bookings_change(self):
+        tomorrow = self.today + timedelta(days=1)
+        BookingService.get_available_time_slots(tomorrow, self.haircut.id, self.barber.id)
+        with self.assertNumQueries(0):
+            slots = BookingService.get_available_time_slots(tomorrow, self.haircut.id, self.barber.id)
+        self.assertIn(time(14, 0), slots)
+
+        Booking.objects.create(
+            customer=self.customer, service=self.haircut, barber=self.barber,
+            booking_date=tomorrow, booking_time=time(14, 0)
+        )
+        slots = BookingService.get_available_time_slots(tomorrow, self.haircut.id, self.barber.id)
+        self.assertNotIn(time(14, 0), slots)
+
+    def test_upcoming_bookings_render_without_extra_queries(self):
+        with self.assertNumQueries(1):
+            for booking in BookingService.get_upcoming_bookings(customer=self.customer, limit=5):
+                booking.service.name
+
+    def test_booking_statistics(self):
+        with self.assertNumQueries(2):  # booking aggregate + ledger daily totals
+            stats = BookingService.get_booking_statistics(end_date=self.today)
+        self.assertEqual(stats['completed_bookings'], 1)
+        self.assertEqual(stats['revenue'], Decimal('40.00'))
+        self.assertEqual(stats['net_revenue'], 0)
+
+
+class BookingViewQueryTests(BookingFixtureMixin, TestCase):
+
+    def test_my_bookings_query_count_is_constant(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('booking:my_bookings'))  # first hit stores the session principal
+        # session, bookings with joined relations
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('booking:my_bookings'))
+        self.assertEqual(len(response.context['bookings']), 3)
+
+    def test_booking_detail_checks_ownership_in_one_query(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('booking:my_bookings'))  # first hit stores the session principal
+        # session, booking joined with customer/service/barber
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('booking:booking_detail', args=[self.pending.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_customer_cannot_open_someone_elses_booking(self):
+        self.client.force_login(self.user)
+        for name in ('booking_detail', 'booking_edit', 'booking_cancel'):
+            response = self.client.get(reverse(f'booking:{name}', args=[self.other_barber_booking.id]))
+            self.assertRedirects(response, reverse('booking:my_bookings'), fetch_redirect_response=False)
+
+    def test_user_without_profile_is_sent_home(self):
+        stranger = User.objects.create_user('stranger', password='pw')
+        self.client.force_login(stranger)
+        response = self.client.get(reverse('booking:booking_detail', args=[self.pending.id]))
+        self.assertRedirects(response, reverse('booking:home'), fetch_redirect_response=False)
+
+    def test_staff_can_open_any_booking(self):
+        staff = User.objects.create_user('desk', password='pw', role='staff')
+        self.client.force_login(staff)
+        response = self.client.get(reverse('booking:booking_detail', args=[self.other_barber_booking.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_booking_is_404(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('booking:booking_detail', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_booking_form_creates_booking(self):
+        self.client.force_login(self.user)
+        day = self.today + timedelta(days=2)
+        response = self.client.post(reverse('booking:book_appointment'), {
+            'service': self.shave.id, 'barber': self.barber.id,
+            'booking_date': day.isoformat(), 'booking_time': '10:30',
+        })
+        self.assertRedirects(response, reverse('booking:my_bookings'), fetch_redirect_response=False)
+        booking = Booking.objects.get(booking_date=day)
+        self.assertEqual((booking.customer, booking.end_time), (self.customer, time(11, 30)))
+
+    def _book(self, user, **data):
+        self.client.force_login(user)
+        day = self.today + timedelta(days=2)
+        return self.client.post(reverse('booking:book_appointment'), {
+            'service': self.shave.id, 'barber': self.barber.id,
+            'booking_date': day.isoformat(), 'booking_time': '10:30', **data,
+        })
+
+    def test_booking_form_claims_guest_profile_by_account_email(self):
+        user = User.objects.create_user('bobby', password='pw', email='BOB@example.com')
+        response = self._book(user)
+        self.assertRedirects(response, reverse('booking:my_bookings'), fetch_redirect_response=False)
+        self.other_customer.refresh_from_db()
+        self.assertEqual(self.other_customer.user, user)
+
+    def test_booking_form_does_not_book_under_another_users_profile(self):
+        # Account emails are not unique, so another account may share Alice's
+        user = User.objects.create_user('mallory', password='pw', email='alice@example.com')
+        response = self._book(user)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Booking.objects.filter(booking_date=self.today + timedelta(days=2)).exists())
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.user, self.user)
+
+    def test_booking_form_ignores_typed_email_of_a_guest_profile(self):
+        user = User.objects.create_user('mallory', password='pw')
+        response = self._book(user, customer_email='bob@example.com', customer_name='Mal Lory')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Booking.objects.filter(booking_date=self.today + timedelta(days=2)).exists())
+        self.other_customer.refresh_from_db()
+        self.assertIsNone(self.other_customer.user)
+
+    def test_booking_form_creates_profile_from_typed_email(self):
+        user = User.objects.create_user('newcomer', password='pw')
+        response = self._book(user, customer_email='new@example.com', customer_name='New Comer')
+        self.assertRedirects(response, reverse('booking:my_bookings'), fetch_redirect_response=False)
+        customer = Customer.objects.get(user=user)
+        self.assertEqual((customer.email, customer.first_name, customer.last_name),
+                         ('new@example.com', 'New', 'Comer'))
+
+    def test_availability_lists_free_slots(self):
+        invalidate('bookings', 'services')
+        tomorrow = self.today + timedelta(days=1)
+        response = self.client.get(reverse('booking:availability'), {
+            'date': tomorrow.isoformat(), 'service': self.haircut.id, 'barber': self.barber.id,
+        })
+        slots = response.json()['slots']
+        self.assertEqual(slots[:2], ['09:30', '10:00'])
+        self.assertNotIn('11:00', slots)
+        self.assertNotIn('11:30', slots)
+        self.assertIn('12:00', slots)
+
+    def test_availability_rejects_bad_parameters(self):
+        url = reverse('booking:availability')
+        self.assertEqual(self.client.get(url, {'date': 'soon', 'service': self.haircut.id}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'date': '2030-01-01', 'service': 999999}).status_code, 404)
+
+    def test_admin_dashboard_query_count_is_constant(self):
+        # '/admin/dashboard/' is shadowed by the Django admin site, so call the view directly
+        request = RequestFactory().get('/admin/dashboard/')
+        request.user = User.objects.create_user('boss', password='pw', role='admin')
+        get_principal(request)
+        # range count, stats aggregate, recent bookings with joined relations
+        with self.assertNumQueries(3):
+            response = views.admin_dashboard(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Alice Smith')
+
+
+class CustomerEmailTests(TestCase):
+
+    def test_email_is_normalized_on_save(self):
+        customer = Customer.objects.create(
+            first_name='Cara', last_name='Lee', email='  Cara.Lee@Example.COM ', phone_number='1'
+        )
+        customer.refresh_from_db()
+        self.assertEqual(customer.email, 'cara.lee@example.com')
+
+    def test_get_or_create_by_email_matches_case_insensitively(self):
+        first, created = Customer.objects.get_or_create_by_email(
+            'dan@example.com', defaults={'first_name': 'Dan', 'last_name': 'Ng', 'phone_number': '1'}
+        )
+        self.assertTrue(created)
+        with self.assertNumQueries(1):
+            second, created = Customer.objects.get_or_create_by_email(' DAN@example.com')
+        self.assertFalse(created)
+        self.assertEqual(first, second)
+
+    def test_duplicate_email_is_rejected(self):
+        Customer.objects.create(first_name='E', last_name='F', email='e@example.com', phone_number='1')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Customer.objects.create(first_name='E', last_name='F', email='E@example.com', phone_number='2')
+
+    def test_blank_emails_may_repeat(self):
+        first, _ = Customer.objects.get_or_create_by_email('', defaults={'first_name': 'Walk', 'last_name': 'In'})
+        second, created = Customer.objects.get_or_create_by_email('', defaults={'first_name': 'Walk', 'last_name': 'In'})
+        self.assertTrue(created)
+        self.assertNotEqual(first, second)
+
+    def test_dedupe_migration_merges_bookings_into_oldest_customer(self):
+        migration = import_module('booking_management.migrations.0004_dedupe_customer_emails')
+        user = User.objects.create_user('gina', password='pw')
+        service = Service.objects.create(name='Cut', description='', duration_minutes=30, price=10)
+        keeper = Customer.objects.create(first_name='G', last_name='H', email='g@example.com',
+                                         phone_number='', total_bookings=1)
+        duplicate = Customer.objects.create(first_name='G', last_name='H', email='tmp@example.com',
+                                            phone_number='555', total_bookings=2, user=user)
+        # Simulate a legacy, un-normalized duplicate written before save() normalized emails
+        Customer.objects.filter(pk=duplicate.pk).update(email=' G@Example.com')
+        booking = Booking.objects.create(customer=duplicate, service=service,
+                                         booking_date=date.today(), booking_time=time(9, 0))
+
+        migration.merge_duplicate_customers(django_apps, None)
+
+        keeper.refresh_from_db()
+        booking.refresh_from_db()
+        self.assertFalse(Customer.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(booking.customer, keeper)
+        self.assertEqual(keeper.total_bookings, 4)
+        self.assertEqual(keeper.phone_number, '555')
+        self.assertEqual(keeper.user, user)
+
+
+    def test_dedupe_migration_refuses_to_merge_different_accounts(self):
+        migration = import_module('booking_management.migrations.0004_dedupe_customer_emails')
+        first = Customer.objects.create(first_name='I', last_name='J', email='i@example.com', phone_number='',
+                                        user=User.objects.create_user('ivy', password='pw'))
+        second = Customer.objects.create(first_name='I', last_name='J', email='tmp@example.com', phone_number='',
+                                         user=User.objects.create_user('ian', password='pw'))
+        Customer.objects.filter(pk=second.pk).update(email='I@example.com ')
+
+        with self.assertRaisesMessage(RuntimeError, f'i@example.com (customers {first.pk}, {second.pk})'):
+            migration.merge_duplicate_customers(django_apps, None)
+        self.assertEqual(Customer.objects.filter(pk__in=[first.pk, second.pk]).count(), 2)
+
+    def test_email_lookup_uses_unique_index(self):
+        plan = Customer.objects.exclude(email='').filter(email='kim@example.com').explain()
+        self.assertIn('customers_unique_email', plan)
+class CustomerCounterTests(BookingFixtureMixin, TestCase):
+
+    def test_fixture_counters_track_creation(self):
+        self.customer.refresh_from_db()
+        self.other_customer.refresh_from_db()
+        # Cancelled bookings are not counted
+        self.assertEqual(self.customer.total_bookings, 3)
+        self.assertEqual(self.other_customer.total_bookings, 1)
+
+    def test_cancel_decrements_counter(self):
+        self.pending.cancel('Running late')
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.total_bookings, 2)
+        # Cancelling twice is a no-op for the counter
+        self.pending.cancel('Again')
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.total_bookings, 2)
+
+    def test_complete_records_spend_and_last_visit(self):
+        self.confirmed.complete()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.lifetime_spend, Decimal('40.00'))
+        self.assertEqual(self.customer.last_visit_date, self.confirmed.booking_date)
+
+    def test_create_booking_service_counts_once(self):
+        booking = BookingService.create_booking(
+            {'email': 'ALICE@example.com', 'first_name': 'Alice', 'last_name': 'Smith', 'phone_number': '1'},
+            {'service_id': self.haircut.id, 'booking_date': self.today, 'booking_time': time(16, 0)},
+        )
+        self.assertEqual(booking.customer, self.customer)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.total_bookings, 4)
+
+    def test_reconcile_command_repairs_drift(self):
+        Customer.objects.update(total_bookings=99, lifetime_spend=0, last_visit_date=None)
+        out = StringIO()
+        call_command('reconcile_customer_counters', chunk_size=1, stdout=out)
+        self.assertIn('2 updated', out.getvalue())
+
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.total_bookings, 3)
+        self.assertEqual(self.customer.lifetime_spend, Decimal('40.00'))
+        self.assertEqual(self.customer.last_visit_date, self.completed.booking_date)
+        self.other_customer.refresh_from_db()
+        self.assertEqual(self.other_customer.total_bookings, 1)
+        self.assertIsNone(self.other_customer.last_visit_date)
+
+    def test_reconcile_command_dry_run_writes_nothing(self):
+        Customer.objects.update(total_bookings=99)
+        call_command('reconcile_customer_counters', dry_run=True, stdout=StringIO())
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.total_bookings, 99)
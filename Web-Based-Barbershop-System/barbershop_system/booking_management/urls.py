@@ -10,6 +10,7 @@ urlpatterns = [
     # Public pages
     path('', views.home, name='home'),
     path('services/', views.services_list, name='services_list'),
+    path('availability/', views.availability, name='availability'),
 
     # Booking operations (CRUD)
     path('book/', views.book_appointment, name='book_appointment'),
@@ -1,8 +1,17 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from datetime import date
+
+from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.http import JsonResponse
+from django.utils.dateparse import parse_date, parse_time
+from django.views.decorators.http import require_GET
+from barbershop_system.routers import use_replica
+from security_management.decorators import login_required
+from security_management.principal import get_principal
 from .models import Service, Booking, Customer
+from .middleware import get_customer
+from .permissions import booking_access_required
+from .services import BookingService
 
 
 def home(request):
@@ -33,36 +42,78 @@ def services_list(request):
     return render(request, 'booking_management/services.html', context)
 
 
+@require_GET
+def availability(request):
+    """Free start times for a service on a date, optionally with one barber"""
+    try:
+        day = date.fromisoformat(request.GET.get('date', ''))
+        service_id = int(request.GET.get('service', ''))
+        barber_id = int(request.GET['barber']) if request.GET.get('barber') else None
+    except ValueError:
+        return JsonResponse({'error': 'Give a YYYY-MM-DD date and numeric service and barber ids.'}, status=400)
+    if not Service.objects.filter(id=service_id, is_active=True).exists():
+        return JsonResponse({'error': 'Unknown service.'}, status=404)
+
+    slots = BookingService.get_available_time_slots(day, service_id, barber_id)
+    return JsonResponse({'date': day.isoformat(), 'slots': [slot.strftime('%H:%M') for slot in slots]})
+
+
+def _customer_for_user(request):
+    """
+    The customer profile a logged-in user without one books under.
+
+    A guest profile is only claimed through the account's own email; an
+    email typed into the form never matches an existing profile, so
+    nobody can take over another customer's bookings with it. Returns
+    None when the email already belongs to someone else's profile.
+    """
+    name = request.POST.get('customer_name', '').split()
+    details = {
+        'user': request.user,
+        'first_name': request.user.first_name or (name[0] if name else ''),
+        'last_name': request.user.last_name or ' '.join(name[1:]),
+        'phone_number': request.POST.get('customer_phone', ''),
+    }
+    if not request.user.email:
+        # A guest profile under the typed email is left alone, not claimed
+        customer, created = Customer.objects.get_or_create_by_email(
+            request.POST.get('customer_email', ''), defaults=details
+        )
+        return customer if customer.user_id == request.user.pk else None
+
+    customer, created = Customer.objects.get_or_create_by_email(request.user.email, defaults=details)
+    # Claim a guest profile previously created under the same email
+    if customer.user_id is None:
+        customer.user = request.user
+        customer.save(update_fields=['user', 'updated_at'])
+    return customer if customer.user_id == request.user.pk else None
+
+
 @login_required
 def book_appointment(request):
     """Book appointment page"""
     if request.method == 'POST':
         # Get or create customer
-        try:
-            customer = Customer.objects.get(user=request.user)
-        except Customer.DoesNotExist:
-            customer = Customer.objects.create(
-                user=request.user,
-                first_name=request.user.first_name or request.POST.get('customer_name', '').split()[0],
-                last_name=request.user.last_name or ' '.join(request.POST.get('customer_name', '').split()[1:]),
-                email=request.user.email or request.POST.get('customer_email', ''),
-                phone_number=request.POST.get('customer_phone', '')
-            )
-
-        # Create booking
-        try:
-            booking = Booking.objects.create(
-                customer=customer,
-                service_id=request.POST.get('service'),
-                barber_id=request.POST.get('barber') if request.POST.get('barber') else None,
-                booking_date=request.POST.get('booking_date'),
-                booking_time=request.POST.get('booking_time'),
-                notes=request.POST.get('notes', '')
-            )
-            messages.success(request, f'Booking created successfully! Booking ID: {booking.id}')
-            return redirect('booking:my_bookings')
-        except Exception as e:
-            messages.error(request, f'Error creating booking: {str(e)}')
+        customer = get_customer(request) or _customer_for_user(request)
+
+        if customer is None:
+            messages.error(request, 'That email address belongs to another customer profile.')
+        else:
+            # Create booking
+            try:
+                booking = Booking.objects.create(
+                    customer=customer,
+                    service_id=request.POST.get('service'),
+                    barber_id=request.POST.get('barber') if request.POST.get('barber') else None,
+                    # Parsed here: Booking.save() works out end_time from real date and time values
+                    booking_date=parse_date(request.POST.get('booking_date', '')),
+                    booking_time=parse_time(request.POST.get('booking_time', '')),
+                    notes=request.POST.get('notes', '')
+                )
+                messages.success(request, f'Booking created successfully! Booking ID: {booking.id}')
+                return redirect('booking:my_bookings')
+            except Exception as e:
+                messages.error(request, f'Error creating booking: {str(e)}')
 
     # Get services and barbers for form
     services = Service.objects.filter(is_active=True)
@@ -80,11 +131,8 @@ def book_appointment(request):
 @login_required
 def my_bookings(request):
     """Customer's bookings page"""
-    try:
-        customer = Customer.objects.get(user=request.user)
-        bookings = Booking.objects.filter(customer=customer).order_by('-booking_date', '-booking_time')
-    except Customer.DoesNotExist:
-        bookings = []
+    principal = get_principal(request)
+    bookings = Booking.objects.for_user(principal.user_id).with_display_relations().newest_first()
 
     context = {
         'bookings': bookings,
@@ -99,7 +147,7 @@ def admin_dashboard(request):
     from datetime import datetime, timedelta
 
     # Check if user is admin or staff
-    if not request.user.is_staff_member and not request.user.is_admin:
+    if not get_principal(request).is_staff_member:
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('booking:home')
 
@@ -108,16 +156,14 @@ def admin_dashboard(request):
     last_month = today - timedelta(days=30)
 
     # Calculate stats
-    total_bookings = Booking.objects.filter(
-        booking_date__gte=last_month,
-        booking_date__lte=today
-    ).count()
-
-    pending_bookings = Booking.objects.filter(status='pending').count()
-    completed_bookings = Booking.objects.filter(status='completed').count()
+    with use_replica():
+        total_bookings = Booking.objects.between(last_month, today).count()
+        stats = Booking.objects.stats()
+    pending_bookings = stats['pending_bookings']
+    completed_bookings = stats['completed_bookings']
 
     # Get recent bookings
-    bookings = Booking.objects.all().order_by('-created_at')[:10]
+    bookings = Booking.objects.with_display_relations().recently_created()[:10]
 
     context = {
         'total_bookings': total_bookings,
@@ -130,21 +176,9 @@ def admin_dashboard(request):
 
 
 @login_required
-def booking_detail(request, booking_id):
+@booking_access_required('view')
+def booking_detail(request, booking):
     """View booking details"""
-    booking = get_object_or_404(Booking, id=booking_id)
-
-    # Check if user has permission to view this booking
-    try:
-        customer = Customer.objects.get(user=request.user)
-        if booking.customer != customer and not request.user.is_staff_member and not request.user.is_admin:
-            messages.error(request, 'You do not have permission to view this booking.')
-            return redirect('booking:my_bookings')
-    except Customer.DoesNotExist:
-        if not request.user.is_staff_member and not request.user.is_admin:
-            messages.error(request, 'You do not have permission to view this booking.')
-            return redirect('booking:home')
-
     context = {
         'booking': booking,
     }
@@ -153,21 +187,9 @@ def booking_detail(request, booking_id):
 
 
 @login_required
-def booking_edit(request, booking_id):
+@booking_access_required('edit')
+def booking_edit(request, booking):
     """Edit booking"""
-    booking = get_object_or_404(Booking, id=booking_id)
-
-    # Check if user has permission to edit this booking
-    try:
-        customer = Customer.objects.get(user=request.user)
-        if booking.customer != customer and not request.user.is_staff_member and not request.user.is_admin:
-            messages.error(request, 'You do not have permission to edit this booking.')
-            return redirect('booking:my_bookings')
-    except Customer.DoesNotExist:
-        if not request.user.is_staff_member and not request.user.is_admin:
-            messages.error(request, 'You do not have permission to edit this booking.')
-            return redirect('booking:home')
-
     # Check if booking can be edited
     if booking.status not in ['pending', 'confirmed']:
         messages.error(request, 'This booking cannot be edited.')
@@ -202,21 +224,9 @@ def booking_edit(request, booking_id):
 
 
 @login_required
-def booking_cancel(request, booking_id):
+@booking_access_required('cancel')
+def booking_cancel(request, booking):
     """Cancel booking"""
-    booking = get_object_or_404(Booking, id=booking_id)
-
-    # Check if user has permission to cancel this booking
-    try:
-        customer = Customer.objects.get(user=request.user)
-        if booking.customer != customer and not request.user.is_staff_member and not request.user.is_admin:
-            messages.error(request, 'You do not have permission to cancel this booking.')
-            return redirect('booking:my_bookings')
-    except Customer.DoesNotExist:
-        if not request.user.is_staff_member and not request.user.is_admin:
-            messages.error(request, 'You do not have permission to cancel this booking.')
-            return redirect('booking:home')
-
     # Check if booking can be cancelled
     if not booking.can_cancel:
         messages.error(request, 'This booking cannot be cancelled.')
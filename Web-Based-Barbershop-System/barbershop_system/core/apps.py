@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        from barbershop_system.database import configure_connection
+        connection_created.connect(configure_connection, dispatch_uid='barbershop_system.configure_connection')
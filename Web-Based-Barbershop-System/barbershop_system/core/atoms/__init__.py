@@ -3,12 +3,14 @@ Atoms - The smallest, most fundamental UI components
 These are basic HTML elements that cannot be broken down further
 """
 from .buttons import Button, IconButton, LinkButton
+from .images import ResponsiveImage
 from .inputs import TextInput, EmailInput, PasswordInput, DateInput, TimeInput
 from .labels import Label, Badge, Tag
 from .typography import Heading, Paragraph, Span
 
 __all__ = [
     'Button', 'IconButton', 'LinkButton',
+    'ResponsiveImage',
     'TextInput', 'EmailInput', 'PasswordInput', 'DateInput', 'TimeInput',
     'Label', 'Badge', 'Tag',
     'Heading', 'Paragraph', 'Span'
@@ -0,0 +1,71 @@
+"""
+Image Atoms - Responsive images backed by the variants in core.images
+"""
+from django.utils.html import format_html
+
+from core.images import current_variants, srcset
+
+
+class ResponsiveImage:
+    """
+    <picture> offering the WebP variants and a JPEG/PNG fallback, so the
+    browser downloads the smallest one that fills ``sizes``. Falls back to
+    a plain <img> of the upload until its variants have been made.
+    """
+
+    def __init__(self, image, variants=None, alt='', sizes='100vw', css_class='', style='', lazy=True):
+        self.image = image
+        self.variants = current_variants(image, variants)
+        self.alt = alt
+        self.sizes = sizes
+        self.css_class = css_class
+        self.style = style
+        self.lazy = lazy
+
+    @classmethod
+    def of(cls, instance, field_name, **kwargs):
+        """The image in ``instance.<field_name>`` with its recorded variants"""
+        return cls(getattr(instance, field_name), getattr(instance, f'{field_name}_variants', None), **kwargs)
+
+    @property
+    def url(self):
+        """Largest fallback variant, or the upload itself"""
+        if self.variants is None:
+            return self.image.url
+        fallback = self.variants.get('png') or self.variants['jpeg']
+        return self.image.storage.url(fallback[-1][1])
+
+    def srcset(self, fmt=None):
+        return srcset(self.image, self.variants, fmt, storage=self.image.storage)
+
+    def render(self):
+        """Render picture HTML"""
+        if not self.image:
+            return ''
+        attrs = format_html(
+            'class="{}" alt="{}"{}{}',
+            self.css_class,
+            self.alt,
+            format_html(' style="{}"', self.style) if self.style else '',
+            format_html(' loading="lazy" decoding="async"') if self.lazy else '',
+        )
+        if self.variants is None:
+            return format_html('<img src="{}" {}>', self.image.url, attrs)
+
+        return format_html(
+            '<picture>'
+            '<source type="image/webp" srcset="{}" sizes="{}">'
+            '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" {}>'
+            '</picture>',
+            self.srcset('webp'),
+            self.sizes,
+            self.url,
+            self.srcset(),
+            self.sizes,
+            self.variants['width'],
+            self.variants['height'],
+            attrs,
+        )
+
+    def __str__(self):
+        return str(self.render())
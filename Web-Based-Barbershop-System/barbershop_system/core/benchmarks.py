@@ -0,0 +1,224 @@
+"""
+Benchmarks for the booking hot paths
+
+Each size seeds a synthetic shop (core.synthetic) inside a transaction
+that is rolled back afterwards, so the suite can run against a developer
+database without leaving anything behind. Every case is run a few times
+to warm up, then timed over a number of repetitions; one extra run counts
+its queries. Cached services are timed without their cache, as a cache
+hit would only measure the cache.
+
+Results are plain dicts, written as JSON and compared with a saved
+baseline: a case regresses when its median time grows by more than the
+threshold, or when it runs more queries than before.
+"""
+import platform
+import statistics
+import time
+from datetime import time as clock, timedelta
+from itertools import count
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from barbershop_system.caching import invalidate
+from booking_management.models import Booking, Customer, Service
+from booking_management.services import BookingService
+from core.molecules import BookingCard, BookingTable, ServiceCard
+from core.organisms import StatsDashboard
+from security_management.models import User
+from .synthetic import SyntheticShop
+
+FORMAT_VERSION = 1
+
+# SyntheticShop arguments per size; the seeds keep sizes apart from each other and from generate_data
+SIZES = {
+    'small': {'seed': 47001, 'barbers': 3, 'customers': 300, 'years': 0.25},
+    'medium': {'seed': 47002, 'barbers': 8, 'customers': 2000, 'years': 1},
+    'large': {'seed': 47003, 'barbers': 12, 'customers': 10000, 'years': 3},
+}
+
+TABLE_ROWS = 50
+# Below this, run-to-run jitter exceeds any sensible percentage threshold
+MIN_REGRESSION_MS = 0.1
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def measure(case, warmup=3, repeat=20):
+    """Time ``case`` after ``warmup`` runs; the query count comes from one further run"""
+    for _ in range(warmup):
+        case()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        case()
+        timings.append((time.perf_counter() - started) * 1000)
+    with CaptureQueriesContext(connection) as queries:
+        case()
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 4),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        'min_ms': round(timings[0], 4),
+        'queries': len(queries),
+    }
+
+
+def _booking_row(booking):
+    return {
+        'id': booking.pk,
+        'customer_name': booking.customer.full_name,
+        'service_name': booking.service.name,
+        'date': booking.booking_date,
+        'time': booking.booking_time,
+        'barber_name': booking.barber.get_full_name() if booking.barber else 'Any',
+        'status': booking.status,
+    }
+
+
+class Fixture:
+    """The rows the cases work on, picked from a seeded shop"""
+
+    def __init__(self, shop):
+        self.today = shop.today
+        self.barber = shop.barbers[0]
+        self.service = Service.objects.filter(is_active=True).order_by('id').first()
+        self.busy_day = (
+            Booking.objects.filter(barber=self.barber, booking_date__gte=self.today)
+            .order_by().values_list('booking_date', flat=True).first()
+        ) or self.today
+        self.period = (self.today - timedelta(days=30), self.today)
+
+        # The busiest customer gets a login, so my_bookings lists as much as it can
+        busiest = (
+            Customer.objects.filter(pk__in=shop.customer_ids).order_by('-total_bookings', 'pk').first()
+        )
+        user = User.objects.create_user(f'bench{shop.seed}', password='benchmark', role='customer')
+        busiest.user = user
+        busiest.save(update_fields=['user'])
+        self.client = Client()
+        self.client.force_login(user)
+
+        recent = Booking.objects.with_display_relations().filter(barber__in=shop.barbers).newest_first()
+        self.rows = [_booking_row(booking) for booking in recent[:TABLE_ROWS]]
+        self.services = list(Service.objects.filter(is_active=True))
+        self.stats = BookingService.get_booking_statistics.uncached(*self.period)
+        self._emails = count()
+
+    def create_booking(self):
+        n = next(self._emails)
+        BookingService.create_booking(
+            {'email': f'bench-{n}@customers.example.com', 'first_name': 'Bench',
+             'last_name': f'Customer {n}', 'phone_number': '+639000000000'},
+            {'service_id': self.service.pk, 'barber_id': self.barber.pk,
+             'booking_date': self.today + timedelta(days=7), 'booking_time': clock(9)},
+        )
+
+    def my_bookings(self):
+        response = self.client.get(reverse('booking:my_bookings'))
+        if response.status_code != 200:
+            raise BenchmarkError(f'my_bookings answered {response.status_code}')
+
+    def cases(self):
+        return {
+            'available_time_slots': lambda: BookingService.get_available_time_slots.uncached(
+                self.busy_day, self.service.pk, self.barber.pk
+            ),
+            'create_booking': self.create_booking,
+            'booking_statistics': lambda: BookingService.get_booking_statistics.uncached(*self.period),
+            'my_bookings': self.my_bookings,
+            'render_booking_table': lambda: BookingTable(self.rows).render(),
+            'render_booking_cards': lambda: [
+                BookingCard(row['id'], row['customer_name'], row['service_name'], row['date'],
+                            row['time'], row['status'], row['barber_name']).render()
+                for row in self.rows
+            ],
+            'render_service_cards': lambda: [
+                ServiceCard(service.name, service.description, service.price, service.duration_minutes).render()
+                for service in self.services
+            ],
+            'render_stats_dashboard': lambda: StatsDashboard(self.stats).render(),
+        }
+
+
+def run_size(name, options, cases=None, warmup=3, repeat=20, log=None):
+    """Seed one size, run the cases on it and roll everything back"""
+    log = log or (lambda message: None)
+    results = {}
+    # The test client's requests come from 'testserver'
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), transaction.atomic():
+        started = time.perf_counter()
+        shop = SyntheticShop(**options)
+        counts = shop.generate()
+        log(f"{name}: seeded {counts['bookings']} bookings in {time.perf_counter() - started:.1f}s")
+        fixture = Fixture(shop)
+        for case, run in fixture.cases().items():
+            if cases and case not in cases:
+                continue
+            results[case] = measure(run, warmup=warmup, repeat=repeat)
+            log(f"{name}: {case} {results[case]['median_ms']:.2f} ms")
+        transaction.set_rollback(True)
+    # Cached results may refer to rows that are gone now
+    invalidate('bookings', 'services')
+    return {'bookings': counts['bookings'], 'cases': results}
+
+
+def run_suite(sizes=None, cases=None, warmup=3, repeat=20, log=None):
+    """Run the benchmarks for ``sizes`` (names from SIZES, or a name -> options dict)"""
+    if sizes is None:
+        sizes = list(SIZES)
+    if not isinstance(sizes, dict):
+        unknown = set(sizes) - set(SIZES)
+        if unknown:
+            raise BenchmarkError(f"Unknown size: {', '.join(sorted(unknown))}")
+        sizes = {name: SIZES[name] for name in sizes}
+    return {
+        'version': FORMAT_VERSION,
+        'created': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'warmup': warmup,
+        'repeat': repeat,
+        'sizes': {
+            name: run_size(name, options, cases=cases, warmup=warmup, repeat=repeat, log=log)
+            for name, options in sizes.items()
+        },
+    }
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Regressions of ``results`` against ``baseline``, as readable strings.
+
+    Only cases present in both are compared, so adding a case or a size
+    does not need a new baseline.
+    """
+    if baseline.get('version') != FORMAT_VERSION:
+        raise BenchmarkError(f"Baseline format {baseline.get('version')} is not {FORMAT_VERSION}")
+    regressions = []
+    for size, current in results['sizes'].items():
+        previous = baseline['sizes'].get(size, {}).get('cases', {})
+        for case, now in current['cases'].items():
+            before = previous.get(case)
+            if before is None:
+                continue
+            limit = before['median_ms'] * (1 + threshold)
+            if now['median_ms'] > limit and now['median_ms'] - before['median_ms'] >= MIN_REGRESSION_MS:
+                regressions.append(
+                    f"{size}/{case}: median {now['median_ms']:.2f} ms, was {before['median_ms']:.2f} ms "
+                    f"(+{now['median_ms'] - before['median_ms']:.2f} ms)"
+                )
+            if now['queries'] > before['queries']:
+                regressions.append(f"{size}/{case}: {now['queries']} queries, was {before['queries']}")
+    return regressions
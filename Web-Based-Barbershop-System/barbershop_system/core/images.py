@@ -0,0 +1,157 @@
+"""
+Resized variants of uploaded images
+
+Uploads are stored as they arrive and a background job
+(``images.make_variants``) writes smaller copies next to the original:
+one WebP and one JPEG (PNG for images with transparency) per width,
+e.g. ``services/cut.jpg`` gets ``services/cut.jpg.320w.webp`` and
+``services/cut.jpg.320w.jpg``; the storage picks a free name if one is
+taken, so every file belongs to exactly one record. The job records what
+it wrote in the model's ``<field>_variants`` JSON field, together with the
+name of the upload the variants were made from, so a newer upload is
+never shown with the previous one's variants; until its job has run,
+pages use the original.
+"""
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+try:
+    from PIL import ImageCms
+except ImportError:
+    ImageCms = None
+
+from background.jobs import enqueue
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+# Quality scale factor Pillow resizes at before the final Lanczos pass; 3 is indistinguishable from none
+REDUCING_GAP = 3.0
+
+
+class ImageVariantError(Exception):
+    pass
+
+
+def variant_name(name, width, extension):
+    # The source extension stays, so cut.jpg and cut.png do not share variants
+    path = PurePosixPath(name)
+    return str(path.with_name(f'{path.name}.{width}w.{extension}'))
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _convert(image, mode, icc_profile):
+    """
+    ``image`` in ``mode``, and the ICC profile that still describes it.
+
+    A CMYK or greyscale profile does not fit RGB output, so such images
+    are converted to sRGB through the profile when littleCMS is available
+    and left untagged (which browsers read as sRGB).
+    """
+    if image.mode == mode:
+        return image, icc_profile
+    if icc_profile and ImageCms is not None:
+        try:
+            source = ImageCms.ImageCmsProfile(BytesIO(icc_profile))
+            return ImageCms.profileToProfile(image, source, ImageCms.createProfile('sRGB'), outputMode=mode), None
+        except (ImageCms.PyCMSError, OSError, ValueError):
+            pass
+    return image.convert(mode), None
+
+
+def _encode(image, fmt, icc_profile):
+    buffer = BytesIO()
+    options = {'icc_profile': icc_profile} if icc_profile else {}
+    if fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=6, **options)
+    elif fmt == 'jpeg':
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True, **options)
+    else:
+        image.save(buffer, 'PNG', optimize=True, **options)
+    return buffer.getvalue()
+
+
+def make_variants(name, widths, storage=default_storage):
+    """
+    Write the variants of the stored image ``name`` and return their record.
+
+    Widths wider than the image are dropped; the image's own width is used
+    instead so the largest variant is never upscaled. Camera rotation is
+    applied and other metadata (EXIF, GPS) is left out of the copies.
+    """
+    try:
+        with storage.open(name) as file:
+            image = Image.open(file)
+            image.load()
+    except (OSError, Image.DecompressionBombError) as exc:
+        raise ImageVariantError(f'Could not read {name}: {exc}')
+
+    icc_profile = image.info.get('icc_profile')
+    image = ImageOps.exif_transpose(image)
+    alpha = _has_alpha(image)
+    image, icc_profile = _convert(image, 'RGBA' if alpha else 'RGB', icc_profile)
+    fallback = 'png' if alpha else 'jpeg'
+
+    sizes = sorted({min(width, image.width) for width in widths})
+    record = {'source': name, 'width': image.width, 'height': image.height, 'webp': [], fallback: []}
+    for width in sizes:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize(
+            (width, height), Image.LANCZOS, reducing_gap=REDUCING_GAP
+        )
+        for fmt in ('webp', fallback):
+            target = variant_name(name, width, 'jpg' if fmt == 'jpeg' else fmt)
+            saved = storage.save(target, ContentFile(_encode(resized, fmt, icc_profile)))
+            record[fmt].append([width, saved])
+    return record
+
+
+def variant_names(record):
+    return [name for fmt in ('webp', 'jpeg', 'png') for _, name in record.get(fmt, [])]
+
+
+def delete_variants(record, keep=(), storage=default_storage):
+    """Delete the files ``record`` lists; each was saved under a name of its own"""
+    for name in variant_names(record):
+        if name not in keep and storage.exists(name):
+            storage.delete(name)
+
+
+def current_variants(image, record):
+    """``record`` if it was made from the file ``image`` holds now, else None"""
+    if image and record and record.get('source') == image.name:
+        return record
+    return None
+
+
+def queue_variants(instance, field_name, widths):
+    """
+    Queue a job making the variants of ``instance.<field_name>``.
+
+    Nothing is queued when there is no image or its variants are already
+    recorded, so this can be called on every save. Returns the job or None.
+    """
+    image = getattr(instance, field_name)
+    if not image or current_variants(image, getattr(instance, f'{field_name}_variants')):
+        return None
+    label = instance._meta.label
+    return enqueue(
+        'images.make_variants', label, instance.pk, field_name, image.name, list(widths),
+        dedupe_key=f'image-variants:{label}:{instance.pk}:{field_name}:{image.name}',
+    )
+
+
+def srcset(image, record, fmt=None, storage=default_storage):
+    """``srcset`` value listing the ``fmt`` variants (the fallback format by default)"""
+    record = current_variants(image, record)
+    if record is None:
+        return ''
+    if fmt is None:
+        fmt = 'png' if 'png' in record else 'jpeg'
+    return ', '.join(f'{storage.url(name)} {width}w' for width, name in record.get(fmt, []))
@@ -0,0 +1,41 @@
+"""
+Background tasks for uploaded images
+"""
+import logging
+
+from django.apps import apps
+
+from background.jobs import task
+from .images import ImageVariantError, delete_variants, make_variants, variant_names
+
+logger = logging.getLogger(__name__)
+
+
+@task('images.make_variants', concurrency=2)
+def make_image_variants(model_label, pk, field_name, name, widths):
+    """
+    Make the variants of one upload and record them on its row.
+
+    A job whose upload has since been replaced does nothing; the newer
+    upload has its own job.
+    """
+    model = apps.get_model(model_label)
+    variants_field = f'{field_name}_variants'
+    instance = model.objects.filter(pk=pk).only(field_name, variants_field).first()
+    if instance is None or getattr(instance, field_name).name != name:
+        return
+    image = getattr(instance, field_name)
+
+    try:
+        record = make_variants(name, widths, storage=image.storage)
+    except ImageVariantError as exc:
+        # Retrying will not make the file readable; pages keep using the upload
+        logger.warning('No variants for %s %s: %s', model_label, pk, exc)
+        return
+    # update() skips save() and its signals; the filter loses to a concurrent new upload
+    updated = model.objects.filter(pk=pk, **{field_name: name}).update(**{variants_field: record})
+    previous = getattr(instance, variants_field) or {}
+    if updated:
+        delete_variants(previous, keep=set(variant_names(record)), storage=image.storage)
+    else:
+        delete_variants(record, storage=image.storage)
@@ -0,0 +1,512 @@
+"""
+HTTP load generator for the WSGI and ASGI entry points
+
+Virtual customers replay a busy-morning visit: log in, then over and over
+browse the services, check availability, book, look at their bookings and
+cancel. Requests go to ``barbershop_system.wsgi`` or
+``barbershop_system.asgi`` in-process, to the WSGI application served on
+a localhost port, or to any server given by URL (uvicorn running the ASGI
+application, for instance).
+
+Scenarios are generators that yield Requests and are sent Responses, so
+one session script drives both the threaded runner (WSGI, HTTP) and the
+asyncio one (ASGI). Latency is recorded per step in the monitoring
+histograms. A ramp runs stages of growing concurrency until adding users
+no longer adds throughput, or latency or errors pass their limits.
+
+In-process runs share the interpreter, and the GIL, with the generator:
+use them to compare changes on one machine, and a separate server via
+``url`` to measure a node's capacity.
+"""
+import asyncio
+import http.client
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from http.cookies import SimpleCookie
+from io import BytesIO
+from urllib.parse import urlencode, urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.urls import reverse
+from django.utils import timezone
+
+from booking_management.models import Service
+from monitoring.metrics import Histogram
+from security_management.models import User
+
+USERNAME_PREFIX = 'loadtest-'
+PASSWORD = 'loadtest'
+BOOKING_DAYS = 14
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+QUANTILES = (0.5, 0.95, 0.99)
+# Reported per step but left out of the totals: password hashing would swamp the browsing latencies
+SETUP_STEPS = ('login_form', 'login')
+# A ramp stage is saturated when the added users bring less than this share of their expected throughput
+MARGINAL_GAIN = 0.5
+
+BOOKING_ID = re.compile(rb'Booking ID: (\d+)')
+
+# ``expect``: a pattern the final response body must contain for the step to count as a success
+Request = namedtuple('Request', ['step', 'method', 'path', 'data', 'expect'], defaults=[None, None])
+Response = namedtuple('Response', ['status', 'headers', 'body', 'path'], defaults=[''])
+Plan = namedtuple('Plan', ['credentials', 'services', 'barbers', 'today', 'urls'])
+
+
+class LoadTestError(Exception):
+    pass
+
+
+def prepare(users, today=None):
+    """Logins for ``users`` virtual customers and the services and barbers they book"""
+    services = list(Service.objects.filter(is_active=True).values_list('pk', flat=True))
+    barbers = list(User.objects.filter(role='barber', is_active=True).values_list('pk', flat=True))
+    if not services or not barbers:
+        raise LoadTestError('There are no active services or barbers to book; run generate_data first.')
+
+    usernames = [f'{USERNAME_PREFIX}{n:04d}' for n in range(users)]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(username=username, email=f'{username}@loadtest.example.com', first_name='Load',
+             last_name=f'Tester {username[-4:]}', role='customer', password=password)
+        for username in usernames if username not in existing
+    ])
+    return Plan(
+        credentials=[(username, PASSWORD) for username in usernames],
+        services=services,
+        barbers=barbers,
+        today=today or timezone.localdate(),
+        urls={
+            'login': reverse('security:login'),
+            'home': reverse('booking:home'),
+            'services': reverse('booking:services_list'),
+            'availability': reverse('booking:availability'),
+            'book': reverse('booking:book_appointment'),
+            'my_bookings': reverse('booking:my_bookings'),
+        },
+    )
+
+
+def login_session(plan, credentials):
+    """Log one customer in; yields Requests and is sent the Response to each"""
+    username, password = credentials
+    yield Request('login_form', 'GET', plan.urls['login'])
+    response = yield Request('login', 'POST', plan.urls['login'], {'username': username, 'password': password})
+    if response.path == plan.urls['login']:
+        raise LoadTestError(f'{username} could not log in')
+
+
+def customer_session(plan, rng):
+    """A logged-in customer's visits, repeated until the run ends"""
+    urls = plan.urls
+    while True:
+        service, barber = rng.choice(plan.services), rng.choice(plan.barbers)
+        day = plan.today + timedelta(days=rng.randint(1, BOOKING_DAYS))
+        yield Request('home', 'GET', urls['home'])
+        yield Request('services', 'GET', urls['services'])
+        query = urlencode({'date': day.isoformat(), 'service': service, 'barber': barber})
+        response = yield Request('availability', 'GET', f"{urls['availability']}?{query}")
+        slots = json.loads(response.body)['slots'] if response.status == 200 else []
+        if not slots:
+            continue
+
+        yield Request('book_form', 'GET', urls['book'])
+        response = yield Request('book', 'POST', urls['book'], {
+            'service': service, 'barber': barber, 'booking_date': day.isoformat(),
+            'booking_time': rng.choice(slots), 'notes': '',
+        }, expect=BOOKING_ID)
+        booked = BOOKING_ID.search(response.body)
+        yield Request('my_bookings', 'GET', urls['my_bookings'])
+        if booked:
+            cancel = reverse('booking:booking_cancel', args=[int(booked[1])])
+            yield Request('cancel_form', 'GET', cancel)
+            yield Request('cancel', 'POST', cancel, {'cancellation_reason': 'Load test'})
+
+
+class Session:
+    """Cookies of one virtual customer, and the CSRF token they carry"""
+
+    def __init__(self):
+        self.cookies = {}
+
+    def prepare(self, method, path, data=None):
+        headers = [('User-Agent', 'barbershop-loadtest')]
+        if self.cookies:
+            headers.append(('Cookie', '; '.join(f'{name}={value}' for name, value in self.cookies.items())))
+        body = b''
+        if method == 'POST':
+            body = urlencode(data or {}).encode()
+            headers.append(('Content-Type', 'application/x-www-form-urlencoded'))
+            if 'csrftoken' in self.cookies:
+                headers.append(('X-CSRFToken', self.cookies['csrftoken']))
+        return method, path, headers, body
+
+    def receive(self, response):
+        """Keep the cookies set by ``response``; returns where it redirects to, if anywhere"""
+        for name, value in response.headers:
+            if name == 'set-cookie':
+                for morsel in SimpleCookie(value).values():
+                    if morsel.value and morsel['max-age'] != '0':
+                        self.cookies[morsel.key] = morsel.value
+                    else:
+                        self.cookies.pop(morsel.key, None)
+        if response.status in REDIRECT_STATUSES:
+            location = urlsplit(dict(response.headers)['location'])
+            return f'{location.path}?{location.query}' if location.query else location.path
+        return None
+
+
+def succeeded(request, response):
+    return 200 <= response.status < 400 and (request.expect is None or request.expect.search(response.body) is not None)
+
+
+def fetch(transport, session, request):
+    """Send ``request`` and follow its redirects, as a browser would"""
+    method, path, data = request.method, request.path, request.data
+    for _ in range(MAX_REDIRECTS + 1):
+        response = transport.request(*session.prepare(method, path, data))
+        location = session.receive(response)
+        if location is None:
+            break
+        method, path, data = 'GET', location, None
+    return response._replace(path=path)
+
+
+async def fetch_async(transport, session, request):
+    method, path, data = request.method, request.path, request.data
+    for _ in range(MAX_REDIRECTS + 1):
+        response = await transport.request(*session.prepare(method, path, data))
+        location = session.receive(response)
+        if location is None:
+            break
+        method, path, data = 'GET', location, None
+    return response._replace(path=path)
+
+
+# Transports
+
+class WSGITransport:
+    """Calls a WSGI application in-process"""
+
+    is_async = False
+
+    def __init__(self, application, host='localhost'):
+        self.application = application
+        self.host = host
+
+    def request(self, method, path, headers, body=b''):
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': method, 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': query,
+            'SERVER_NAME': self.host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1', 'HTTP_HOST': self.host, 'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers:
+            key = name.upper().replace('-', '_')
+            environ[key if key == 'CONTENT_TYPE' else f'HTTP_{key}'] = value
+
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(name.lower(), value) for name, value in response_headers]
+
+        result = self.application(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return Response(started['status'], started['headers'], content)
+
+
+class ASGITransport:
+    """Calls an ASGI application in-process, from the runner's event loop"""
+
+    is_async = True
+
+    def __init__(self, application, host='localhost'):
+        self.application = application
+        self.host = host
+
+    async def request(self, method, path, headers, body=b''):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'client': ('127.0.0.1', 0), 'server': (self.host, 80),
+            'headers': [(b'host', self.host.encode()), (b'content-length', str(len(body)).encode())]
+            + [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        }
+        pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        disconnected = asyncio.Event()
+        started, chunks = {}, []
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # The client stays connected until the response is complete
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                started['status'] = message['status']
+                started['headers'] = [
+                    (name.decode('latin-1').lower(), value.decode('latin-1'))
+                    for name, value in message.get('headers', [])
+                ]
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        try:
+            await self.application(scope, receive, send)
+        finally:
+            disconnected.set()
+        return Response(started['status'], started['headers'], b''.join(chunks))
+
+
+class HTTPTransport:
+    """Talks HTTP to a running server; one keep-alive connection per thread"""
+
+    is_async = False
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise LoadTestError(f'{url} is not an http(s) URL')
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.host, self.port = parts.hostname, parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method, path, headers, body=b''):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(method, self.prefix + path, body=body or None, headers=dict(headers))
+            response = connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+        return Response(response.status, [(name.lower(), value) for name, value in response.getheaders()], content)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_wsgi(application, host='127.0.0.1', port=0):
+    """Serve ``application`` on localhost from runserver's threaded server; yields the URL"""
+    server = ThreadedWSGIServer((host, port), QuietRequestHandler)
+    server.set_app(application)
+    thread = threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# Runners
+
+class LoadStats:
+    """Latency per step, in microseconds, and error counts for one run; totals leave out logins"""
+
+    def __init__(self, users):
+        self.users = users
+        self.latency = defaultdict(Histogram)
+        self.overall = Histogram()
+        self.errors = Counter()
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, step, seconds, ok=True):
+        with self._lock:
+            histogram = self.latency[step]
+            if not ok:
+                self.errors[step] += 1
+        histogram.record(seconds * 1e6)
+        if step not in SETUP_STEPS:
+            self.overall.record(seconds * 1e6)
+
+    def fail(self, step):
+        with self._lock:
+            self.errors[step] += 1
+
+    def summary(self):
+        seconds = self.seconds or 1
+        requests = self.overall.count
+        steps = {
+            step: {
+                'requests': histogram.count,
+                'per_second': round(histogram.count / seconds, 2),
+                **{f'p{round(q * 100)}_ms': round(histogram.percentile(q) / 1000, 2) for q in QUANTILES},
+                'errors': self.errors[step],
+            }
+            for step, histogram in self.latency.items()
+        }
+        return {
+            'users': self.users,
+            'seconds': round(self.seconds, 2),
+            'requests': requests,
+            'per_second': round(requests / seconds, 2),
+            **{f'p{round(q * 100)}_ms': round(self.overall.percentile(q) / 1000, 2) for q in QUANTILES},
+            'errors': sum(self.errors.values()),
+            'error_rate': round(sum(self.errors.values()) / max(requests, 1), 4),
+            'steps': steps,
+        }
+
+
+def _play(transport, session, scenario, stats, deadline=None, rng=None, think_time=0.0):
+    """Drive ``scenario`` until it ends or ``deadline`` passes; False if it gave up"""
+    response = None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            request = scenario.send(response)
+            started = time.perf_counter()
+            try:
+                response = fetch(transport, session, request)
+            except (OSError, http.client.HTTPException):
+                # The scenario sees a failed request and carries on
+                response = Response(0, [], b'', request.path)
+            stats.record(request.step, time.perf_counter() - started, succeeded(request, response))
+            if think_time:
+                time.sleep(rng.expovariate(1 / think_time))
+    except StopIteration:
+        pass
+    except LoadTestError:
+        stats.fail(request.step)
+        return False
+    finally:
+        scenario.close()
+    return True
+
+
+async def _play_async(transport, session, scenario, stats, deadline=None, rng=None, think_time=0.0):
+    response = None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            request = scenario.send(response)
+            started = time.perf_counter()
+            response = await fetch_async(transport, session, request)
+            stats.record(request.step, time.perf_counter() - started, succeeded(request, response))
+            if think_time:
+                await asyncio.sleep(rng.expovariate(1 / think_time))
+    except StopIteration:
+        pass
+    except LoadTestError:
+        stats.fail(request.step)
+        return False
+    finally:
+        scenario.close()
+    return True
+
+
+def _run_concurrently(transport, plays):
+    """Run every play at once, on threads or on one event loop; returns their results"""
+    if transport.is_async:
+        async def main():
+            return await asyncio.gather(*(_play_async(transport, *play) for play in plays))
+        return asyncio.run(main())
+
+    results = [False] * len(plays)
+
+    def worker(n, play):
+        results[n] = _play(transport, *play)
+
+    threads = [
+        threading.Thread(target=worker, args=(n, play), name=f'customer-{n}', daemon=True)
+        for n, play in enumerate(plays)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def run_load(transport, plan, users, seconds, think_time=0.0, seed=0):
+    """
+    Run ``users`` concurrent virtual customers for ``seconds``; returns their LoadStats.
+
+    Everyone logs in first; the clock starts once they all have, so slow
+    password hashing does not eat into the measured window.
+    """
+    if users > len(plan.credentials):
+        raise LoadTestError(f'The plan has logins for {len(plan.credentials)} users, not {users}')
+    stats = LoadStats(users)
+    sessions = [Session() for _ in range(users)]
+    logged_in = _run_concurrently(transport, [
+        (session, login_session(plan, credentials), stats)
+        for session, credentials in zip(sessions, plan.credentials)
+    ])
+
+    started = time.monotonic()
+    deadline = started + seconds
+    visits = []
+    for n, (session, ok) in enumerate(zip(sessions, logged_in)):
+        if ok:
+            rng = random.Random(f'{seed}-{n}')
+            visits.append((session, customer_session(plan, rng), stats, deadline, rng, think_time))
+    _run_concurrently(transport, visits)
+    stats.seconds = time.monotonic() - started
+    return stats
+
+
+def saturation(stage, previous, max_p95_ms, max_error_rate):
+    """Why ``stage`` counts as past saturation, or None while the node keeps up"""
+    if stage['error_rate'] > max_error_rate:
+        return f"error rate {stage['error_rate']:.1%} above {max_error_rate:.1%}"
+    if stage['p95_ms'] > max_p95_ms:
+        return f"p95 latency {stage['p95_ms']:.0f} ms above {max_p95_ms:.0f} ms"
+    if previous is not None:
+        expected = previous['per_second'] * (stage['users'] / previous['users'] - 1)
+        if stage['per_second'] - previous['per_second'] < expected * MARGINAL_GAIN:
+            return (f"throughput grew to {stage['per_second']:.1f}/s from {previous['per_second']:.1f}/s; "
+                    f"the extra users should have added about {expected:.1f}/s")
+    return None
+
+
+def ramp(transport, plan, start, step, max_users, seconds, think_time=0.0, seed=0,
+         max_p95_ms=1000, max_error_rate=0.01, log=None):
+    """
+    Run stages from ``start`` to ``max_users`` users, ``step`` more each time.
+
+    Stops at the first saturated stage. Returns the stage summaries, the
+    last stage that kept up (None if even the first did not) and the reason
+    the ramp stopped (None if it reached ``max_users``).
+    """
+    log = log or (lambda summary: None)
+    stages, healthy = [], None
+    users = start
+    while users <= max_users:
+        stage = run_load(transport, plan, users, seconds, think_time, seed).summary()
+        stages.append(stage)
+        log(stage)
+        reason = saturation(stage, healthy, max_p95_ms, max_error_rate)
+        if reason:
+            return stages, healthy, reason
+        healthy = stage
+        users += step
+    return stages, healthy, None
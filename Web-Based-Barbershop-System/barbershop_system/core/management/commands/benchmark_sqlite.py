@@ -0,0 +1,116 @@
+"""
+Concurrent read/write benchmark comparing SQLite defaults with the tuned profile
+"""
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from barbershop_system.database import SQLITE_PRAGMAS, apply_sqlite_pragmas
+
+PROFILES = {
+    # Python's sqlite3 defaults: rollback journal, synchronous=FULL, 5s timeout
+    'default': {'pragmas': {}, 'begin': 'BEGIN', 'timeout': 5.0},
+    # busy_timeout comes from the pragmas
+    'tuned': {'pragmas': SQLITE_PRAGMAS, 'begin': 'BEGIN IMMEDIATE', 'timeout': 0},
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure concurrent read/write throughput of SQLite with default and tuned settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration per profile')
+        parser.add_argument('--rows', type=int, default=5000, help='Rows seeded before the run')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'profile':<10}{'reads/s':>12}{'writes/s':>12}{'p95 write ms':>15}{'lock errors':>14}")
+        for name, profile in PROFILES.items():
+            with tempfile.TemporaryDirectory() as directory:
+                result = run_benchmark(Path(directory) / 'bench.sqlite3', profile, options)
+            self.stdout.write(
+                f"{name:<10}{result['reads'] / options['seconds']:>12.0f}"
+                f"{result['writes'] / options['seconds']:>12.0f}"
+                f"{result['p95_write_ms']:>15.1f}{result['errors']:>14}"
+            )
+
+
+def _connect(path, profile):
+    connection = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None, check_same_thread=False)
+    apply_sqlite_pragmas(connection, profile['pragmas'])
+    return connection
+
+
+def run_benchmark(path, profile, options):
+    """Run readers and writers against ``path`` for the given time; returns counters"""
+    setup = _connect(path, profile)
+    setup.execute('CREATE TABLE slots (id INTEGER PRIMARY KEY, barber INTEGER, day INTEGER, status TEXT)')
+    setup.executemany(
+        'INSERT INTO slots (barber, day, status) VALUES (?, ?, ?)',
+        [(i % 10, i % 30, 'pending') for i in range(options['rows'])],
+    )
+    setup.execute('CREATE INDEX slots_barber_day ON slots (barber, day)')
+    setup.close()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    result = {'reads': 0, 'writes': 0, 'errors': 0, 'write_times': []}
+
+    def reader(seed):
+        connection = _connect(path, profile)
+        reads = errors = 0
+        while not stop.is_set():
+            try:
+                connection.execute(
+                    'SELECT count(*) FROM slots WHERE barber = ? AND day = ?', (seed % 10, reads % 30)
+                ).fetchone()
+                reads += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        connection.close()
+        with lock:
+            result['reads'] += reads
+            result['errors'] += errors
+
+    def writer(seed):
+        connection = _connect(path, profile)
+        writes = errors = 0
+        times = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                connection.execute(profile['begin'])
+                connection.execute(
+                    'INSERT INTO slots (barber, day, status) VALUES (?, ?, ?)', (seed % 10, writes % 30, 'pending')
+                )
+                connection.execute('UPDATE slots SET status = ? WHERE id = ?', ('confirmed', writes % options['rows'] + 1))
+                connection.execute('COMMIT')
+                writes += 1
+                times.append(time.perf_counter() - started)
+            except sqlite3.OperationalError:
+                errors += 1
+                if connection.in_transaction:
+                    connection.execute('ROLLBACK')
+        connection.close()
+        with lock:
+            result['writes'] += writes
+            result['errors'] += errors
+            result['write_times'].extend(times)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+    for thread in threads:
+        thread.start()
+    time.sleep(options['seconds'])
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    times = sorted(result.pop('write_times'))
+    result['p95_write_ms'] = times[int(len(times) * 0.95)] * 1000 if times else 0.0
+    return result
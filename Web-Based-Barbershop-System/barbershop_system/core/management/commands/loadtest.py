@@ -0,0 +1,119 @@
+"""
+Drive the site with virtual customers and report throughput and latency per step
+"""
+import json
+from contextlib import nullcontext
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.loadtest import (
+    ASGITransport, HTTPTransport, LoadTestError, WSGITransport, prepare, ramp, run_load, serve_wsgi,
+)
+
+
+class Command(BaseCommand):
+    help = ('Replay customer sessions (browse, check availability, book, view and cancel bookings) '
+            'against the WSGI or ASGI application and report throughput and latency')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=['wsgi', 'asgi'], default='wsgi',
+                            help='Entry point to call in-process')
+        parser.add_argument('--serve', action='store_true',
+                            help='Serve the WSGI application on a localhost port and send real HTTP requests')
+        parser.add_argument('--url', help='Send HTTP requests to a running server instead, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--host', default='localhost', help='Host header for in-process requests')
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual customers')
+        parser.add_argument('--seconds', type=float, default=30.0, help='Duration of the run, or of each ramp stage')
+        parser.add_argument('--think-time', type=float, default=1.0,
+                            help='Mean pause between a customer\'s steps, in seconds; 0 for none')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--ramp', action='store_true',
+                            help='Add --ramp-step users per stage from --users up to --max-users until saturated')
+        parser.add_argument('--ramp-step', type=int, default=10)
+        parser.add_argument('--max-users', type=int, default=200)
+        parser.add_argument('--max-p95-ms', type=float, default=1000.0, help='Latency that counts as saturated')
+        parser.add_argument('--max-error-rate', type=float, default=0.01, help='Error rate that counts as saturated')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['url'] and options['serve']:
+            raise CommandError('Use either --url or --serve.')
+        if options['serve'] and options['target'] != 'wsgi':
+            raise CommandError('--serve runs the WSGI application; for ASGI start a server and pass --url.')
+
+        users = options['max_users'] if options['ramp'] else options['users']
+        try:
+            plan = prepare(users)
+            with self._server(options) as url:
+                transport = self._transport(options, url)
+                if options['ramp']:
+                    results = self._ramp(transport, plan, options)
+                else:
+                    results = run_load(
+                        transport, plan, options['users'], options['seconds'],
+                        think_time=options['think_time'], seed=options['seed'],
+                    ).summary()
+                    self._report(results)
+        except LoadTestError as exc:
+            raise CommandError(str(exc))
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def _server(self, options):
+        if options['serve']:
+            from barbershop_system.wsgi import application
+            return serve_wsgi(application)
+        return nullcontext(options['url'])
+
+    def _transport(self, options, url):
+        if url:
+            return HTTPTransport(url)
+        if options['target'] == 'asgi':
+            from barbershop_system.asgi import application
+            return ASGITransport(application, host=options['host'])
+        from barbershop_system.wsgi import application
+        return WSGITransport(application, host=options['host'])
+
+    def _ramp(self, transport, plan, options):
+        self.stdout.write(f"{'users':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+
+        def log(stage):
+            self.stdout.write(
+                f"{stage['users']:>6}{stage['per_second']:>10.1f}{stage['p50_ms']:>10.1f}"
+                f"{stage['p95_ms']:>10.1f}{stage['p99_ms']:>10.1f}{stage['errors']:>8}"
+            )
+
+        stages, healthy, reason = ramp(
+            transport, plan, options['users'], options['ramp_step'], options['max_users'], options['seconds'],
+            think_time=options['think_time'], seed=options['seed'], max_p95_ms=options['max_p95_ms'],
+            max_error_rate=options['max_error_rate'], log=log,
+        )
+        if reason is None:
+            self.stdout.write(self.style.SUCCESS(
+                f"Kept up with {healthy['users']} users ({healthy['per_second']:.1f} req/s); "
+                f"raise --max-users to look further."
+            ))
+        elif healthy is None:
+            self.stdout.write(self.style.WARNING(f"Saturated from the first stage: {reason}."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"Saturation point: {healthy['users']} users at {healthy['per_second']:.1f} req/s, "
+                f"p95 {healthy['p95_ms']:.0f} ms. Next stage: {reason}."
+            ))
+        return {'stages': stages, 'saturation': healthy, 'reason': reason}
+
+    def _report(self, summary):
+        self.stdout.write(f"{'step':<14}{'requests':>10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for step, row in summary['steps'].items():
+            self.stdout.write(
+                f"{step:<14}{row['requests']:>10}{row['per_second']:>9.1f}{row['p50_ms']:>9.1f}"
+                f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['errors']:>8}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['users']} users: {summary['requests']} requests in {summary['seconds']:.0f}s, "
+            f"{summary['per_second']:.1f} req/s, p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms, "
+            f"p99 {summary['p99_ms']:.0f} ms, {summary['errors']} errors"
+        ))
@@ -0,0 +1,26 @@
+"""
+Queue resized variants for images uploaded before the image pipeline existed
+"""
+from django.core.management.base import BaseCommand
+
+from booking_management.models import Service
+from core.images import queue_variants
+from security_management.models import User
+
+IMAGE_FIELDS = (
+    (Service, 'image', Service.IMAGE_WIDTHS),
+    (User, 'profile_picture', User.PROFILE_PICTURE_WIDTHS),
+)
+
+
+class Command(BaseCommand):
+    help = 'Queue variant jobs for every service image and profile picture that has none yet; run_jobs makes them'
+
+    def handle(self, *args, **options):
+        queued = 0
+        for model, field_name, widths in IMAGE_FIELDS:
+            rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for instance in rows.only('pk', field_name, f'{field_name}_variants').iterator():
+                if queue_variants(instance, field_name, widths) is not None:
+                    queued += 1
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} image variant jobs.'))
@@ -0,0 +1,64 @@
+"""
+Benchmark the booking hot paths and compare them with a saved baseline
+"""
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import SIZES, BenchmarkError, compare, run_suite
+from core.synthetic import SyntheticDataError
+
+
+class Command(BaseCommand):
+    help = 'Time the booking services, views and renderers on seeded data of several sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium',
+                            help=f"Comma-separated sizes to seed ({', '.join(SIZES)})")
+        parser.add_argument('--cases', help='Comma-separated cases to run; all by default')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed runs per case')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per case')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Fail if results regress against this JSON file')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed growth of a median time before it counts as a regression')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Could not read the baseline: {exc}")
+
+        try:
+            results = run_suite(
+                sizes=options['sizes'].split(','),
+                cases=options['cases'].split(',') if options['cases'] else None,
+                warmup=options['warmup'],
+                repeat=options['repeat'],
+                log=self.stdout.write if options['verbosity'] > 1 else None,
+            )
+        except (BenchmarkError, SyntheticDataError) as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(f"{'case':<34}{'median ms':>11}{'p95 ms':>10}{'queries':>9}")
+        for size, result in results['sizes'].items():
+            for case, timing in result['cases'].items():
+                self.stdout.write(
+                    f"{f'{size}/{case}':<34}{timing['median_ms']:>11.2f}"
+                    f"{timing['p95_ms']:>10.2f}{timing['queries']:>9}"
+                )
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            try:
+                regressions = compare(results, baseline, options['threshold'])
+            except (BenchmarkError, KeyError) as exc:
+                raise CommandError(f'Could not compare with the baseline: {exc}')
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
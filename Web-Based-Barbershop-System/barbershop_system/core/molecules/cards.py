@@ -4,6 +4,7 @@ Card Molecules - Combining atoms to create card components
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from core.atoms.buttons import Button
+from core.atoms.images import ResponsiveImage
 from core.atoms.labels import Badge
 
 
@@ -40,20 +41,35 @@ class Card:
 class ServiceCard(Card):
     """Service card showing barbershop services"""
 
-    def __init__(self, service_name, description, price, duration, image_url=None):
+    # Cards sit three to a row from the md breakpoint up
+    IMAGE_SIZES = '(min-width: 768px) 33vw, 100vw'
+
+    def __init__(self, service_name, description, price, duration, image_url=None, image=None):
         self.service_name = service_name
         self.description = description
         self.price = price
         self.duration = duration
         self.image_url = image_url
+        self.image = image
 
         content = self._build_content()
         super().__init__(title=service_name, content=content, css_class='card service-card')
 
+    @classmethod
+    def for_service(cls, service):
+        """Card for a Service, with its image variants when it has an image"""
+        image = None
+        if service.image:
+            image = ResponsiveImage.of(service, 'image', alt=service.name, sizes=cls.IMAGE_SIZES,
+                                       css_class='card-img-top')
+        return cls(service.name, service.description, service.price, service.duration_minutes, image=image)
+
     def _build_content(self):
         """Build service card content"""
         image_html = ''
-        if self.image_url:
+        if self.image is not None:
+            image_html = self.image.render()
+        elif self.image_url:
             image_html = f'<img src="{self.image_url}" class="card-img-top" alt="{self.service_name}">'
 
         return f'''
@@ -1,6 +1,8 @@
 """
 Dashboard Organisms - Complex dashboard components
 """
+import json
+
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from core.molecules.cards import StatsCard
@@ -156,13 +158,15 @@ class BookingsDashboard:
 class RevenueChart:
     """Revenue chart widget organism"""
 
-    def __init__(self, chart_data=None, chart_type='line'):
+    def __init__(self, chart_data=None, chart_type='line', data_url=None):
         self.chart_data = chart_data or {}
         self.chart_type = chart_type
+        self.data_url = data_url
 
     def render(self):
         """Render revenue chart HTML"""
-        # This would integrate with Chart.js or similar library
+        # Chart.js reads the inline data, or fetches it from data-source
+        # (e.g. the payments:revenue_data endpoint)
         return format_html(
             '<div class="card revenue-chart">'
             '<div class="card-header">'
@@ -170,11 +174,12 @@ class RevenueChart:
             '</div>'
             '<div class="card-body">'
             '<canvas id="revenueChart" data-chart-type="{}" '
-            'data-chart-data="{}" height="300"></canvas>'
+            'data-chart-data="{}" data-source="{}" height="300"></canvas>'
             '</div>'
             '</div>',
-            mark_safe(self.chart_type),
-            mark_safe(str(self.chart_data))
+            self.chart_type,
+            json.dumps(self.chart_data),
+            self.data_url or ''
         )
 
     def __str__(self):
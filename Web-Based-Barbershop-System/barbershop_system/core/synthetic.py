@@ -0,0 +1,456 @@
+"""
+Deterministic synthetic data for load and performance testing
+
+``SyntheticShop(seed=...).generate()`` builds the same shop from the same
+seed: barbers with weekly schedules, customers whose visit frequency is
+long-tailed (a few regulars, many occasional visitors), and years of
+bookings. Each barber's bookings per working day are Poisson-distributed
+around a rate that varies with the weekday, the season and the shop's
+growth. Past bookings get a realistic status mix. Completed ones get a
+payment with its ledger posting and transaction log rows, an invoice, and
+sometimes a review.
+
+Rows are written with bulk_create, one transaction per batch, skipping
+model save() and signals, so no outbox events or emails are produced.
+Denormalised totals are recomputed once at the end: customer counters,
+barber ratings and ledger balances.
+"""
+import bisect
+import math
+import random
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from barbershop_system.caching import invalidate
+from booking_management.models import Booking, Customer, Review, Service
+from security_management.models import StaffProfile, User
+from transaction import ledger
+from transaction.invoicing import allocate_numbers
+from transaction.models import Invoice, JournalEntry, LedgerAccount, LedgerLine, Payment, Transaction
+
+FIRST_NAMES = [
+    'James', 'Maria', 'Liam', 'Olivia', 'Noah', 'Emma', 'Lucas', 'Ava', 'Mateo', 'Sofia',
+    'Ethan', 'Mia', 'Daniel', 'Isabella', 'Leo', 'Amara', 'Kenji', 'Chloe', 'Omar', 'Grace',
+    'Diego', 'Hana', 'Samuel', 'Zara', 'Marco', 'Lena', 'Andre', 'Priya', 'Tomas', 'Nia',
+]
+LAST_NAMES = [
+    'Santos', 'Reyes', 'Cruz', 'Garcia', 'Smith', 'Johnson', 'Kim', 'Nguyen', 'Patel', 'Brown',
+    'Lopez', 'Dela Cruz', 'Tanaka', 'Muller', 'Rossi', 'Okafor', 'Silva', 'Novak', 'Haddad', 'Walker',
+]
+
+# name, minutes, price, category, relative popularity
+SERVICES = [
+    ('Classic Haircut', 30, '15.00', 'Haircut', 30),
+    ('Skin Fade', 45, '22.00', 'Haircut', 22),
+    ('Kids Haircut', 30, '12.00', 'Haircut', 10),
+    ('Beard Trim', 30, '10.00', 'Beard', 14),
+    ('Haircut and Beard', 60, '28.00', 'Combo', 12),
+    ('Hot Towel Shave', 30, '18.00', 'Shave', 6),
+    ('Hair Colour', 60, '40.00', 'Colour', 4),
+    ('Scalp Treatment', 30, '20.00', 'Treatment', 2),
+]
+SPECIALIZATIONS = ['Fades', 'Classic cuts', 'Beards and shaves', 'Colour', 'Kids']
+BARBER_PASSWORD = 'barbershop'
+
+WEEKDAY_FACTOR = (0.8, 0.85, 0.9, 1.0, 1.25, 1.4, 0.7)      # Monday..Sunday
+MONTH_FACTOR = (0.85, 0.85, 0.95, 1.0, 1.0, 1.05, 1.0, 0.95, 1.0, 1.0, 1.05, 1.25)
+GROWTH_START = 0.7      # booking rate at the start of the history, relative to today
+
+PAST_STATUSES = (('completed', 82), ('cancelled', 12), ('no_show', 6))
+UPCOMING_STATUSES = (('confirmed', 60), ('pending', 35), ('cancelled', 5))
+PAYMENT_METHODS = (('cash', 35), ('credit_card', 35), ('debit_card', 20), ('paypal', 5), ('stripe', 5))
+RATINGS = ((5, 55), (4, 30), (3, 10), (2, 3), (1, 2))
+REFUND_RATE = 0.01
+REVIEW_RATE = 0.3
+UPCOMING_DAYS = 30
+SLOT_MINUTES = 30
+
+
+def poisson(rng, mean):
+    """Knuth's multiplication method; a rounded normal approximation for large means"""
+    if mean > 30:
+        return max(0, round(rng.gauss(mean, math.sqrt(mean))))
+    limit, k, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        k += 1
+        product *= rng.random()
+    return k
+
+
+def _cumulative(pairs):
+    values, weights = zip(*pairs)
+    total, cumulative = 0, []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return values, cumulative
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the auto_now / auto_now_add values we set ourselves"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class SyntheticDataError(Exception):
+    pass
+
+
+class SyntheticShop:
+    """Generates one shop's history from a seed"""
+
+    def __init__(self, seed=42, barbers=8, customers=2000, years=2, daily_rate=8.0,
+                 bookings=None, batch_size=5000, today=None, log=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.barber_count = barbers
+        self.customer_count = customers
+        self.daily_rate = daily_rate
+        self.target_bookings = bookings
+        self.batch_size = batch_size
+        self.today = today or timezone.localdate()
+        self.start = self.today - timedelta(days=round(365 * years))
+        self.end = self.today + timedelta(days=UPCOMING_DAYS)
+        self.tz = timezone.get_current_timezone()
+        self.log = log or (lambda message: None)
+        self.counts = Counter()
+        self.tax_rate = Decimal(settings.INVOICE_TAX_RATE)
+
+    @property
+    def username_prefix(self):
+        return f'barber{self.seed}-'
+
+    def generate(self):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise SyntheticDataError('The database must return primary keys from bulk inserts.')
+        if User.objects.filter(username__startswith=self.username_prefix).exists():
+            raise SyntheticDataError(f'Data for seed {self.seed} already exists; pick another seed.')
+        self.accounts = LedgerAccount.objects.in_bulk(
+            [ledger.CASH, ledger.REVENUE, ledger.TAX_PAYABLE], field_name='code'
+        )
+        with explicit_timestamps(Service, User, StaffProfile, Customer, Booking, Payment,
+                                 Transaction, Invoice, JournalEntry, Review):
+            self.services = self.create_services()
+            self.barbers = self.create_barbers()
+            self.create_customers()
+            self.create_bookings()
+        self.recompute_totals()
+        return self.counts
+
+    def _at(self, day, clock=time(9, 0)):
+        return datetime.combine(day, clock, tzinfo=self.tz)
+
+    def _random_moment(self, day):
+        return self._at(day) + timedelta(minutes=self.rng.randrange(11 * 60))
+
+    # Reference data
+
+    def create_services(self):
+        existing = list(Service.objects.filter(is_active=True).order_by('id'))
+        if existing:
+            weights = [1] * len(existing)
+        else:
+            created = self._at(self.start) - timedelta(days=30)
+            existing = Service.objects.bulk_create([
+                Service(name=name, description=f'{name} ({minutes} minutes)', duration_minutes=minutes,
+                        price=Decimal(price), category=category, created_at=created, updated_at=created)
+                for name, minutes, price, category, _ in SERVICES
+            ])
+            weights = [weight for *_, weight in SERVICES]
+            self.counts['services'] = len(existing)
+        self.service_choice = _cumulative(zip(existing, weights))
+        self.prices = {service.pk: service.price for service in existing}
+        self.totals = {service.pk: Invoice.compute_totals(service.price, self.tax_rate) for service in existing}
+        return existing
+
+    def create_barbers(self):
+        password = make_password(BARBER_PASSWORD)
+        joined = self._at(self.start) - timedelta(days=60)
+        users = []
+        for n in range(self.barber_count):
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            users.append(User(
+                username=f'{self.username_prefix}{n:03d}', first_name=first, last_name=last,
+                email=f'{self.username_prefix}{n:03d}@barbers.example.com', role='barber',
+                password=password, date_joined=joined, created_at=joined, updated_at=joined,
+            ))
+        users = User.objects.bulk_create(users, batch_size=self.batch_size)
+
+        profiles, self.schedules = [], {}
+        for user in users:
+            # Everyone is off on one weekday, most barbers on Sunday as well
+            days_off = {self.rng.choice(range(6))}
+            if self.rng.random() < 0.8:
+                days_off.add(6)
+            start_hour = self.rng.choice((9, 9, 10))
+            end_hour = self.rng.choice((17, 18, 18, 19))
+            hours = {}
+            profile = StaffProfile(
+                user=user, bio='', specialization=self.rng.choice(SPECIALIZATIONS),
+                years_of_experience=self.rng.randint(1, 25),
+                hourly_rate=Decimal(self.rng.randrange(12, 35)),
+                created_at=joined, updated_at=joined,
+            )
+            for weekday, name in enumerate(('monday', 'tuesday', 'wednesday', 'thursday',
+                                            'friday', 'saturday', 'sunday')):
+                if weekday not in days_off:
+                    hours[weekday] = (start_hour, end_hour)
+                    setattr(profile, f'{name}_start', time(start_hour))
+                    setattr(profile, f'{name}_end', time(end_hour))
+            self.schedules[user.pk] = hours
+            profiles.append(profile)
+        StaffProfile.objects.bulk_create(profiles, batch_size=self.batch_size)
+        self.counts['barbers'] = len(users)
+        return users
+
+    def create_customers(self):
+        span = (self.end - self.start).days
+        rows = []
+        for n in range(self.customer_count):
+            # A few customers join before the history starts so the first days have someone to book
+            joined = self.start + timedelta(days=self.rng.randrange(-90, span))
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            signed_up = self._random_moment(joined)
+            rows.append((joined, Customer(
+                first_name=first, last_name=last,
+                email=f"{first}.{last}.{self.seed}-{n}@customers.example.com".lower().replace(' ', ''),
+                phone_number=f'+639{self.rng.randrange(10**9):09d}',
+                created_at=signed_up, updated_at=signed_up,
+            )))
+        rows.sort(key=lambda row: row[0])
+        customers = Customer.objects.bulk_create([customer for _, customer in rows], batch_size=self.batch_size)
+
+        # Long-tailed visit frequency: Pareto weights, cumulative in join order so a
+        # booking on day d only picks from the customers who had joined by then
+        self.customer_ids = [customer.pk for customer in customers]
+        self.customer_joined = [joined for joined, _ in rows]
+        self.customer_weights = []
+        total = 0.0
+        for _ in customers:
+            total += self.rng.paretovariate(1.5)
+            self.customer_weights.append(total)
+        self.counts['customers'] = len(customers)
+
+    # Bookings
+
+    def _rate_factor(self, day):
+        growth = 1.0
+        if day < self.today:
+            elapsed = (day - self.start).days / max((self.today - self.start).days, 1)
+            growth = GROWTH_START + (1 - GROWTH_START) * elapsed
+        return WEEKDAY_FACTOR[day.weekday()] * MONTH_FACTOR[day.month - 1] * growth
+
+    def _days(self):
+        day = self.start
+        while day < self.end:
+            yield day
+            day += timedelta(days=1)
+
+    def _resolve_rate(self):
+        """The per-barber daily rate; derived from the target total when one is given"""
+        if not self.target_bookings:
+            return self.daily_rate
+        weight = sum(
+            self._rate_factor(day)
+            for day in self._days() for hours in self.schedules.values() if day.weekday() in hours
+        )
+        return self.target_bookings / weight if weight else 0
+
+    def _pick(self, choice):
+        values, cumulative = choice
+        return values[bisect.bisect(cumulative, self.rng.random() * cumulative[-1])]
+
+    def _pick_customer(self, day):
+        joined = bisect.bisect_right(self.customer_joined, day)
+        if not joined:
+            return None
+        limit = self.customer_weights[joined - 1]
+        return self.customer_ids[bisect.bisect(self.customer_weights, self.rng.random() * limit, hi=joined - 1)]
+
+    def create_bookings(self):
+        rate = self._resolve_rate()
+        past_statuses = _cumulative(PAST_STATUSES)
+        upcoming_statuses = _cumulative(UPCOMING_STATUSES)
+        batch = []
+        for day in self._days():
+            factor = self._rate_factor(day)
+            statuses = past_statuses if day < self.today else upcoming_statuses
+            for barber in self.barbers:
+                hours = self.schedules[barber.pk].get(day.weekday())
+                if hours is None:
+                    continue
+                slots = (hours[1] - hours[0]) * 60 // SLOT_MINUTES
+                free = [True] * slots
+                for _ in range(min(poisson(self.rng, rate * factor), slots)):
+                    service = self._pick(self.service_choice)
+                    length = -(-service.duration_minutes // SLOT_MINUTES)
+                    start = self.rng.randrange(slots)
+                    if start + length > slots or not all(free[start:start + length]):
+                        continue
+                    customer_id = self._pick_customer(day)
+                    if customer_id is None:
+                        continue
+                    free[start:start + length] = [False] * length
+                    begins = self._at(day, time(hours[0])) + timedelta(minutes=start * SLOT_MINUTES)
+                    batch.append(self._booking(
+                        customer_id, service, barber, begins, self._pick(statuses)
+                    ))
+                    if len(batch) >= self.batch_size:
+                        self._write(batch)
+                        batch = []
+        if batch:
+            self._write(batch)
+
+    def _booking(self, customer_id, service, barber, begins, status):
+        ends = begins + timedelta(minutes=service.duration_minutes)
+        created = begins - timedelta(hours=1 + self.rng.expovariate(1 / 96))
+        booking = Booking(
+            customer_id=customer_id, service_id=service.pk, barber_id=barber.pk,
+            booking_date=begins.date(), booking_time=begins.time(), end_time=ends.time(),
+            status=status, created_at=created, updated_at=created,
+        )
+        if status in ('confirmed', 'completed', 'no_show'):
+            booking.confirmed_at = created + timedelta(minutes=self.rng.randrange(5, 240))
+            booking.updated_at = booking.confirmed_at
+        if status == 'completed':
+            booking.completed_at = booking.updated_at = ends
+        elif status == 'cancelled':
+            booking.cancellation_reason = self.rng.choice(('', '', 'Schedule conflict', 'Feeling unwell'))
+            booking.updated_at = created + (begins - created) * self.rng.random()
+        return booking
+
+    def _write(self, bookings):
+        with transaction.atomic():
+            Booking.objects.bulk_create(bookings, batch_size=self.batch_size)
+            completed = [booking for booking in bookings if booking.status == 'completed']
+            if completed:
+                self._write_payments(completed)
+        self.counts['bookings'] += len(bookings)
+        self.log(f"{self.counts['bookings']} bookings up to {bookings[-1].booking_date}")
+
+    def _write_payments(self, bookings):
+        methods = _cumulative(PAYMENT_METHODS)
+        ratings = _cumulative(RATINGS)
+        numbers = allocate_numbers(len(bookings))
+        payments, invoices, reviews = [], [], []
+        for booking, number in zip(bookings, numbers):
+            paid_at = booking.completed_at
+            price = self.prices[booking.service_id]
+            tax, total = self.totals[booking.service_id]
+            refunded = self.rng.random() < REFUND_RATE
+            payments.append(Payment(
+                booking_id=booking.pk, amount=total, payment_method=self._pick(methods),
+                status='refunded' if refunded else 'completed',
+                transaction_id=f'SYN{self.seed}-{booking.pk}', payment_date=paid_at,
+                notes='Refunded: Customer complaint' if refunded else '',
+                created_at=paid_at, updated_at=paid_at,
+            ))
+            invoices.append(Invoice(
+                booking_id=booking.pk, invoice_number=number, issue_date=booking.booking_date,
+                due_date=booking.booking_date + timedelta(days=settings.INVOICE_DUE_DAYS),
+                subtotal=price, tax_rate=self.tax_rate, tax_amount=tax, total=total,
+                is_paid=True, paid_date=paid_at, created_at=paid_at, updated_at=paid_at,
+            ))
+            if self.rng.random() < REVIEW_RATE:
+                reviewed = paid_at + timedelta(hours=self.rng.randrange(1, 72))
+                reviews.append(Review(
+                    booking_id=booking.pk, customer_id=booking.customer_id, barber_id=booking.barber_id,
+                    rating=self._pick(ratings), comment='', created_at=reviewed, updated_at=reviewed,
+                ))
+        Payment.objects.bulk_create(payments, batch_size=self.batch_size)
+        Invoice.objects.bulk_create(invoices, batch_size=self.batch_size)
+        Review.objects.bulk_create(reviews, batch_size=self.batch_size)
+
+        # Ledger postings and transaction log rows, as Payment.mark_completed() and refund() write them
+        logs, entries, lines = [], [], []
+        for payment, invoice in zip(payments, invoices):
+            day = payment.payment_date
+            logs.append(Transaction(
+                payment_id=payment.pk, transaction_type='payment', amount=payment.amount,
+                reference_number=f'PAY-{payment.pk}', description='Payment received', created_at=day,
+            ))
+            posting = [
+                (ledger.CASH, payment.amount, 0),
+                (ledger.REVENUE, 0, payment.amount - invoice.tax_amount),
+                (ledger.TAX_PAYABLE, 0, invoice.tax_amount),
+            ]
+            entries.append((JournalEntry(
+                entry_type='payment', entry_date=day.date(), description=f'Payment #{payment.pk}',
+                payment_id=payment.pk, idempotency_key=f'payment:{payment.pk}:completed', created_at=day,
+            ), posting))
+            if payment.status == 'refunded':
+                refunded_at = day + timedelta(days=self.rng.randrange(1, 14))
+                logs.append(Transaction(
+                    payment_id=payment.pk, transaction_type='refund', amount=-payment.amount,
+                    reference_number=f'REF-{payment.pk}', description='Refund: Customer complaint',
+                    created_at=refunded_at,
+                ))
+                entries.append((JournalEntry(
+                    entry_type='refund', entry_date=refunded_at.date(),
+                    description=f'Refund of payment #{payment.pk}: Customer complaint', payment_id=payment.pk,
+                    idempotency_key=f'payment:{payment.pk}:refunded', created_at=refunded_at,
+                ), [(code, credit, debit) for code, debit, credit in posting]))
+        Transaction.objects.bulk_create(logs, batch_size=self.batch_size)
+        JournalEntry.objects.bulk_create([entry for entry, _ in entries], batch_size=self.batch_size)
+        for entry, posting in entries:
+            lines += [
+                LedgerLine(entry_id=entry.pk, account_id=self.accounts[code].pk, debit=debit, credit=credit)
+                for code, debit, credit in posting if debit or credit
+            ]
+        LedgerLine.objects.bulk_create(lines, batch_size=self.batch_size)
+        self.counts['payments'] += len(payments)
+        self.counts['reviews'] += len(reviews)
+
+    # Totals that save() and the ledger would normally maintain
+
+    def recompute_totals(self):
+        self.log('Recomputing customer counters, barber ratings and ledger balances')
+        if self.customer_ids:
+            # One correlated UPDATE instead of Booking.save()'s per-row counter bumps
+            bookings = Booking.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+            completed = bookings.filter(status='completed')
+            Customer.objects.filter(pk__gte=self.customer_ids[0], pk__lte=self.customer_ids[-1]).update(
+                total_bookings=Coalesce(Subquery(
+                    bookings.exclude(status='cancelled').annotate(count=Count('id')).values('count')
+                ), 0),
+                lifetime_spend=Coalesce(Subquery(
+                    completed.annotate(spend=Sum('service__price')).values('spend')
+                ), Value(Decimal('0.00'))),
+                last_visit_date=Subquery(completed.annotate(last=Max('booking_date')).values('last')),
+            )
+        call_command('rebuild_ledger_balances', stdout=StringIO())
+
+        ratings = {
+            row['barber_id']: row
+            for row in Review.objects.filter(barber__in=self.barbers)
+            .order_by().values('barber_id').annotate(average=Avg('rating'), reviews=Count('id'))
+        }
+        profiles = list(StaffProfile.objects.filter(user__in=self.barbers))
+        for profile in profiles:
+            row = ratings.get(profile.user_id, {})
+            profile.rating = Decimal(row.get('average') or 0).quantize(Decimal('0.01'))
+            profile.total_reviews = row.get('reviews', 0)
+        StaffProfile.objects.bulk_update(profiles, ['rating', 'total_reviews'])
+        invalidate('bookings', 'services', 'revenue')
@@ -0,0 +1,26 @@
+"""
+Template tags for uploaded images and their resized variants
+
+    {% load images %}
+    {% responsive_image service 'image' alt=service.name sizes='33vw' class='card-img-top' %}
+    <img src="{{ service.image.url }}" srcset="{% srcset service 'image' %}">
+"""
+from django import template
+
+from core.atoms.images import ResponsiveImage
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(instance, field_name, alt='', sizes='100vw', lazy=True, style='', **kwargs):
+    """<picture> for ``instance.<field_name>``; ``class`` sets the img's CSS class"""
+    return ResponsiveImage.of(
+        instance, field_name, alt=alt, sizes=sizes, css_class=kwargs.get('class', ''), style=style, lazy=lazy
+    ).render()
+
+
+@register.simple_tag
+def srcset(instance, field_name, fmt=None):
+    """srcset value for ``instance.<field_name>``; empty until its variants exist"""
+    return ResponsiveImage.of(instance, field_name).srcset(fmt)
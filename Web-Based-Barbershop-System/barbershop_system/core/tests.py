@@ -0,0 +1,659 @@
+import gzip
+import json
+import random
+import tempfile
+import threading
+import time
+import unittest
+from contextvars import Context
+from datetime import date, time as datetime_time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageCms
+
+from barbershop_system.caching import TieredCache, _expires_early, cache_settings, cached_service
+from barbershop_system.database import database_settings, replica_settings
+from barbershop_system.routers import PIN_COOKIE, PrimaryPinMiddleware, ReplicaRouter, pin_scope, use_replica
+from barbershop_system.staticfiles import IMMUTABLE, REVALIDATE, StaticFilesMiddleware, brotli, minify_css
+from background.models import Job
+from booking_management.models import Booking, Customer, Service
+from booking_management.services import BookingService
+from core.atoms import ResponsiveImage
+from core.benchmarks import BenchmarkError, compare, run_suite
+from core.images import variant_names
+from core.jobs import make_image_variants
+from core.loadtest import ASGITransport, Response, Session, WSGITransport, prepare, run_load, saturation
+from core.management.commands.benchmark_sqlite import PROFILES, run_benchmark
+from core.molecules import ServiceCard
+from core.synthetic import SyntheticShop, poisson
+from security_management.models import StaffProfile, User
+from transaction import ledger
+from transaction.models import Invoice, Payment
+
+
+class DatabaseProfileTests(SimpleTestCase):
+
+    def test_sqlite_profile(self):
+        config = database_settings('sqlite', Path('/srv/app'), env={})
+        self.assertEqual(config['NAME'], Path('/srv/app/db.sqlite3'))
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+
+    def test_postgres_profile_uses_persistent_connections(self):
+        config = database_settings('postgres', Path('.'), env={'POSTGRES_HOST': 'db', 'POSTGRES_CONN_MAX_AGE': '120'})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((config['HOST'], config['CONN_MAX_AGE']), ('db', 120))
+        self.assertNotIn('pool', config['OPTIONS'])
+
+    def test_postgres_pool(self):
+        config = database_settings('postgres', Path('.'), env={'POSTGRES_POOL': 'true', 'POSTGRES_POOL_MAX_SIZE': '20'})
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 20)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            database_settings('oracle', Path('.'), env={})
+
+
+class SQLiteTuningTests(TestCase):
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+    def test_benchmark_runs_both_profiles(self):
+        for profile in PROFILES.values():
+            with tempfile.TemporaryDirectory() as directory:
+                result = run_benchmark(
+                    Path(directory) / 'bench.sqlite3', profile,
+                    {'readers': 2, 'writers': 1, 'seconds': 0.2, 'rows': 100},
+                )
+            self.assertGreater(result['reads'], 0)
+            self.assertGreater(result['writes'], 0)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        patch = mock.patch.dict(settings.DATABASES, {'replica': {}})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _read_alias(self, pinned_by_cookie=False, write_first=False):
+        """Route a read inside use_replica() the way a request would"""
+        def view(request):
+            if write_first:
+                self.router.db_for_write(Service)
+            with use_replica():
+                return HttpResponse(self.router.db_for_read(Service) or 'default')
+
+        request = RequestFactory().get('/')
+        if pinned_by_cookie:
+            request.COOKIES[PIN_COOKIE] = '1'
+        return Context().run(PrimaryPinMiddleware(view), request)
+
+    def test_reads_go_to_replica_only_when_asked(self):
+        self.assertEqual(self._read_alias().content, b'replica')
+        self.assertIsNone(Context().run(self.router.db_for_read, Service))
+
+    def test_write_pins_rest_of_request_and_sets_cookie(self):
+        response = self._read_alias(write_first=True)
+        self.assertEqual(response.content, b'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    def test_pin_cookie_keeps_reads_on_primary(self):
+        response = self._read_alias(pinned_by_cookie=True)
+        self.assertEqual(response.content, b'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_outside_a_request_does_not_pin_later_blocks(self):
+        def scenario():
+            self.router.db_for_write(Service)
+            with use_replica():
+                before = self.router.db_for_read(Service)
+                self.router.db_for_write(Service)
+                after = self.router.db_for_read(Service)
+            with use_replica():
+                next_block = self.router.db_for_read(Service)
+            return before, after, next_block
+
+        self.assertEqual(Context().run(scenario), ('replica', None, 'replica'))
+
+    def test_reads_inside_a_transaction_stay_on_primary(self):
+        with mock.patch.object(connection, 'in_atomic_block', True), use_replica():
+            self.assertIsNone(self.router.db_for_read(Service))
+
+    def test_no_replica_configured(self):
+        del settings.DATABASES['replica']
+        self.assertEqual(self._read_alias().content, b'default')
+
+    def test_replica_settings(self):
+        self.assertIsNone(replica_settings('sqlite', Path('.'), env={}))
+        config = replica_settings('postgres', Path('.'), env={'POSTGRES_REPLICA_HOST': 'replica-1'})
+        self.assertEqual(config['HOST'], 'replica-1')
+
+
+HAS_REPLICA = settings.REPLICA_DATABASE in settings.DATABASES
+
+
+@unittest.skipUnless(HAS_REPLICA, 'set SQLITE_REPLICA_PATH to test against two databases')
+class TwoDatabaseRoutingTests(TransactionTestCase):
+    """Run with e.g. SQLITE_REPLICA_PATH=replica.sqlite3 python manage.py test core"""
+
+    # The runner sets up every alias named here, even for skipped classes
+    databases = {'default', settings.REPLICA_DATABASE} if HAS_REPLICA else {'default'}
+
+    def test_reads_hit_the_replica_until_we_write(self):
+        def scenario():
+            # Outside a transaction: TestCase's would keep every read on the primary
+            Service.objects.create(name='Fade', description='', duration_minutes=30, price=10)
+            # The test databases are separate, so the replica never sees the row
+            with use_replica():
+                on_replica = Service.objects.count()
+            with pin_scope():
+                Service.objects.filter(name='Fade').update(duration_minutes=45)
+                with use_replica():
+                    after_own_write = Service.objects.count()
+            return on_replica, after_own_write
+
+        self.assertEqual(Context().run(scenario), (0, 1))
+
+    def test_cached_booking_stats_come_from_the_primary(self):
+        caches['default'].clear()
+        caches['local'].clear()
+        service = Service.objects.create(name='Fade', description='', duration_minutes=30, price=10)
+        customer = Customer.objects.create(first_name='Ana', last_name='B', email='ana@example.com')
+        Booking.objects.create(customer=customer, service=service,
+                               booking_date=date.today(), booking_time=datetime_time(9, 0))
+        # Another visitor, with no pin of their own, fills the cache
+        stats = Context().run(BookingService.get_booking_statistics)
+        self.assertEqual(stats['total_bookings'], 1)
+
+
+class CacheSettingsTests(SimpleTestCase):
+
+    def test_backend_follows_environment(self):
+        self.assertIn('LocMemCache', cache_settings(env={})['default']['BACKEND'])
+        self.assertIn('FileBasedCache', cache_settings(env={'CACHE_DIR': '/tmp/c'})['default']['BACKEND'])
+        redis = cache_settings(env={'REDIS_URL': 'redis://cache:6379/1'})['default']
+        self.assertEqual((redis['BACKEND'], redis['LOCATION']),
+                         ('django.core.cache.backends.redis.RedisCache', 'redis://cache:6379/1'))
+        self.assertIn('local', cache_settings(env={}))
+
+
+class TieredCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['local'].clear()
+        self.cache = TieredCache(lock_timeout=2, poll_interval=0.01)
+        self.calls = 0
+
+    def compute(self, value='fresh', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_value_is_computed_once(self):
+        for _ in range(3):
+            self.assertEqual(self.cache.get_or_compute('k', self.compute()), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_local_tier_answers_without_shared_cache(self):
+        self.cache.get_or_compute('k', self.compute())
+        caches['default'].clear()
+        self.assertEqual(self.cache.get_or_compute('k', self.compute()), 'fresh')
+        self.assertEqual(self.calls, 1)
+        caches['local'].clear()
+        self.cache.get_or_compute('k', self.compute())
+        self.assertEqual(self.calls, 2)
+
+    def test_early_expiration_probability(self):
+        now = 1000.0
+        entry = ('v', now + 1, 0.5)
+        with mock.patch('barbershop_system.caching.random.expovariate', return_value=0.1):
+            self.assertFalse(_expires_early(entry, now, beta=1.0))
+        with mock.patch('barbershop_system.caching.random.expovariate', return_value=3.0):
+            self.assertTrue(_expires_early(entry, now, beta=1.0))
+        self.assertTrue(_expires_early(entry, now + 1, beta=1.0))
+
+    def test_expired_value_is_served_while_another_caller_recomputes(self):
+        self.cache.get_or_compute('k', self.compute('old'), timeout=0)
+        caches['local'].clear()
+        caches['default'].add('k:lock', 1)
+        self.assertEqual(self.cache.get_or_compute('k', self.compute('new')), 'old')
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                self.cache.get_or_compute('k', self.compute(delay=0.2))
+            ))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['fresh'] * 5)
+        self.assertEqual(self.calls, 1)
+
+    def test_cached_service_namespaces(self):
+        @cached_service('test-things')
+        def double(value):
+            self.calls += 1
+            return value * 2
+
+        self.assertEqual([double(2), double(2), double(3)], [4, 4, 6])
+        self.assertEqual(self.calls, 2)
+        TieredCache().invalidate('test-things')
+        double(2)
+        self.assertEqual(self.calls, 3)
+
+
+class SyntheticDataTests(TestCase):
+
+    def _generate(self, seed=7, **options):
+        options = {'barbers': 2, 'customers': 40, 'years': 0.1, 'batch_size': 50, **options}
+        return SyntheticShop(seed=seed, **options).generate()
+
+    def _snapshot(self, seed):
+        with transaction.atomic():
+            self._generate(seed)
+            rows = list(Booking.objects.order_by('booking_date', 'booking_time', 'barber__username').values_list(
+                'booking_date', 'booking_time', 'status', 'service__name', 'customer__email', 'barber__username'
+            ))
+            transaction.set_rollback(True)
+        return rows
+
+    def test_same_seed_same_data(self):
+        first = self._snapshot(3)
+        self.assertTrue(first)
+        self.assertEqual(self._snapshot(3), first)
+        self.assertNotEqual(self._snapshot(4), first)
+
+    def test_generated_data_is_consistent(self):
+        counts = self._generate()
+        self.assertEqual(Booking.objects.count(), counts['bookings'])
+        completed = Booking.objects.filter(status='completed')
+        self.assertEqual(Payment.objects.count(), completed.count())
+        self.assertEqual(Invoice.objects.filter(is_paid=True).count(), completed.count())
+        self.assertFalse(Booking.objects.filter(booking_date__gte=date.today(), status='completed').exists())
+        self.assertEqual(StaffProfile.objects.exclude(monday_start=None, friday_start=None).count(), 2)
+
+        # No barber is double-booked
+        for barber_id, day in Booking.objects.values_list('barber_id', 'booking_date').distinct():
+            slots = list(Booking.objects.filter(barber_id=barber_id, booking_date=day)
+                         .order_by('booking_time').values_list('booking_time', 'end_time'))
+            for (_, previous_end), (start, _) in zip(slots, slots[1:]):
+                self.assertLessEqual(previous_end, start)
+
+        # Derived totals agree with what save() and the ledger would have kept
+        out = StringIO()
+        call_command('reconcile_customer_counters', dry_run=True, stdout=out)
+        self.assertIn('0 would be updated', out.getvalue())
+        call_command('rebuild_ledger_balances', dry_run=True, stdout=out)
+        self.assertIn('0 would be corrected', out.getvalue())
+        self.assertEqual(ledger.balance(ledger.CASH), sum(
+            Payment.objects.filter(status='completed').values_list('amount', flat=True), Decimal(0)
+        ))
+
+    def test_target_total_sets_the_rate(self):
+        counts = self._generate(barbers=3, bookings=300)
+        self.assertAlmostEqual(counts['bookings'], 300, delta=60)
+
+    def test_rerunning_a_seed_is_refused(self):
+        self._generate()
+        with self.assertRaises(CommandError):
+            call_command('generate_data', seed=7, barbers=1, customers=5, years=0.05, stdout=StringIO())
+
+    def test_poisson_mean(self):
+        rng = random.Random(1)
+        for mean in (0.5, 8, 50):
+            samples = [poisson(rng, mean) for _ in range(4000)]
+            self.assertAlmostEqual(sum(samples) / len(samples), mean, delta=mean * 0.05 + 0.05)
+
+
+class BenchmarkSuiteTests(TestCase):
+    TINY = {'tiny': {'seed': 47100, 'barbers': 2, 'customers': 30, 'years': 0.05, 'batch_size': 50}}
+
+    def _results(self, median_ms=1.0, queries=2):
+        return {'version': 1, 'sizes': {'small': {'cases': {
+            'create_booking': {'median_ms': median_ms, 'p95_ms': median_ms, 'min_ms': median_ms, 'queries': queries},
+        }}}}
+
+    def test_suite_measures_every_case_and_leaves_no_rows(self):
+        results = run_suite(self.TINY, warmup=1, repeat=2)
+        cases = results['sizes']['tiny']['cases']
+        self.assertIn('my_bookings', cases)
+        self.assertGreater(cases['create_booking']['queries'], 0)
+        self.assertEqual(cases['render_booking_table']['queries'], 0)
+        self.assertGreater(cases['available_time_slots']['median_ms'], 0)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_unknown_size(self):
+        with self.assertRaises(BenchmarkError):
+            run_suite(['huge'])
+
+    def test_compare_flags_slower_medians_and_extra_queries(self):
+        baseline = self._results()
+        self.assertEqual(compare(self._results(1.1), baseline, threshold=0.2), [])
+        self.assertEqual(len(compare(self._results(1.5), baseline, threshold=0.2)), 1)
+        self.assertEqual(len(compare(self._results(1.0, queries=3), baseline)), 1)
+        # Sub-0.1 ms differences are noise whatever the percentage
+        self.assertEqual(compare(self._results(0.05), self._results(0.01)), [])
+
+    def test_command_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'results.json'
+            with mock.patch.dict('core.benchmarks.SIZES', self.TINY, clear=True):
+                call_command('run_benchmarks', sizes='tiny', cases='create_booking', warmup=0,
+                             repeat=1, output=str(output), stdout=StringIO())
+                baseline = json.loads(output.read_text())
+                baseline['sizes']['tiny']['cases']['create_booking']['queries'] -= 1
+                output.write_text(json.dumps(baseline))
+                with self.assertRaisesMessage(CommandError, 'queries, was'):
+                    call_command('run_benchmarks', sizes='tiny', cases='create_booking', warmup=0,
+                                 repeat=1, baseline=str(output), stdout=StringIO())
+
+
+class LoadTestSessionTests(SimpleTestCase):
+
+    def test_cookies_csrf_and_redirects(self):
+        session = Session()
+        location = session.receive(Response(302, [
+            ('set-cookie', 'csrftoken=abc; Path=/'),
+            ('set-cookie', 'sessionid=s1; HttpOnly; Path=/'),
+            ('location', 'http://localhost/my-bookings/?page=2'),
+        ], b''))
+        self.assertEqual(location, '/my-bookings/?page=2')
+        method, path, headers, body = session.prepare('POST', '/book/', {'service': 3})
+        headers = dict(headers)
+        self.assertEqual(headers['X-CSRFToken'], 'abc')
+        self.assertIn('sessionid=s1', headers['Cookie'])
+        self.assertEqual(body, b'service=3')
+
+        session.receive(Response(200, [('set-cookie', 'sessionid=""; expires=Thu, 01 Jan 1970 00:00:00 GMT; Max-Age=0')], b''))
+        self.assertNotIn('sessionid', session.cookies)
+
+    def test_saturation(self):
+        def stage(users, per_second, p95_ms=50, error_rate=0):
+            return {'users': users, 'per_second': per_second, 'p95_ms': p95_ms, 'error_rate': error_rate}
+
+        self.assertIsNone(saturation(stage(10, 40), stage(5, 20), 1000, 0.01))
+        self.assertIn('throughput', saturation(stage(10, 22), stage(5, 20), 1000, 0.01))
+        self.assertIn('p95', saturation(stage(10, 40, p95_ms=1500), stage(5, 20), 1000, 0.01))
+        self.assertIn('error rate', saturation(stage(10, 40, error_rate=0.05), None, 1000, 0.01))
+
+
+class LoadTestRunTests(TransactionTestCase):
+    """Virtual customers need their own database connections, so nothing can stay in a test transaction"""
+
+    def setUp(self):
+        Service.objects.create(name='Haircut', description='Classic cut', duration_minutes=30, price=Decimal('25.00'))
+        User.objects.create_user('barber', password='pw', role='barber')
+
+    def test_customers_book_and_cancel_through_both_entry_points(self):
+        from barbershop_system.asgi import application as asgi_application
+        from barbershop_system.wsgi import application as wsgi_application
+
+        # One customer: the in-memory test database locks whole tables on concurrent writes
+        plan = prepare(1)
+        for transport in (WSGITransport(wsgi_application, host='testserver'),
+                          ASGITransport(asgi_application, host='testserver')):
+            with self.subTest(transport=type(transport).__name__):
+                summary = run_load(transport, plan, users=1, seconds=1).summary()
+                self.assertEqual(summary['errors'], 0)
+                self.assertEqual(summary['steps']['login']['requests'], 1)
+                self.assertGreater(summary['steps']['book']['requests'], 0)
+                self.assertGreater(summary['steps']['cancel']['requests'], 0)
+                self.assertGreater(summary['per_second'], 0)
+        self.assertTrue(Booking.objects.filter(status='cancelled', customer__user__username='loadtest-0000').exists())
+
+
+class StaticPipelineTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        patch = override_settings(STATIC_ROOT=self.root)
+        patch.enable()
+        self.addCleanup(patch.disable)
+
+    def _collect(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.url = static('css/atomic.css')
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse('from the app'))
+
+    def _get(self, path, **headers):
+        return self.middleware(RequestFactory().get(path, headers=headers))
+
+    def test_minify_css(self):
+        css = '/* note */ a :hover , b > c {\n  content: "a  ;  }" ;\n  color: red;\n}\n/*! licence */'
+        self.assertEqual(minify_css(css), 'a :hover,b>c{content:"a  ;  }";color:red}/*! licence */')
+
+    def test_collectstatic_hashes_minified_css_and_precompresses_it(self):
+        self._collect()
+        self.assertRegex(self.url, r'^/static/css/atomic\.[0-9a-f]{12}\.css$')
+        hashed = self.root / self.url.removeprefix('/static/')
+        source = (Path(settings.BASE_DIR) / 'core/static/css/atomic.css').read_text()
+        self.assertEqual(hashed.read_text(), minify_css(source))
+        self.assertEqual(gzip.decompress(hashed.with_name(hashed.name + '.gz').read_bytes()), hashed.read_bytes())
+        self.assertEqual(hashed.with_name(hashed.name + '.br').exists(), brotli is not None)
+
+    def test_hashed_files_are_immutable_and_served_compressed(self):
+        self._collect()
+        response = self._get(self.url, accept_encoding='gzip, deflate')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertTrue(response['Content-Type'].startswith('text/css'))
+        body = b''.join(response.streaming_content)
+        self.assertEqual(len(body), int(response['Content-Length']))
+        self.assertTrue(gzip.decompress(body).startswith(b':root{'))
+
+        revalidated = self._get(self.url, if_none_match=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_unhashed_and_unknown_paths(self):
+        self._collect()
+        response = self._get('/static/css/atomic.css', accept_encoding='gzip;q=0')
+        self.assertEqual(response['Cache-Control'], REVALIDATE)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(self._get('/static/css/missing.css').content, b'from the app')
+
+    @override_settings(STATIC_UNHASHED_FALLBACK=True)
+    def test_not_used_before_collectstatic(self):
+        with override_settings(STATIC_ROOT=self.root / 'never-collected'):
+            with self.assertRaises(MiddlewareNotUsed):
+                StaticFilesMiddleware(lambda request: HttpResponse())
+        self.assertEqual(static('css/atomic.css'), '/static/css/atomic.css')
+
+    @override_settings(STATIC_UNHASHED_FALLBACK=False)
+    def test_missing_manifest_fails_loudly_outside_development(self):
+        with self.assertRaises(ValueError):
+            static('css/atomic.css')
+
+
+
+def _image_upload(name, size, mode='RGB', fmt='JPEG'):
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 120, 40, 128) if mode == 'RGBA' else (200, 120, 40)).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ImagePipelineTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patch = override_settings(MEDIA_ROOT=directory.name)
+        patch.enable()
+        self.addCleanup(patch.disable)
+
+    def _service(self, **kwargs):
+        options = {'name': 'Haircut', 'description': 'Classic cut', 'duration_minutes': 30, 'price': Decimal('25.00')}
+        return Service.objects.create(**{**options, **kwargs})
+
+    def _run_jobs(self):
+        call_command('run_jobs', once=True, concurrency=1, stdout=StringIO())
+
+    def test_upload_queues_a_job_and_shows_the_original_until_it_runs(self):
+        service = self._service(image=_image_upload('cut.jpg', (2000, 1500)))
+        job = Job.objects.get(task='images.make_variants')
+        self.assertEqual(job.args, ['booking_management.Service', service.pk, 'image', service.image.name,
+                                    list(Service.IMAGE_WIDTHS)])
+        self.assertEqual(service.image_variants, {})
+        # Saving again does not queue it twice
+        service.save()
+        self.assertEqual(Job.objects.filter(task='images.make_variants').count(), 1)
+
+        html = ResponsiveImage.of(service, 'image', alt='Haircut').render()
+        self.assertIn(f'src="{service.image.url}"', html)
+        self.assertNotIn('<picture>', html)
+
+    def test_worker_writes_resized_webp_and_jpeg_variants(self):
+        service = self._service(image=_image_upload('cut.jpg', (2000, 1500)))
+        self._run_jobs()
+        service.refresh_from_db()
+
+        record = service.image_variants
+        self.assertEqual(record['source'], service.image.name)
+        self.assertEqual([width for width, _ in record['webp']], [320, 640, 960, 1280])
+        self.assertEqual([width for width, _ in record['jpeg']], [320, 640, 960, 1280])
+        self.assertEqual(record['webp'][0][1], 'services/cut.jpg.320w.webp')
+        with default_storage.open(record['webp'][0][1]) as file, Image.open(file) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (320, 240)))
+        largest = record['jpeg'][-1][1]
+        self.assertLess(default_storage.size(largest), default_storage.size(service.image.name))
+
+        html = ServiceCard.for_service(service).render()
+        self.assertIn('<source type="image/webp" srcset="/media/services/cut.jpg.320w.webp 320w, ', html)
+        self.assertIn(f'src="/media/{largest}"', html)
+        self.assertIn('width="2000" height="1500"', html)
+        self.assertIn('sizes="(min-width: 768px) 33vw, 100vw"', html)
+
+    def test_small_transparent_picture_is_not_upscaled_and_keeps_its_alpha(self):
+        user = User.objects.create_user('picture', password='x')
+        user.profile_picture = _image_upload('me.png', (200, 100), mode='RGBA', fmt='PNG')
+        user.save()
+        self._run_jobs()
+        user.refresh_from_db()
+
+        record = user.profile_picture_variants
+        self.assertEqual([width for width, _ in record['png']], [96, 160, 200])
+        self.assertNotIn('jpeg', record)
+        with default_storage.open(record['png'][-1][1]) as file, Image.open(file) as image:
+            self.assertEqual((image.mode, image.size), ('RGBA', (200, 100)))
+
+    def test_new_upload_replaces_the_previous_variants(self):
+        service = self._service(image=_image_upload('cut.jpg', (800, 600)))
+        self._run_jobs()
+        service.refresh_from_db()
+        previous = variant_names(service.image_variants)
+
+        service.image = _image_upload('fade.jpg', (800, 600))
+        service.save()
+        # The old variants belong to the old upload and are not shown for the new one
+        self.assertIsNone(ResponsiveImage.of(service, 'image').variants)
+        self._run_jobs()
+        service.refresh_from_db()
+
+        self.assertEqual(service.image_variants['source'], service.image.name)
+        self.assertFalse(any(default_storage.exists(name) for name in previous))
+        self.assertTrue(all(default_storage.exists(name) for name in variant_names(service.image_variants)))
+
+    def test_uploads_with_the_same_stem_keep_their_own_variants(self):
+        jpeg = self._service(image=_image_upload('cut.jpg', (800, 600)))
+        png = self._service(name='Fade', image=_image_upload('cut.png', (800, 600), fmt='PNG'))
+        self._run_jobs()
+        jpeg.refresh_from_db()
+        png.refresh_from_db()
+
+        jpeg_files, png_files = variant_names(jpeg.image_variants), variant_names(png.image_variants)
+        self.assertFalse(set(jpeg_files) & set(png_files))
+        self.assertTrue(all(default_storage.exists(name) for name in jpeg_files + png_files))
+
+        # Re-running a job writes new files and only removes the ones it replaced
+        make_image_variants('booking_management.Service', jpeg.pk, 'image', jpeg.image.name, [320])
+        jpeg.refresh_from_db()
+        self.assertFalse(any(default_storage.exists(name) for name in jpeg_files))
+        self.assertTrue(all(default_storage.exists(name) for name in png_files))
+
+    def test_profile_is_dropped_when_the_colour_mode_changes(self):
+        srgb = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+
+        def upload(name, mode):
+            buffer = BytesIO()
+            Image.new(mode, (400, 300)).save(buffer, 'JPEG', icc_profile=srgb)
+            return SimpleUploadedFile(name, buffer.getvalue())
+
+        # An RGB profile on a greyscale image stands in for any profile that does not fit RGB output
+        grey = self._service(image=upload('grey.jpg', 'L'))
+        colour = self._service(name='Fade', image=upload('colour.jpg', 'RGB'))
+        self._run_jobs()
+        grey.refresh_from_db()
+        colour.refresh_from_db()
+
+        with default_storage.open(grey.image_variants['jpeg'][0][1]) as file, Image.open(file) as image:
+            self.assertEqual(image.mode, 'RGB')
+            self.assertNotIn('icc_profile', image.info)
+        with default_storage.open(colour.image_variants['webp'][0][1]) as file, Image.open(file) as image:
+            self.assertEqual(image.info.get('icc_profile'), srgb)
+
+    def test_partial_user_saves_do_not_requeue_the_picture(self):
+        user = User.objects.create_user('picture', password='x')
+        user.profile_picture = SimpleUploadedFile('broken.jpg', b'not an image')
+        user.save()
+        with mock.patch('security_management.signals.queue_variants') as queue:
+            user.save(update_fields=['last_login'])
+            queue.assert_not_called()
+            user.save()
+            queue.assert_called_once()
+
+    def test_unreadable_upload_is_not_retried(self):
+        service = self._service(image=SimpleUploadedFile('broken.jpg', b'not an image'))
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self._run_jobs()
+        service.refresh_from_db()
+        self.assertEqual(service.image_variants, {})
+        self.assertEqual(Job.objects.get(task='images.make_variants').status, 'succeeded')
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_services_page_uses_srcset_once_variants_exist(self):
+        self._service(image=_image_upload('cut.jpg', (1600, 1200)))
+        self._run_jobs()
+        response = self.client.get(reverse('booking:services_list'))
+        self.assertContains(response, 'srcset="/media/services/cut.jpg.320w.webp 320w')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_backfill_command_queues_images_without_variants(self):
+        service = self._service(image=_image_upload('cut.jpg', (800, 600)))
+        self._service(name='Shave')
+        Job.objects.all().delete()
+        out = StringIO()
+        call_command('make_image_variants', stdout=out)
+        self.assertIn('Queued 1 image variant jobs.', out.getvalue())
+        self.assertEqual(Job.objects.get().args[1], service.pk)
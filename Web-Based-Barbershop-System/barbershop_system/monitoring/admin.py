@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import SamplingProfilerSettings
+
+
+@admin.register(SamplingProfilerSettings)
+class SamplingProfilerSettingsAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'interval_ms', 'keep_per_view', 'output_format', 'updated_at']
+
+    def has_add_permission(self, request):
+        return not SamplingProfilerSettings.objects.exists()
+
+    def has_delete_permission(self, request, obj=None):
+        return False
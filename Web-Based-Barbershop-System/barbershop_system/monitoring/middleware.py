@@ -0,0 +1,157 @@
+"""
+Per-view profiling
+
+ProfilingMiddleware times every request and, through database execute
+wrappers and a hook on template rendering, how much of that went to
+queries and templates. Results are recorded per URL name in the metrics
+registry; unmatched URLs share one label so 404 scans can't blow up the
+number of series.
+
+SamplingProfilerMiddleware samples the stacks of requests while the
+profiler is switched on in the admin and saves the slowest ones.
+"""
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+from .metrics import registry
+from .profiler import profiler_settings, sampler, save_profile
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+_current_profile = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """Query and template timings for one request; also the execute wrapper"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.duplicates = 0
+        self._seen = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            # executemany parameter lists can be huge; they are never duplicates worth reporting
+            if not many:
+                key = (sql, repr(params))
+                seen = self._seen.get(key, 0)
+                self._seen[key] = seen + 1
+                if seen:
+                    self.duplicates += 1
+
+    def most_duplicated(self):
+        (sql, params), count = max(self._seen.items(), key=lambda item: item[1])
+        return sql, count
+
+
+def instrument_templates():
+    """Time top-level template renders for the active request profile"""
+    if getattr(Template.render, 'profiled', False):
+        return
+    render = Template.render
+
+    def profiled_render(self, context=None, request=None):
+        profile = _current_profile.get()
+        if profile is None:
+            return render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+    profiled_render.profiled = True
+    Template.render = profiled_render
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNRESOLVED_VIEW
+
+
+class ProfilingMiddleware:
+    """
+    Record wall time, database time, query count, duplicate queries and
+    template time for each request, per URL name.
+
+    Put it ahead of the other middleware (only SecurityMiddleware and
+    StaticFilesMiddleware come first) so the wall time covers the stack.
+    Disable with ``PROFILING_ENABLED = False``.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        instrument_templates()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        elapsed = time.perf_counter() - started
+
+        view = view_label(request)
+        registry.observe('request_duration_seconds', view, elapsed * 1e6)
+        registry.observe('db_duration_seconds', view, profile.db_time * 1e6)
+        registry.observe('db_queries', view, profile.queries)
+        registry.observe('template_render_seconds', view, profile.template_time * 1e6)
+        if profile.duplicates:
+            registry.increment('duplicate_queries_total', view, profile.duplicates)
+            sql, count = profile.most_duplicated()
+            logger.debug('%s ran %d duplicate queries; %d x %s', view, profile.duplicates, count, sql)
+        return response
+
+
+class SamplingProfilerMiddleware:
+    """
+    Sample request stacks while SamplingProfilerSettings.enabled is set.
+
+    Only a cached settings lookup is added to requests while it is off.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = profiler_settings()
+        if not config.enabled:
+            return self.get_response(request)
+
+        sampler.start(config.interval_ms / 1000, stop_code=SamplingProfilerMiddleware.__call__.__code__)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        if duration_ms >= config.threshold_ms and stacks:
+            try:
+                save_profile(stacks, view_label(request), duration_ms, config)
+            except OSError:
+                logger.exception('Could not save the profile of a %d ms request', duration_ms)
+        return response
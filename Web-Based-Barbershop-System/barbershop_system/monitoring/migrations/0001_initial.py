@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:11
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SamplingProfilerSettings',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enabled', models.BooleanField(default=False)),
+                ('threshold_ms', models.PositiveIntegerField(default=1000, help_text='Only requests slower than this are saved')),
+                ('interval_ms', models.PositiveIntegerField(default=5, help_text='Time between stack samples', validators=[django.core.validators.MinValueValidator(1)])),
+                ('keep_per_view', models.PositiveIntegerField(default=5, help_text='Profiles kept for each URL name, slowest first', validators=[django.core.validators.MinValueValidator(1)])),
+                ('output_format', models.CharField(choices=[('speedscope', 'Speedscope JSON'), ('collapsed', 'Collapsed stacks (flamegraph.pl)')], default='speedscope', max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'sampling profiler settings',
+                'verbose_name_plural': 'sampling profiler settings',
+                'db_table': 'sampling_profiler_settings',
+            },
+        ),
+    ]
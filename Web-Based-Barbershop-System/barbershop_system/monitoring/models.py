@@ -0,0 +1,46 @@
+from django.core.validators import MinValueValidator
+from django.db import models
+
+from barbershop_system.caching import invalidate
+
+
+class SamplingProfilerSettings(models.Model):
+    """Runtime switch for the sampling profiler; one row, edited in the admin"""
+
+    FORMAT_CHOICES = [
+        ('speedscope', 'Speedscope JSON'),
+        ('collapsed', 'Collapsed stacks (flamegraph.pl)'),
+    ]
+
+    enabled = models.BooleanField(default=False)
+    threshold_ms = models.PositiveIntegerField(
+        default=1000, help_text="Only requests slower than this are saved"
+    )
+    interval_ms = models.PositiveIntegerField(
+        default=5, validators=[MinValueValidator(1)], help_text="Time between stack samples"
+    )
+    keep_per_view = models.PositiveIntegerField(
+        default=5, validators=[MinValueValidator(1)], help_text="Profiles kept for each URL name, slowest first"
+    )
+    output_format = models.CharField(max_length=20, choices=FORMAT_CHOICES, default='speedscope')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'sampling_profiler_settings'
+        verbose_name = 'sampling profiler settings'
+        verbose_name_plural = 'sampling profiler settings'
+
+    def __str__(self):
+        state = 'on' if self.enabled else 'off'
+        return f"Sampling profiler ({state}, over {self.threshold_ms} ms)"
+
+    def save(self, *args, **kwargs):
+        self.pk = 1
+        super().save(*args, **kwargs)
+        # Clears the cached settings everywhere the shared cache is shared;
+        # other workers' copies expire within seconds regardless
+        invalidate('profiler')
+
+    @classmethod
+    def load(cls):
+        return cls.objects.filter(pk=1).first() or cls(pk=1)
@@ -0,0 +1,163 @@
+"""
+Sampling profiler for slow requests
+
+While the profiler is switched on (SamplingProfilerSettings, in the admin)
+one daemon thread per process wakes every ``interval_ms`` and records the
+stack of each thread that is serving a request, via
+``sys._current_frames()``. Requests pay nothing beyond registering their
+thread; there is no tracing of every call as with cProfile. Requests that
+finish under the threshold throw their samples away; slower ones are
+written as speedscope or collapsed-stack files, keeping the slowest
+``keep_per_view`` for each URL name.
+"""
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from barbershop_system.caching import cached_service
+from .models import SamplingProfilerSettings
+
+EXTENSIONS = {'speedscope': 'speedscope.json', 'collapsed': 'collapsed.txt'}
+
+
+# Short, so the admin toggle reaches every worker within seconds even when
+# the shared cache is a per-process stand-in that never sees the invalidation
+@cached_service('profiler', timeout=5)
+def profiler_settings():
+    return SamplingProfilerSettings.load()
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse(frame, stop_code=None):
+    """The stack as 'root;...;leaf', cut below ``stop_code`` (the request entry point)"""
+    labels = []
+    while frame is not None and frame.f_code is not stop_code:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stacks of registered threads from a single daemon thread"""
+
+    def __init__(self):
+        self.interval = 0.005
+        self._stacks = {}
+        self._stop_codes = {}
+        self._lock = threading.Lock()
+        self._has_work = threading.Event()
+        self._thread = None
+
+    def start(self, interval, stop_code=None):
+        """Start sampling the calling thread; returns the Counter samples go into"""
+        stacks = Counter()
+        with self._lock:
+            self.interval = interval
+            self._stacks[threading.get_ident()] = stacks
+            self._stop_codes[threading.get_ident()] = stop_code
+            self._has_work.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        return stacks
+
+    def stop(self):
+        """Stop sampling the calling thread and return its samples"""
+        with self._lock:
+            stacks = self._stacks.pop(threading.get_ident(), Counter())
+            self._stop_codes.pop(threading.get_ident(), None)
+            if not self._stacks:
+                self._has_work.clear()
+        return stacks
+
+    def _run(self):
+        while True:
+            self._has_work.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._stacks.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[collapse(frame, self._stop_codes.get(ident))] += 1
+            del frames
+
+
+sampler = StackSampler()
+
+
+def collapsed_text(stacks):
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common() if stack)
+
+
+def speedscope_document(stacks, name, interval_ms):
+    """A sampled speedscope profile; each sample weighs one interval"""
+    frames, index, samples, weights = [], {}, [], []
+    for stack, count in stacks.most_common():
+        if not stack:
+            continue
+        sample = []
+        for label in stack.split(';'):
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({'name': label})
+            sample.append(index[label])
+        samples.append(sample)
+        weights.append(count * interval_ms)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'exporter': 'barbershop_system',
+        'name': name,
+        'activeProfileIndex': 0,
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
+
+
+def _duration_ms(path):
+    return int(path.name.split('ms-', 1)[0])
+
+
+def save_profile(stacks, view, duration_ms, config, output_dir=None):
+    """
+    Write the profile if it is among the ``keep_per_view`` slowest for ``view``.
+
+    File names start with the zero-padded duration, so the slowest sort
+    first. Returns the new file's path, or None if it was not kept.
+    """
+    directory = Path(output_dir or settings.PROFILER_OUTPUT_DIR) / re.sub(r'[^\w.-]', '_', view)
+    directory.mkdir(parents=True, exist_ok=True)
+    existing = sorted(directory.glob('*ms-*'), reverse=True)
+    if len(existing) >= config.keep_per_view and duration_ms <= _duration_ms(existing[config.keep_per_view - 1]):
+        return None
+
+    name = f'{int(duration_ms):09d}ms-{timezone.now():%Y%m%dT%H%M%S%f}.{EXTENSIONS[config.output_format]}'
+    path = directory / name
+    if config.output_format == 'speedscope':
+        title = f'{view} ({int(duration_ms)} ms)'
+        path.write_text(json.dumps(speedscope_document(stacks, title, config.interval_ms)))
+    else:
+        path.write_text(collapsed_text(stacks))
+
+    for old in sorted(directory.glob('*ms-*'), reverse=True)[config.keep_per_view:]:
+        old.unlink(missing_ok=True)
+    return path
@@ -0,0 +1,175 @@
+import json
+import shutil
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from barbershop_system.caching import invalidate
+from booking_management.models import Service
+from security_management.models import User
+from .metrics import Histogram, MetricsRegistry, registry, render_prometheus
+from .middleware import UNRESOLVED_VIEW, ProfilingMiddleware, SamplingProfilerMiddleware
+from .models import SamplingProfilerSettings
+from .profiler import profiler_settings, save_profile
+
+
+class HistogramTests(SimpleTestCase):
+
+    def test_small_values_are_exact(self):
+        histogram = Histogram()
+        for value in range(1, 101):
+            histogram.record(value)
+        self.assertEqual(histogram.percentile(0.5), 50)
+        self.assertEqual(histogram.percentile(0.99), 99)
+        self.assertEqual(histogram.percentile(1.0), 100)
+        self.assertEqual((histogram.count, histogram.total), (100, 5050))
+
+    def test_large_values_keep_relative_precision(self):
+        histogram = Histogram()
+        for value in range(1000, 1_000_001, 1000):
+            histogram.record(value)
+        for quantile in (0.5, 0.9, 0.99):
+            expected = quantile * 1_000_000
+            self.assertAlmostEqual(histogram.percentile(quantile), expected, delta=expected * 0.016)
+        self.assertEqual(histogram.percentile(1.0), 1_000_000)
+
+    def test_empty_histogram(self):
+        self.assertEqual(Histogram().percentile(0.5), 0)
+
+
+class PrometheusFormatTests(SimpleTestCase):
+
+    def test_summary_and_counter_output(self):
+        metrics = MetricsRegistry()
+        metrics.observe('request_duration_seconds', 'booking:home', 250_000)
+        metrics.observe('db_queries', 'booking:home', 3)
+        metrics.increment('duplicate_queries_total', 'booking:home', 2)
+        text = render_prometheus(metrics)
+
+        self.assertIn('# TYPE barbershop_request_duration_seconds summary', text)
+        self.assertIn('barbershop_request_duration_seconds{view="booking:home",quantile="0.5"} 0.25', text)
+        self.assertIn('barbershop_request_duration_seconds_count{view="booking:home"} 1', text)
+        self.assertIn('barbershop_db_queries_sum{view="booking:home"} 3', text)
+        self.assertIn('barbershop_duplicate_queries_total{view="booking:home"} 2', text)
+        self.assertNotIn('template_render_seconds', text)
+
+
+class ProfilingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        registry.reset()
+
+    def _run(self, view, path='/'):
+        request = RequestFactory().get(path)
+        request.resolver_match = None
+        return ProfilingMiddleware(view)(request)
+
+    def test_queries_duplicates_and_templates_are_recorded(self):
+        template = engines['django'].from_string('{% for n in numbers %}{{ n }}{% endfor %}')
+
+        def view(request):
+            for _ in range(3):
+                list(Service.objects.filter(name='Fade'))
+            list(Service.objects.filter(name='Trim'))
+            return HttpResponse(template.render({'numbers': range(100)}))
+
+        self._run(view)
+        self.assertEqual(registry.histogram('db_queries', UNRESOLVED_VIEW).max, 4)
+        self.assertEqual(registry.counters['duplicate_queries_total', UNRESOLVED_VIEW], 2)
+        self.assertGreater(registry.histogram('template_render_seconds', UNRESOLVED_VIEW).total, 0)
+        wall = registry.histogram('request_duration_seconds', UNRESOLVED_VIEW).total
+        self.assertGreaterEqual(wall, registry.histogram('db_duration_seconds', UNRESOLVED_VIEW).total)
+
+    def test_requests_are_labelled_by_url_name(self):
+        self.client.get(reverse('booking:home'))
+        self.assertEqual(registry.histogram('request_duration_seconds', 'booking:home').count, 1)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        url = reverse('monitoring:metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user('sam', password='pw', role='staff'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_user('root', password='pw', role='admin'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('view="monitoring:metrics"', response.content.decode())
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_scraper_token(self):
+        url = reverse('monitoring:metrics')
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-me').status_code, 200)
+
+
+def slow_booking_lookup():
+    time.sleep(0.1)
+
+
+class SamplingProfilerTests(TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        patch = override_settings(PROFILER_OUTPUT_DIR=self.output_dir)
+        patch.enable()
+        self.addCleanup(patch.disable)
+        # Cached settings outlive the test's rolled-back row
+        invalidate('profiler')
+        self.addCleanup(invalidate, 'profiler')
+
+    def _run(self, view):
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        return SamplingProfilerMiddleware(view)(request)
+
+    def test_settings_change_applies_without_restart(self):
+        self.assertFalse(profiler_settings().enabled)
+        SamplingProfilerSettings(enabled=True).save()
+        self.assertTrue(profiler_settings().enabled)
+        self.assertEqual(SamplingProfilerSettings.objects.count(), 1)
+
+    def test_slow_request_is_sampled(self):
+        SamplingProfilerSettings(enabled=True, threshold_ms=50, interval_ms=1).save()
+
+        def view(request):
+            slow_booking_lookup()
+            return HttpResponse()
+
+        self._run(view)
+        [profile] = (Path(self.output_dir) / '_unresolved_').iterdir()
+        document = json.loads(profile.read_text())
+        frames = [frame['name'] for frame in document['shared']['frames']]
+        self.assertIn('monitoring.tests:slow_booking_lookup', frames)
+        self.assertGreaterEqual(document['profiles'][0]['endValue'], 50)
+
+    def test_fast_request_is_not_saved(self):
+        SamplingProfilerSettings(enabled=True, threshold_ms=10_000).save()
+        self._run(lambda request: HttpResponse())
+        self.assertEqual(list(Path(self.output_dir).iterdir()), [])
+
+    def test_only_slowest_profiles_are_kept(self):
+        config = SamplingProfilerSettings(keep_per_view=2, output_format='collapsed')
+        stacks = Counter({'views:book;models:save': 3})
+        for duration in (300, 100, 200, 50):
+            save_profile(stacks, 'booking:book_appointment', duration, config)
+        kept = sorted(path.name.split('ms-')[0] for path in (Path(self.output_dir) / 'booking_book_appointment').iterdir())
+        self.assertEqual(kept, ['000000200', '000000300'])
+        profile = next((Path(self.output_dir) / 'booking_book_appointment').iterdir())
+        self.assertEqual(profile.read_text(), 'views:book;models:save 3\n')
+
+    def test_toggle_in_admin(self):
+        self.client.force_login(User.objects.create_superuser('boss', password='pw'))
+        response = self.client.post('/admin/monitoring/samplingprofilersettings/add/', {
+            'enabled': 'on', 'threshold_ms': 250, 'interval_ms': 2, 'keep_per_view': 3,
+            'output_format': 'speedscope',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(profiler_settings().threshold_ms, 250)
@@ -0,0 +1,11 @@
+"""
+URL configuration for monitoring app
+"""
+from django.urls import path
+from . import views
+
+app_name = 'monitoring'
+
+urlpatterns = [
+    path('', views.metrics, name='metrics'),
+]
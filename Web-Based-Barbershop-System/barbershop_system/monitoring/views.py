@@ -0,0 +1,26 @@
+"""
+Views for monitoring app
+"""
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from security_management.principal import get_principal
+from .metrics import render_prometheus
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _has_scrape_token(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    supplied = request.headers.get('Authorization', '')
+    return bool(token) and constant_time_compare(supplied, f'Bearer {token}')
+
+
+@require_GET
+def metrics(request):
+    """This process's request metrics for admins, or scrapers sending METRICS_TOKEN"""
+    if not (_has_scrape_token(request) or get_principal(request).is_admin):
+        return HttpResponseForbidden('Permission denied.')
+    return HttpResponse(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
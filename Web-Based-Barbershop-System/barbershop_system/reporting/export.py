@@ -0,0 +1,260 @@
+"""
+Columnar snapshots of bookings, payments, transactions and invoices
+
+Tables are read in primary-key chunks with ``values_list().iterator()``
+and written column by column to Parquet (when pyarrow is installed) or a
+compressed NumPy ``.npz`` archive. Money is stored as integer cents and
+timestamps as UTC ``datetime64`` so reports can work on whole columns.
+
+Each export adds one part file per table holding the rows changed since
+the previous export; ``manifest.json`` in the export directory records the
+parts and the ``updated_at`` high-water mark of each table. A row can be
+stamped before the mark yet commit after the export has read past it, so
+each export reads back ``EXPORT_LOOKBACK`` behind the mark; rows read twice
+are harmless because ``load_table`` keeps the newest version of each id.
+"""
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.utils import timezone
+
+from barbershop_system.routers import reads_from_replica
+from booking_management.models import Booking
+from transaction.models import Invoice, Payment, Transaction
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+MANIFEST = 'manifest.json'
+# How far behind the high-water mark each incremental export reads again
+EXPORT_LOOKBACK = timedelta(minutes=10)
+
+
+def _int(value):
+    return -1 if value is None else value
+
+
+def _cents(value):
+    return 0 if value is None else int(value * 100)
+
+
+def _datetime(value):
+    return None if value is None else value.astimezone(dt_timezone.utc).replace(tzinfo=None)
+
+
+def _seconds(value):
+    return -1 if value is None else value.hour * 3600 + value.minute * 60 + value.second
+
+
+# column kind -> (value converter, numpy dtype)
+KINDS = {
+    'int': (_int, 'int64'),
+    'money': (_cents, 'int64'),
+    'str': (lambda value: value or '', 'str'),
+    'bool': (bool, 'bool'),
+    'date': (lambda value: value, 'datetime64[D]'),
+    'datetime': (_datetime, 'datetime64[us]'),
+    'time': (_seconds, 'int32'),
+}
+
+# table -> (model, change-tracking field, [(column, ORM field, kind)])
+TABLES = {
+    'bookings': (Booking, 'updated_at', [
+        ('id', 'id', 'int'),
+        ('customer_id', 'customer_id', 'int'),
+        ('service_id', 'service_id', 'int'),
+        ('barber_id', 'barber_id', 'int'),
+        ('booking_date', 'booking_date', 'date'),
+        ('booking_time', 'booking_time', 'time'),
+        ('status', 'status', 'str'),
+        ('price', 'service__price', 'money'),
+        ('created_at', 'created_at', 'datetime'),
+        ('updated_at', 'updated_at', 'datetime'),
+    ]),
+    'payments': (Payment, 'updated_at', [
+        ('id', 'id', 'int'),
+        ('booking_id', 'booking_id', 'int'),
+        ('amount', 'amount', 'money'),
+        ('payment_method', 'payment_method', 'str'),
+        ('status', 'status', 'str'),
+        ('payment_date', 'payment_date', 'datetime'),
+        ('created_at', 'created_at', 'datetime'),
+        ('updated_at', 'updated_at', 'datetime'),
+    ]),
+    # The transaction log is append-only, so creation time tracks changes
+    'transactions': (Transaction, 'created_at', [
+        ('id', 'id', 'int'),
+        ('payment_id', 'payment_id', 'int'),
+        ('transaction_type', 'transaction_type', 'str'),
+        ('amount', 'amount', 'money'),
+        ('created_at', 'created_at', 'datetime'),
+    ]),
+    'invoices': (Invoice, 'updated_at', [
+        ('id', 'id', 'int'),
+        ('booking_id', 'booking_id', 'int'),
+        ('invoice_number', 'invoice_number', 'str'),
+        ('issue_date', 'issue_date', 'date'),
+        ('due_date', 'due_date', 'date'),
+        ('subtotal', 'subtotal', 'money'),
+        ('tax_amount', 'tax_amount', 'money'),
+        ('discount', 'discount', 'money'),
+        ('total', 'total', 'money'),
+        ('is_paid', 'is_paid', 'bool'),
+        ('paid_date', 'paid_date', 'datetime'),
+        ('updated_at', 'updated_at', 'datetime'),
+    ]),
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+def _require_numpy():
+    if np is None:
+        raise ExportError('Analytics export needs numpy (pip install numpy).')
+
+
+def read_columns(table, since=None, chunk_size=5000):
+    """
+    Return ``(columns, high_water_mark)`` for rows of ``table`` changed since ``since``.
+
+    Rows changed up to ``EXPORT_LOOKBACK`` before ``since`` are included
+    too, to catch ones that committed late; the mark never moves back.
+
+    Rows are fetched in chunks; each chunk is converted to arrays straight
+    away so only one chunk of Python objects is alive at a time.
+    """
+    _require_numpy()
+    model, change_field, spec = TABLES[table]
+    queryset = model.objects.order_by('pk')
+    if since is not None:
+        queryset = queryset.filter(**{f'{change_field}__gte': since - EXPORT_LOOKBACK})
+    fields = [field for _, field, _ in spec] + [change_field]
+
+    chunks = {name: [] for name, _, _ in spec}
+    high_water_mark = since
+    rows = []
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) == chunk_size:
+            high_water_mark = _flush_chunk(rows, spec, chunks, high_water_mark)
+            rows = []
+    if rows:
+        high_water_mark = _flush_chunk(rows, spec, chunks, high_water_mark)
+
+    columns = {}
+    for name, _, kind in spec:
+        dtype = KINDS[kind][1]
+        parts = chunks[name]
+        columns[name] = np.concatenate(parts) if parts else np.array([], dtype=dtype)
+    return columns, high_water_mark
+
+
+def _flush_chunk(rows, spec, chunks, high_water_mark):
+    for index, (name, _, kind) in enumerate(spec):
+        convert, dtype = KINDS[kind]
+        chunks[name].append(np.array([convert(row[index]) for row in rows], dtype=dtype))
+    chunk_max = max(row[-1] for row in rows)
+    return chunk_max if high_water_mark is None or chunk_max > high_water_mark else high_water_mark
+
+
+def write_part(path, columns, file_format='auto'):
+    """Write columns to ``path`` plus the format's suffix; returns the file name"""
+    if file_format == 'auto':
+        file_format = 'parquet' if pq is not None else 'npz'
+    if file_format == 'parquet':
+        if pq is None:
+            raise ExportError('Parquet export needs pyarrow (pip install pyarrow).')
+        target = path.with_suffix('.parquet')
+        pq.write_table(pa.table({name: pa.array(values) for name, values in columns.items()}), target)
+    else:
+        target = path.with_suffix('.npz')
+        np.savez_compressed(target, **columns)
+    return target.name
+
+
+def read_part(path):
+    _require_numpy()
+    path = Path(path)
+    if path.suffix == '.parquet':
+        if pq is None:
+            raise ExportError(f'Reading {path.name} needs pyarrow.')
+        table = pq.read_table(path)
+        return {name: table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names}
+    with np.load(path) as archive:
+        return {name: archive[name] for name in archive.files}
+
+
+def load_manifest(export_dir):
+    path = Path(export_dir) / MANIFEST
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_manifest(export_dir, manifest):
+    path = Path(export_dir) / MANIFEST
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(manifest, indent=2))
+    temporary.replace(path)
+
+
+@reads_from_replica
+def export_tables(export_dir, tables=None, full=False, file_format='auto', chunk_size=5000):
+    """
+    Export changed rows of each table; returns ``{table: rows written}``.
+
+    With ``full`` the previous parts are dropped and every row is exported.
+    """
+    export_dir = Path(export_dir)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(export_dir)
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+    written = {}
+
+    for table in tables or TABLES:
+        state = manifest.get(table, {'parts': [], 'high_water_mark': None})
+        if full:
+            for part in state['parts']:
+                (export_dir / part).unlink(missing_ok=True)
+            state = {'parts': [], 'high_water_mark': None}
+
+        since = datetime.fromisoformat(state['high_water_mark']) if state['high_water_mark'] else None
+        columns, high_water_mark = read_columns(table, since, chunk_size)
+        written[table] = len(columns['id'])
+        if written[table]:
+            state['parts'].append(write_part(export_dir / f'{table}-{stamp}', columns, file_format))
+            state['high_water_mark'] = high_water_mark.isoformat()
+        manifest[table] = state
+        save_manifest(export_dir, manifest)
+    return written
+
+
+def load_table(export_dir, table):
+    """
+    Combine a table's parts into one set of columns.
+
+    A row exported more than once keeps its latest version.
+    """
+    _require_numpy()
+    export_dir = Path(export_dir)
+    parts = [read_part(export_dir / part) for part in load_manifest(export_dir).get(table, {}).get('parts', [])]
+    if not parts:
+        _, _, spec = TABLES[table]
+        return {name: np.array([], dtype=KINDS[kind][1]) for name, _, kind in spec}
+
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    # np.unique keeps the first occurrence, so look from the newest row back
+    _, newest = np.unique(columns['id'][::-1], return_index=True)
+    keep = len(columns['id']) - 1 - newest
+    return {name: values[keep] for name, values in columns.items()}
@@ -0,0 +1,30 @@
+"""
+Print a monthly report computed from an analytics export
+"""
+import csv
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reporting.export import ExportError
+from reporting.reports import REPORTS
+
+
+class Command(BaseCommand):
+    help = 'Print a monthly report (CSV) from the files written by export_analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('report', choices=list(REPORTS))
+        parser.add_argument('--input', default=str(settings.ANALYTICS_EXPORT_DIR), help='Export directory')
+
+    def handle(self, *args, **options):
+        try:
+            rows = REPORTS[options['report']](options['input'])
+        except ExportError as exc:
+            raise CommandError(str(exc))
+        if not rows:
+            return
+        self.stdout.ending = ''
+        writer = csv.DictWriter(self.stdout, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,33 @@
+"""
+Snapshot bookings and payments into columnar files for offline reporting
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reporting.export import TABLES, ExportError, export_tables
+
+
+class Command(BaseCommand):
+    help = 'Export rows changed since the last export to Parquet or .npz files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.ANALYTICS_EXPORT_DIR), help='Export directory')
+        parser.add_argument('--full', action='store_true', help='Discard earlier parts and export everything')
+        parser.add_argument('--format', choices=['auto', 'parquet', 'npz'], default='auto')
+        parser.add_argument('--table', action='append', choices=list(TABLES), help='Limit to these tables')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        try:
+            written = export_tables(
+                options['output'],
+                tables=options['table'],
+                full=options['full'],
+                file_format=options['format'],
+                chunk_size=options['chunk_size'],
+            )
+        except ExportError as exc:
+            raise CommandError(str(exc))
+        for table, count in written.items():
+            self.stdout.write(f'{table}: {count} rows')
+        self.stdout.write(self.style.SUCCESS(f"Exported to {options['output']}."))
@@ -0,0 +1,89 @@
+"""
+Monthly reports computed from an analytics export
+
+Every report works on whole NumPy columns (grouping with np.unique and
+np.add.at), so it runs against the exported files and never touches the
+live database.
+"""
+from decimal import Decimal
+
+from booking_management.models import Booking
+from .export import load_table, np
+
+
+def _month(values):
+    return values.astype('datetime64[M]')
+
+
+def _group_sum(keys, values):
+    """Sum integer ``values`` per distinct key; returns (keys, sums)"""
+    groups, inverse = np.unique(keys, return_inverse=True)
+    sums = np.zeros(len(groups), dtype=np.int64)
+    np.add.at(sums, inverse, values)
+    return groups, sums
+
+
+def _money(cents):
+    return (Decimal(int(cents)) / 100).quantize(Decimal('0.01'))
+
+
+def monthly_revenue(export_dir):
+    """Payments, refunds and net revenue per month from the transaction log"""
+    transactions = load_table(export_dir, 'transactions')
+    months = _month(transactions['created_at'])
+    amounts = transactions['amount']
+    kinds = transactions['transaction_type']
+
+    all_months = np.unique(months)
+    rows = []
+    totals = {}
+    for kind in ('payment', 'refund'):
+        mask = kinds == kind
+        groups, sums = _group_sum(months[mask], amounts[mask])
+        totals[kind] = dict(zip(groups.tolist(), sums.tolist()))
+    for month in all_months.tolist():
+        payments = totals['payment'].get(month, 0)
+        refunds = totals['refund'].get(month, 0)
+        rows.append({
+            'month': month.strftime('%Y-%m'),
+            'payments': _money(payments),
+            'refunds': _money(-refunds),
+            'net': _money(payments + refunds),
+        })
+    return rows
+
+
+def monthly_bookings(export_dir):
+    """Bookings per month of appointment, by status"""
+    bookings = load_table(export_dir, 'bookings')
+    months = _month(bookings['booking_date'])
+    statuses = np.array(sorted(status for status, _ in Booking.STATUS_CHOICES))
+
+    all_months, month_index = np.unique(months, return_inverse=True)
+    status_index = np.searchsorted(statuses, bookings['status'].astype(str))
+    counts = np.zeros((len(all_months), len(statuses)), dtype=np.int64)
+    np.add.at(counts, (month_index, status_index), 1)
+    return [
+        {'month': month.strftime('%Y-%m'), 'total': int(row.sum()), **dict(zip(statuses.tolist(), row.tolist()))}
+        for month, row in zip(all_months.tolist(), counts)
+    ]
+
+
+def monthly_receivables(export_dir):
+    """Unpaid invoices per month of issue, with the amount outstanding"""
+    invoices = load_table(export_dir, 'invoices')
+    unpaid = ~invoices['is_paid'].astype(bool)
+    months = _month(invoices['issue_date'][unpaid])
+    groups, totals = _group_sum(months, invoices['total'][unpaid])
+    _, counts = _group_sum(months, np.ones(len(months), dtype=np.int64))
+    return [
+        {'month': month.strftime('%Y-%m'), 'invoices': int(count), 'outstanding': _money(total)}
+        for month, count, total in zip(groups.tolist(), counts.tolist(), totals.tolist())
+    ]
+
+
+REPORTS = {
+    'revenue': monthly_revenue,
+    'bookings': monthly_bookings,
+    'receivables': monthly_receivables,
+}
@@ -0,0 +1,105 @@
+import csv
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from booking_management.models import Booking, Customer, Service
+from transaction.models import Payment
+from . import export
+from .export import export_tables, load_manifest, load_table
+from .reports import monthly_bookings, monthly_receivables, monthly_revenue
+
+
+class AnalyticsExportTests(TestCase):
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_dir)
+        customer = Customer.objects.create(
+            first_name='Ola', last_name='Berg', email='ola@example.com', phone_number='1'
+        )
+        service = Service.objects.create(name='Cut', description='', duration_minutes=30, price=Decimal('20.50'))
+        self.today = date.today()
+        self.bookings = [
+            Booking.objects.create(
+                customer=customer, service=service,
+                booking_date=self.today, booking_time=time(9 + index, 0)
+            )
+            for index in range(3)
+        ]
+        for booking in self.bookings[:2]:
+            booking.complete()
+            Payment.objects.create(booking=booking, amount=service.price, payment_method='cash').mark_completed()
+        self.bookings[0].payment.refund('Redo')
+
+    def test_export_and_reports(self):
+        written = export_tables(self.export_dir, file_format='npz')
+        self.assertEqual(written, {'bookings': 3, 'payments': 2, 'transactions': 3, 'invoices': 0})
+
+        bookings = load_table(self.export_dir, 'bookings')
+        self.assertEqual(bookings['price'].tolist(), [2050, 2050, 2050])
+
+        month = self.today.strftime('%Y-%m')
+        [revenue] = monthly_revenue(self.export_dir)
+        self.assertEqual(revenue, {
+            'month': month, 'payments': Decimal('41.00'), 'refunds': Decimal('20.50'), 'net': Decimal('20.50')
+        })
+        [counts] = monthly_bookings(self.export_dir)
+        self.assertEqual((counts['total'], counts['completed'], counts['pending']), (3, 2, 1))
+        self.assertEqual(monthly_receivables(self.export_dir), [])
+
+    def test_incremental_export_keeps_latest_version(self):
+        # Rows last changed long before the mark are not read again
+        Booking.objects.exclude(pk=self.bookings[2].pk).update(updated_at=timezone.now() - timedelta(days=1))
+        export_tables(self.export_dir, file_format='npz')
+
+        self.bookings[2].cancel('Away')
+        written = export_tables(self.export_dir, tables=['bookings'], file_format='npz')
+        self.assertEqual(written, {'bookings': 1})
+        self.assertEqual(len(load_manifest(self.export_dir)['bookings']['parts']), 2)
+
+        bookings = load_table(self.export_dir, 'bookings')
+        self.assertEqual(sorted(bookings['id'].tolist()), sorted(b.pk for b in self.bookings))
+        statuses = dict(zip(bookings['id'].tolist(), bookings['status'].tolist()))
+        self.assertEqual(statuses[self.bookings[2].pk], 'cancelled')
+
+    def test_incremental_export_picks_up_late_commits(self):
+        export_tables(self.export_dir, tables=['bookings'], file_format='npz')
+        mark = datetime.fromisoformat(load_manifest(self.export_dir)['bookings']['high_water_mark'])
+
+        # Stamped before the mark, but committed after the export read the table
+        Booking.objects.filter(pk=self.bookings[2].pk).update(
+            status='cancelled', updated_at=mark - timedelta(seconds=1)
+        )
+        export_tables(self.export_dir, tables=['bookings'], file_format='npz')
+
+        bookings = load_table(self.export_dir, 'bookings')
+        statuses = dict(zip(bookings['id'].tolist(), bookings['status'].tolist()))
+        self.assertEqual(statuses[self.bookings[2].pk], 'cancelled')
+        self.assertEqual(load_manifest(self.export_dir)['bookings']['high_water_mark'], mark.isoformat())
+
+    def test_full_export_replaces_parts(self):
+        export_tables(self.export_dir, file_format='npz')
+        self.bookings[2].cancel('Away')
+        export_tables(self.export_dir, file_format='npz')
+        export_tables(self.export_dir, full=True, file_format='npz')
+        self.assertEqual(len(load_manifest(self.export_dir)['bookings']['parts']), 1)
+
+    def test_report_command(self):
+        call_command('export_analytics', output=self.export_dir, format='npz', stdout=StringIO())
+        out = StringIO()
+        call_command('analytics_report', 'revenue', input=self.export_dir, stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual(rows[0]['net'], '20.50')
+
+    @unittest.skipUnless(export.pq is not None, 'pyarrow is not installed')
+    def test_parquet_round_trip(self):
+        export_tables(self.export_dir, file_format='parquet')
+        self.assertEqual(load_table(self.export_dir, 'payments')['amount'].tolist(), [2050, 2050])
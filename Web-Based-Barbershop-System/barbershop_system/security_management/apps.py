@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SecurityManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'security_management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
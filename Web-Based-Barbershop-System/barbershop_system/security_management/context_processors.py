@@ -0,0 +1,9 @@
+"""
+Template context processors for security management
+"""
+from .principal import get_principal
+
+
+def principal(request):
+    """Expose the session principal so templates need not load the user"""
+    return {'principal': get_principal(request)}
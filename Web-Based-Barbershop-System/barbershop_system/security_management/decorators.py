@@ -4,7 +4,19 @@ Security decorators for role-based access control
 from functools import wraps
 from django.shortcuts import redirect
 from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import PermissionDenied
+from .principal import get_principal
+
+
+def login_required(view_func):
+    """Session-principal aware replacement for django's login_required"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not get_principal(request).is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return view_func(request, *args, **kwargs)
+    return wrapper
 
 
 def role_required(*roles):
@@ -12,11 +24,12 @@ def role_required(*roles):
     def decorator(view_func):
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            if not request.user.is_authenticated:
+            principal = get_principal(request)
+            if not principal.is_authenticated:
                 messages.error(request, 'You must be logged in to access this page.')
                 return redirect('login')
 
-            if request.user.role not in roles:
+            if principal.role not in roles:
                 messages.error(request, 'You do not have permission to access this page.')
                 raise PermissionDenied
 
@@ -0,0 +1,54 @@
+"""
+Delete old login attempts and rollups in small batches
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from security_management.models import LoginAttempt, LoginAttemptRollup
+
+
+def prune_in_batches(queryset, batch_size, pause=0):
+    """
+    Delete ``queryset`` a batch of primary keys at a time.
+
+    Each batch is its own short statement, so writers are never blocked
+    for long; ``pause`` seconds between batches further limit the impact.
+    """
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        count, _ = queryset.model.objects.filter(pk__in=ids).delete()
+        deleted += count
+        if pause:
+            time.sleep(pause)
+
+
+class Command(BaseCommand):
+    help = 'Delete login attempts and rollups older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Raw attempt retention in days')
+        parser.add_argument('--rollup-days', type=int, default=365, help='Rollup retention in days')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        attempts = prune_in_batches(
+            LoginAttempt.objects.filter(timestamp__lt=now - timedelta(days=options['days'])),
+            options['batch_size'],
+            options['pause'],
+        )
+        rollups = prune_in_batches(
+            LoginAttemptRollup.objects.filter(hour__lt=now - timedelta(days=options['rollup_days'])),
+            options['batch_size'],
+            options['pause'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {attempts} login attempts and {rollups} rollups.'
+        ))
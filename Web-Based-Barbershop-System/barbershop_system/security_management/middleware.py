@@ -0,0 +1,17 @@
+"""
+Security middleware
+"""
+from django.utils.functional import SimpleLazyObject
+
+from .principal import get_principal
+
+
+class PrincipalMiddleware:
+    """Attach a lazy ``request.principal`` built from the signed session snapshot"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.principal = SimpleLazyObject(lambda: get_principal(request))
+        return self.get_response(request)
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:28
+
+import django.contrib.auth.models
+import django.contrib.auth.validators
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150)),
+                ('ip_address', models.GenericIPAddressField()),
+                ('success', models.BooleanField(default=False)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('user_agent', models.TextField(blank=True)),
+            ],
+            options={
+                'db_table': 'login_attempts',
+                'ordering': ['-timestamp'],
+            },
+        ),
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('email', models.EmailField(blank=True, max_length=254, verbose_name='email address')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('role', models.CharField(choices=[('customer', 'Customer'), ('barber', 'Barber'), ('staff', 'Staff'), ('admin', 'Administrator')], default='customer', max_length=20)),
+                ('phone_number', models.CharField(blank=True, max_length=17, validators=[django.core.validators.RegexValidator(message="Phone number must be entered in the format: '+999999999'. Up to 15 digits allowed.", regex='^\\+?1?\\d{9,15}$')])),
+                ('date_of_birth', models.DateField(blank=True, null=True)),
+                ('profile_picture', models.ImageField(blank=True, null=True, upload_to='profiles/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'db_table': 'users',
+                'ordering': ['-created_at'],
+            },
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StaffProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bio', models.TextField(blank=True)),
+                ('specialization', models.CharField(blank=True, max_length=200)),
+                ('years_of_experience', models.PositiveIntegerField(default=0)),
+                ('hourly_rate', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('is_available', models.BooleanField(default=True)),
+                ('rating', models.DecimalField(decimal_places=2, default=0.0, max_digits=3)),
+                ('total_reviews', models.PositiveIntegerField(default=0)),
+                ('monday_start', models.TimeField(blank=True, null=True)),
+                ('monday_end', models.TimeField(blank=True, null=True)),
+                ('tuesday_start', models.TimeField(blank=True, null=True)),
+                ('tuesday_end', models.TimeField(blank=True, null=True)),
+                ('wednesday_start', models.TimeField(blank=True, null=True)),
+                ('wednesday_end', models.TimeField(blank=True, null=True)),
+                ('thursday_start', models.TimeField(blank=True, null=True)),
+                ('thursday_end', models.TimeField(blank=True, null=True)),
+                ('friday_start', models.TimeField(blank=True, null=True)),
+                ('friday_end', models.TimeField(blank=True, null=True)),
+                ('saturday_start', models.TimeField(blank=True, null=True)),
+                ('saturday_end', models.TimeField(blank=True, null=True)),
+                ('sunday_start', models.TimeField(blank=True, null=True)),
+                ('sunday_end', models.TimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='staff_profile', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'staff_profiles',
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('security_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginAttemptRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('dimension', models.CharField(choices=[('ip', 'IP Address'), ('username', 'Username')], max_length=10)),
+                ('key', models.CharField(max_length=150)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('failures', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'login_attempt_rollups',
+                'ordering': ['-hour'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='loginattempt',
+            index=models.Index(fields=['timestamp'], name='login_attem_timesta_631483_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loginattempt',
+            index=models.Index(fields=['ip_address', 'timestamp'], name='login_attem_ip_addr_340a7c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loginattempt',
+            index=models.Index(fields=['username', 'timestamp'], name='login_attem_usernam_ece61f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loginattemptrollup',
+            index=models.Index(fields=['hour'], name='login_attem_hour_d47311_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='loginattemptrollup',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key', 'hour'), name='login_rollup_unique_bucket'),
+        ),
+    ]
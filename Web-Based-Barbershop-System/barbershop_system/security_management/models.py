@@ -13,6 +13,9 @@ class User(AbstractUser):
         ('admin', 'Administrator'),
     ]
 
+    # Widths of the resized copies made by core.images; pictures are shown up to 150px wide
+    PROFILE_PICTURE_WIDTHS = (96, 160, 320)
+
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='customer')
     phone_regex = RegexValidator(
         regex=r'^\+?1?\d{9,15}$',
@@ -21,6 +24,7 @@ class User(AbstractUser):
     phone_number = models.CharField(validators=[phone_regex], max_length=17, blank=True)
     date_of_birth = models.DateField(null=True, blank=True)
     profile_picture = models.ImageField(upload_to='profiles/', null=True, blank=True)
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -89,6 +93,22 @@ class StaffProfile(models.Model):
         self.save()
 
 
+class LoginAttemptQuerySet(models.QuerySet):
+    """Security queries served by the composite (key, timestamp) indexes"""
+
+    def since(self, moment):
+        return self.filter(timestamp__gte=moment)
+
+    def failures(self):
+        return self.filter(success=False)
+
+    def for_ip(self, ip_address):
+        return self.filter(ip_address=ip_address)
+
+    def for_username(self, username):
+        return self.filter(username=username)
+
+
 class LoginAttempt(models.Model):
     """Track login attempts for security"""
 
@@ -98,10 +118,48 @@ class LoginAttempt(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     user_agent = models.TextField(blank=True)
 
+    objects = LoginAttemptQuerySet.as_manager()
+
     class Meta:
         db_table = 'login_attempts'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp']),
+            models.Index(fields=['ip_address', 'timestamp']),
+            models.Index(fields=['username', 'timestamp']),
+        ]
 
     def __str__(self):
         status = "Success" if self.success else "Failed"
         return f"{self.username} - {status} at {self.timestamp}"
+
+
+class LoginAttemptRollup(models.Model):
+    """Hourly login attempt totals per IP address or username"""
+
+    DIMENSION_CHOICES = [
+        ('ip', 'IP Address'),
+        ('username', 'Username'),
+    ]
+
+    hour = models.DateTimeField()
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=150)
+    attempts = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'login_attempt_rollups'
+        ordering = ['-hour']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dimension', 'key', 'hour'],
+                name='login_rollup_unique_bucket',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_dimension_display()} {self.key} @ {self.hour:%Y-%m-%d %H:00}: {self.failures}/{self.attempts} failed"
@@ -0,0 +1,185 @@
+"""
+Session-embedded principal - a signed snapshot of the logged-in user
+
+Most pages only need to know who is logged in and what role they have.
+Keeping that in the session lets those pages skip loading the user row.
+The snapshot is trusted only while its stamp matches the one in the shared
+cache and it was issued for the session's current auth hash; anything
+else, including a stamp the cache has lost, sends the request back to the
+full user load.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.core import signing
+from django.core.cache import cache
+
+PRINCIPAL_SESSION_KEY = '_principal'
+PRINCIPAL_VERSION = 2
+PRINCIPAL_SALT = 'security_management.principal'
+STAMP_CACHE_KEY = 'security:principal-stamp:{}'
+
+
+class Principal:
+    """Who the current user is, without the user row"""
+
+    is_authenticated = True
+
+    def __init__(self, user_id, username, role, display_name,
+                 customer_id=None, staff_profile_id=None, stamp=None, auth_hash=''):
+        self.user_id = user_id
+        self.username = username
+        self.role = role
+        self.display_name = display_name
+        self.customer_id = customer_id
+        self.staff_profile_id = staff_profile_id
+        self.stamp = stamp
+        self.auth_hash = auth_hash
+
+    def __str__(self):
+        return self.display_name
+
+    @property
+    def is_barber(self):
+        return self.role == 'barber'
+
+    @property
+    def is_staff_member(self):
+        return self.role in ['staff', 'admin']
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    @classmethod
+    def from_user(cls, user):
+        """Build a principal from a loaded user and its optional profiles"""
+        staff_profile = user.staff_profile if hasattr(user, 'staff_profile') else None
+        customer = user.customer_profile if hasattr(user, 'customer_profile') else None
+        return cls(
+            user_id=user.pk,
+            username=user.username,
+            role=user.role,
+            display_name=user.get_full_name() or user.username,
+            customer_id=customer.pk if customer else None,
+            staff_profile_id=staff_profile.pk if staff_profile else None,
+            stamp=issue_stamp(user.pk),
+            auth_hash=user.get_session_auth_hash(),
+        )
+
+    def dumps(self):
+        return signing.dumps({
+            'v': PRINCIPAL_VERSION,
+            'uid': self.user_id,
+            'name': self.username,
+            'role': self.role,
+            'display': self.display_name,
+            'cid': self.customer_id,
+            'spid': self.staff_profile_id,
+            'stamp': self.stamp,
+            'hash': self.auth_hash,
+        }, salt=PRINCIPAL_SALT, compress=True)
+
+    @classmethod
+    def loads(cls, token):
+        """Return the principal in ``token``, or None if it is forged, expired or outdated"""
+        try:
+            payload = signing.loads(
+                token, salt=PRINCIPAL_SALT, max_age=getattr(settings, 'PRINCIPAL_MAX_AGE', 300)
+            )
+        except signing.BadSignature:
+            return None
+        if payload.get('v') != PRINCIPAL_VERSION:
+            return None
+        return cls(
+            user_id=payload['uid'],
+            username=payload['name'],
+            role=payload['role'],
+            display_name=payload['display'],
+            customer_id=payload['cid'],
+            staff_profile_id=payload['spid'],
+            stamp=payload['stamp'],
+            auth_hash=payload['hash'],
+        )
+
+
+class AnonymousPrincipal:
+    """Principal for visitors who are not logged in"""
+
+    is_authenticated = False
+    user_id = None
+    username = ''
+    role = None
+    display_name = ''
+    customer_id = None
+    staff_profile_id = None
+    is_barber = False
+    is_staff_member = False
+    is_admin = False
+
+    def __str__(self):
+        return 'Anonymous'
+
+
+def current_stamp(user_id):
+    """The user's principal stamp, or None once the cache has lost it"""
+    return cache.get(STAMP_CACHE_KEY.format(user_id))
+
+
+def issue_stamp(user_id):
+    """The stamp a new principal carries, seeding one if the cache has none"""
+    key = STAMP_CACHE_KEY.format(user_id)
+    # add() keeps a stamp another worker has just set
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def invalidate_principal(user_id):
+    """Make every session principal issued for ``user_id`` stale"""
+    cache.set(STAMP_CACHE_KEY.format(user_id), time.time_ns(), timeout=None)
+
+
+def _is_current(principal, user_id, session):
+    # A missing stamp (evicted, or a cache that restarted) counts as stale
+    return (
+        str(principal.user_id) == str(user_id)
+        and principal.auth_hash == session.get(HASH_SESSION_KEY)
+        and principal.stamp is not None
+        and principal.stamp == current_stamp(principal.user_id)
+    )
+
+
+def _load_principal(request):
+    session = getattr(request, 'session', None)
+    if session is None:
+        # No session to cache in (e.g. RequestFactory requests); use the user directly
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return AnonymousPrincipal()
+        return Principal.from_user(user)
+
+    user_id = session.get(SESSION_KEY)
+    if user_id is None:
+        return AnonymousPrincipal()
+
+    token = session.get(PRINCIPAL_SESSION_KEY)
+    if token:
+        principal = Principal.loads(token)
+        if principal is not None and _is_current(principal, user_id, session):
+            return principal
+
+    # Fall back to the full user load, which also verifies the session auth hash
+    user = request.user
+    if not user.is_authenticated:
+        return AnonymousPrincipal()
+    principal = Principal.from_user(user)
+    session[PRINCIPAL_SESSION_KEY] = principal.dumps()
+    return principal
+
+
+def get_principal(request):
+    """Return the request's principal, resolving it at most once per request"""
+    if not hasattr(request, '_cached_principal'):
+        request._cached_principal = _load_principal(request)
+    return request._cached_principal
@@ -0,0 +1,40 @@
+"""
+Signal handlers keeping session principals in step with the user
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.images import queue_variants
+from .models import StaffProfile, User
+from .principal import invalidate_principal
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    """Role, name, password or activation changes make the principal stale"""
+    if created:
+        return
+    # Logging in only touches last_login
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_principal(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def profile_picture_saved(sender, instance, update_fields=None, **kwargs):
+    """Resize a new profile picture in the background, so the upload returns at once"""
+    # Logins and other partial saves cannot change the picture
+    if update_fields is not None and 'profile_picture' not in update_fields:
+        return
+    queue_variants(instance, 'profile_picture', User.PROFILE_PICTURE_WIDTHS)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_principal(instance.pk)
+
+
+@receiver(post_save, sender=StaffProfile)
+@receiver(post_delete, sender=StaffProfile)
+def staff_profile_changed(sender, instance, **kwargs):
+    invalidate_principal(instance.user_id)
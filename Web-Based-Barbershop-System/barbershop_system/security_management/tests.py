@@ -1,3 +1,233 @@
-from django.test import TestCase
+from django.contrib.auth import HASH_SESSION_KEY
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core import signing
+from django.core.exceptions import PermissionDenied
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .decorators import role_required
+from .models import LoginAttempt, LoginAttemptRollup, StaffProfile, User
+from .principal import (
+    PRINCIPAL_SALT, PRINCIPAL_SESSION_KEY, Principal, current_stamp, get_principal,
+)
+from .throttling import LoginAttemptRecorder, LoginThrottle
+
+
+class PrincipalTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'carl', password='old-password', first_name='Carl', last_name='Cutter', role='barber'
+        )
+        self.client.force_login(self.user)
+
+    def _prime(self):
+        """Make one request so the principal is written to the session"""
+        self.client.get(reverse('booking:home'))
+        return Principal.loads(self.client.session[PRINCIPAL_SESSION_KEY])
+
+    def test_principal_is_stored_in_session(self):
+        principal = self._prime()
+        self.assertEqual(principal.user_id, self.user.pk)
+        self.assertEqual(principal.role, 'barber')
+        self.assertEqual(principal.display_name, 'Carl Cutter')
+        self.assertIsNone(principal.staff_profile_id)
+
+    def test_page_view_skips_user_query(self):
+        self._prime()
+        with self.assertNumQueries(1):  # session read only
+            response = self.client.get(reverse('booking:home'))
+        self.assertContains(response, 'carl')
+
+    def test_role_change_invalidates_principal(self):
+        self._prime()
+        self.user.role = 'staff'
+        self.user.save()
+        self.assertEqual(self._prime().role, 'staff')
+
+    def test_staff_profile_change_invalidates_principal(self):
+        self._prime()
+        profile = StaffProfile.objects.create(user=self.user)
+        self.assertEqual(self._prime().staff_profile_id, profile.pk)
+
+    def test_password_change_logs_other_sessions_out(self):
+        self._prime()
+        self.user.set_password('new-password')
+        self.user.save()
+        self.client.get(reverse('booking:home'))
+        self.assertNotIn(PRINCIPAL_SESSION_KEY, self.client.session)
+
+    def test_lost_stamp_rebuilds_principal(self):
+        self._prime()
+        cache.delete(f'security:principal-stamp:{self.user.pk}')
+        User.objects.filter(pk=self.user.pk).update(role='customer')
+        self.assertEqual(self._prime().role, 'customer')
+
+    def test_principal_from_another_auth_hash_is_rebuilt(self):
+        self._prime()
+        User.objects.filter(pk=self.user.pk).update(role='customer')
+        session = self.client.session
+        session[HASH_SESSION_KEY] = self.user.get_session_auth_hash()[::-1]
+        session.save()
+        # The session no longer matches the user either, so it is logged out
+        self.client.get(reverse('booking:home'))
+        self.assertNotIn(PRINCIPAL_SESSION_KEY, self.client.session)
+
+    def test_login_does_not_invalidate_principal(self):
+        stamp = current_stamp(self.user.pk)
+        self.client.login(username='carl', password='old-password')
+        self.assertEqual(current_stamp(self.user.pk), stamp)
+
+    def test_tampered_or_outdated_tokens_are_rejected(self):
+        token = self._prime().dumps()
+        self.assertIsNone(Principal.loads(token[:-2] + 'xx'))
+        outdated = signing.dumps({'v': 0, 'uid': self.user.pk}, salt=PRINCIPAL_SALT)
+        self.assertIsNone(Principal.loads(outdated))
+
+    @override_settings(PRINCIPAL_MAX_AGE=-1)
+    def test_expired_principal_is_rebuilt(self):
+        token = Principal.from_user(self.user).dumps()
+        self.assertIsNone(Principal.loads(token))
+
+    def test_role_required_uses_principal(self):
+        view = role_required('admin')(lambda request: 'ok')
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request._messages = CookieStorage(request)
+        with self.assertRaises(PermissionDenied):
+            view(request)
+        admin = User.objects.create_user('root', password='pw', role='admin')
+        request = RequestFactory().get('/')
+        request.user = admin
+        self.assertEqual(view(request), 'ok')
+
+    def test_anonymous_visitor(self):
+        self.client.logout()
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        self.assertFalse(get_principal(request).is_authenticated)
+
+
+class LoginThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.throttle = LoginThrottle(window=60, ip_limit=3, username_limit=2)
+
+    def test_username_limit(self):
+        now = 6000.0
+        self.throttle.register_failure('10.0.0.1', 'dana', now)
+        self.assertFalse(self.throttle.is_blocked('10.0.0.2', 'Dana', now))
+        self.throttle.register_failure('10.0.0.2', 'DANA ', now)
+        self.assertTrue(self.throttle.is_blocked('10.0.0.3', 'dana', now))
+        self.assertFalse(self.throttle.is_blocked('10.0.0.3', 'erin', now))
+
+    def test_ip_limit_spans_usernames(self):
+        now = 6000.0
+        for username in ('a', 'b', 'c'):
+            self.throttle.register_failure('10.0.0.9', username, now)
+        self.assertTrue(self.throttle.is_blocked('10.0.0.9', 'someone-else', now))
+
+    def test_window_slides(self):
+        self.throttle.register_failure('10.0.0.1', 'dana', 6000.0)
+        self.throttle.register_failure('10.0.0.1', 'dana', 6001.0)
+        # Half way through the next window the old failures weigh half
+        self.assertFalse(self.throttle.is_blocked('10.0.0.1', 'dana', 6090.0))
+        self.assertTrue(self.throttle.is_blocked('10.0.0.1', 'dana', 6060.0))
+
+
+class LoginAttemptRecorderTests(TestCase):
+
+    def test_attempts_are_written_in_batches(self):
+        recorder = LoginAttemptRecorder(batch_size=3, flush_interval=0)
+        recorder.record('dana', '10.0.0.1', False)
+        recorder.record('dana', '10.0.0.1', False)
+        self.assertEqual(LoginAttempt.objects.count(), 0)
+        with self.assertNumQueries(1):
+            recorder.record('dana', '10.0.0.1', True)
+        self.assertEqual(LoginAttempt.objects.count(), 3)
+        self.assertEqual(recorder.flush(), 0)
+
+
+class ThrottledLoginViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('frank', password='right-password')
+        self.recorder = LoginAttemptRecorder(batch_size=100, flush_interval=0)
+        patches = [
+            mock.patch('security_management.views.recorder', self.recorder),
+            mock.patch('security_management.views.throttle', LoginThrottle(window=60, ip_limit=10, username_limit=2)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _login(self, password):
+        return self.client.post(reverse('security:login'), {'username': 'frank', 'password': password})
+
+    def test_blocked_attempts_skip_password_hashing(self):
+        self._login('wrong')
+        self._login('wrong')
+        with mock.patch('django.contrib.auth.forms.authenticate') as authenticate:
+            response = self._login('right-password')
+        authenticate.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+
+    def test_attempts_are_recorded(self):
+        self._login('wrong')
+        response = self._login('right-password')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.recorder.flush(), 2)
+        self.assertEqual(
+            list(LoginAttempt.objects.order_by('timestamp').values_list('success', flat=True)),
+            [False, True]
+        )
+
+
+class LoginAttemptMaintenanceTests(TestCase):
+
+    def _attempt(self, username, ip_address, success, age):
+        attempt = LoginAttempt.objects.create(username=username, ip_address=ip_address, success=success)
+        LoginAttempt.objects.filter(pk=attempt.pk).update(timestamp=timezone.now() - age)
+
+    def test_recent_failures_for_ip(self):
+        self._attempt('gail', '10.0.0.1', False, timedelta(minutes=10))
+        self._attempt('gail', '10.0.0.1', False, timedelta(hours=3))
+        self._attempt('gail', '10.0.0.1', True, timedelta(minutes=5))
+        since = timezone.now() - timedelta(hours=1)
+        self.assertEqual(LoginAttempt.objects.for_ip('10.0.0.1').failures().since(since).count(), 1)
+
+    def test_rollup_is_idempotent(self):
+        self._attempt('gail', '10.0.0.1', False, timedelta(hours=2))
+        self._attempt('gail', '10.0.0.2', True, timedelta(hours=2))
+        self._attempt('hank', '10.0.0.1', False, timedelta(hours=2))
+        for _ in range(2):
+            call_command('rollup_login_attempts', hours=5, stdout=StringIO())
+
+        self.assertEqual(LoginAttemptRollup.objects.count(), 4)
+        by_ip = LoginAttemptRollup.objects.get(dimension='ip', key='10.0.0.1')
+        self.assertEqual((by_ip.attempts, by_ip.failures), (2, 2))
+        by_user = LoginAttemptRollup.objects.get(dimension='username', key='gail')
+        self.assertEqual((by_user.attempts, by_user.failures), (2, 1))
+
+    def test_rollup_skips_the_current_hour(self):
+        LoginAttempt.objects.create(username='gail', ip_address='10.0.0.1')
+        call_command('rollup_login_attempts', stdout=StringIO())
+        self.assertFalse(LoginAttemptRollup.objects.exists())
+
+    def test_prune_deletes_in_batches(self):
+        for _ in range(5):
+            self._attempt('gail', '10.0.0.1', False, timedelta(days=100))
+        self._attempt('gail', '10.0.0.1', False, timedelta(days=1))
+        out = StringIO()
+        call_command('prune_login_attempts', days=90, batch_size=2, stdout=out)
+        self.assertIn('Deleted 5 login attempts', out.getvalue())
+        self.assertEqual(LoginAttempt.objects.count(), 1)
@@ -0,0 +1,164 @@
+"""
+Login throttling and buffered login-attempt logging
+
+Failed logins are counted per IP address and per username in sliding
+windows held in the shared cache, so over-limit attempts are rejected
+before any password hashing happens. LoginAttempt rows are buffered in
+memory and written with bulk_create off the request path.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .models import LoginAttempt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOGIN_THROTTLE = {
+    'WINDOW': 300,          # seconds
+    'IP_LIMIT': 20,         # failed attempts per IP per window
+    'USERNAME_LIMIT': 5,    # failed attempts per username per window
+}
+
+
+def get_client_ip(request):
+    return request.META.get('REMOTE_ADDR') or '0.0.0.0'
+
+
+class LoginThrottle:
+    """
+    Sliding-window failure counters for login attempts.
+
+    Uses the sliding-window-counter approximation: the previous fixed
+    window's count is weighted by how much of it still overlaps the
+    sliding window, so each check costs two cache reads per key.
+    """
+
+    KEY_PREFIX = 'security:login-throttle'
+
+    def __init__(self, window=None, ip_limit=None, username_limit=None):
+        config = {**DEFAULT_LOGIN_THROTTLE, **getattr(settings, 'LOGIN_THROTTLE', {})}
+        self.window = window or config['WINDOW']
+        self.ip_limit = ip_limit or config['IP_LIMIT']
+        self.username_limit = username_limit or config['USERNAME_LIMIT']
+
+    def _keys(self, ip_address, username):
+        yield f'{self.KEY_PREFIX}:ip:{ip_address}', self.ip_limit
+        if username:
+            yield f'{self.KEY_PREFIX}:user:{username.strip().lower()}', self.username_limit
+
+    def _count(self, key, now):
+        bucket, offset = divmod(now, self.window)
+        counts = cache.get_many([f'{key}:{int(bucket)}', f'{key}:{int(bucket) - 1}'])
+        current = counts.get(f'{key}:{int(bucket)}', 0)
+        previous = counts.get(f'{key}:{int(bucket) - 1}', 0)
+        return current + previous * (1 - offset / self.window)
+
+    def is_blocked(self, ip_address, username, now=None):
+        """True if either the IP or the username is over its failure limit"""
+        now = time.time() if now is None else now
+        return any(self._count(key, now) >= limit for key, limit in self._keys(ip_address, username))
+
+    def register_failure(self, ip_address, username, now=None):
+        now = time.time() if now is None else now
+        bucket = int(now // self.window)
+        for key, _ in self._keys(ip_address, username):
+            bucket_key = f'{key}:{bucket}'
+            # Two windows of history are needed for the weighted count
+            if not cache.add(bucket_key, 1, timeout=self.window * 2):
+                try:
+                    cache.incr(bucket_key)
+                except ValueError:
+                    cache.set(bucket_key, 1, timeout=self.window * 2)
+
+    def reset(self, username):
+        """Clear a username's failures after a successful login"""
+        if not username:
+            return
+        key = f'{self.KEY_PREFIX}:user:{username.strip().lower()}'
+        bucket = int(time.time() // self.window)
+        cache.delete_many([f'{key}:{bucket}', f'{key}:{bucket - 1}'])
+
+
+class LoginAttemptRecorder:
+    """
+    In-memory buffer of login attempts flushed to the database in batches.
+
+    With a positive flush interval a daemon thread writes the buffer
+    periodically; a full batch is flushed straight away. With an interval
+    of 0 no thread is started and rows are written when the batch fills or
+    ``flush()`` is called.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None):
+        self.batch_size = batch_size or getattr(settings, 'LOGIN_ATTEMPT_BATCH_SIZE', 100)
+        self.flush_interval = (
+            getattr(settings, 'LOGIN_ATTEMPT_FLUSH_INTERVAL', 2.0)
+            if flush_interval is None else flush_interval
+        )
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wakeup = threading.Event()
+
+    def record(self, username, ip_address, success, user_agent=''):
+        attempt = LoginAttempt(
+            username=username[:150],
+            ip_address=ip_address,
+            success=success,
+            user_agent=user_agent,
+            timestamp=timezone.now(),
+        )
+        with self._lock:
+            self._buffer.append(attempt)
+            full = len(self._buffer) >= self.batch_size
+
+        if self.flush_interval:
+            self._ensure_worker()
+            if full:
+                self._wakeup.set()
+        elif full:
+            self.flush()
+
+    def flush(self):
+        """Write buffered attempts; returns how many rows were written"""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        try:
+            LoginAttempt.objects.bulk_create(batch, batch_size=self.batch_size)
+        except Exception:
+            logger.exception('Could not write %d login attempts', len(batch))
+            return 0
+        return len(batch)
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='login-attempt-recorder', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            # The worker owns its own connection; don't leave it open between flushes
+            connection.close()
+
+
+throttle = LoginThrottle()
+recorder = LoginAttemptRecorder()
+atexit.register(recorder.flush)
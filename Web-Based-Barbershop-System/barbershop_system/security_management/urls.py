@@ -8,7 +8,7 @@ from . import views
 app_name = 'security'
 
 urlpatterns = [
-    path('login/', auth_views.LoginView.as_view(template_name='security/login.html'), name='login'),
+    path('login/', views.LoginView.as_view(), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('register/', views.register, name='register'),
     path('profile/', views.profile, name='profile'),
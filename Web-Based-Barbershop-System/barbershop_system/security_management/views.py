@@ -1,8 +1,10 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth import views as auth_views
+from .decorators import login_required
 from .models import User
+from .throttling import get_client_ip, recorder, throttle
 
 
 def register(request):
@@ -81,3 +83,37 @@ def profile(request):
             messages.error(request, f'Error updating profile: {str(e)}')
 
     return render(request, 'security/profile.html', {'user': request.user})
+
+
+class LoginView(auth_views.LoginView):
+    """Login view that throttles failed attempts before checking passwords"""
+
+    template_name = 'security/login.html'
+
+    def post(self, request, *args, **kwargs):
+        username = request.POST.get('username', '')
+        if throttle.is_blocked(get_client_ip(request), username):
+            self._record(username, success=False)
+            messages.error(request, 'Too many failed login attempts. Please try again later.')
+            return self.render_to_response(self.get_context_data(), status=429)
+        return super().post(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        username = form.get_user().get_username()
+        throttle.reset(username)
+        self._record(username, success=True)
+        return super().form_valid(form)
+
+    def form_invalid(self, form):
+        username = self.request.POST.get('username', '')
+        throttle.register_failure(get_client_ip(self.request), username)
+        self._record(username, success=False)
+        return super().form_invalid(form)
+
+    def _record(self, username, success):
+        recorder.record(
+            username=username,
+            ip_address=get_client_ip(self.request),
+            success=success,
+            user_agent=self.request.META.get('HTTP_USER_AGENT', ''),
+        )
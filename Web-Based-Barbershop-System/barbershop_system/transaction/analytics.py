@@ -0,0 +1,158 @@
+"""
+Revenue analytics
+
+Net revenue (payments less refunds, from the transaction log) is grouped
+into day, week or month buckets in the database, optionally split by
+barber or service. The log is append-only - a refund is a new row dated
+when it happens - so a closed bucket only changes when old log rows are
+edited, deleted or backfilled. Closed buckets are cached for a day under
+the 'revenue' cache namespace, which those changes invalidate; only the
+open bucket and buckets not yet cached are computed, in one grouped query.
+Buckets about to be cached are read from the primary, so a lagging
+replica cannot leave a wrong total in the cache.
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import DateField, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from barbershop_system.caching import tiered_cache
+from barbershop_system.routers import reads_from_replica
+from booking_management.models import Service
+from .models import CENT, Transaction
+
+GRANULARITIES = ('day', 'week', 'month')
+DIMENSIONS = {
+    None: None,
+    'barber': 'payment__booking__barber_id',
+    'service': 'payment__booking__service_id',
+}
+CACHE_NAMESPACE = 'revenue'
+CACHE_KEY = 'analytics:revenue:v1:{version}:{granularity}:{dimension}:{bucket}'
+# A safety net; edits to closed buckets invalidate CACHE_NAMESPACE
+CLOSED_BUCKET_TIMEOUT = 24 * 60 * 60
+TOTAL = 'total'
+
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, granularity):
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+def buckets_between(start_date, end_date, granularity):
+    """Every bucket start from the one containing ``start_date`` to the one containing ``end_date``"""
+    bucket, last = bucket_start(start_date, granularity), bucket_start(end_date, granularity)
+    buckets = []
+    while bucket <= last:
+        buckets.append(bucket)
+        bucket = next_bucket(bucket, granularity)
+    return buckets
+
+
+def _query_buckets(granularity, dimension, first, last, using=None):
+    """Net revenue per (bucket, dimension key) for buckets ``first``..``last``, in one query"""
+    field = DIMENSIONS[dimension]
+    start = timezone.make_aware(datetime.combine(first, time.min))
+    end = timezone.make_aware(datetime.combine(next_bucket(last, granularity), time.min))
+    rows = Transaction.objects.db_manager(using).filter(
+        created_at__gte=start, created_at__lt=end,
+        transaction_type__in=['payment', 'refund'],
+    ).annotate(
+        bucket=Trunc('created_at', granularity, output_field=DateField())
+    )
+    group_by = ['bucket', field] if field else ['bucket']
+    results = {}
+    for row in rows.values(*group_by).annotate(revenue=Sum('amount')).order_by():
+        key = row[field] if field else TOTAL
+        results.setdefault(row['bucket'], {})[key] = row['revenue'].quantize(CENT)
+    return results
+
+
+@reads_from_replica
+def revenue_by_bucket(granularity, start_date, end_date, dimension=None):
+    """
+    Return ``{bucket_start: {key: revenue}}`` for every bucket in the range.
+
+    Empty buckets map to an empty dict. ``key`` is a barber or service id,
+    or 'total' without a dimension.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    if dimension not in DIMENSIONS:
+        raise ValueError(f'Unknown dimension: {dimension}')
+
+    buckets = buckets_between(start_date, end_date, granularity)
+    current = bucket_start(timezone.localdate(), granularity)
+    version = tiered_cache.namespace_version(CACHE_NAMESPACE)
+    keys = {
+        bucket: CACHE_KEY.format(
+            version=version, granularity=granularity, dimension=dimension, bucket=bucket.isoformat()
+        )
+        for bucket in buckets if bucket < current
+    }
+    cached = cache.get_many(keys.values())
+    results = {bucket: cached[key] for bucket, key in keys.items() if key in cached}
+
+    missing = [bucket for bucket in buckets if bucket not in results]
+    if missing:
+        # Only the open bucket, which is never cached, may come from the replica
+        using = DEFAULT_DB_ALIAS if missing[0] in keys else None
+        computed = _query_buckets(granularity, dimension, missing[0], missing[-1], using=using)
+        for bucket in missing:
+            results[bucket] = computed.get(bucket, {})
+        cache.set_many(
+            {keys[bucket]: results[bucket] for bucket in missing if bucket in keys},
+            timeout=CLOSED_BUCKET_TIMEOUT,
+        )
+    return {bucket: results[bucket] for bucket in buckets}
+
+
+def _labels(dimension, keys):
+    if dimension == 'barber':
+        return {
+            user.pk: user.get_full_name() or user.username
+            for user in get_user_model().objects.filter(pk__in=keys).only('username', 'first_name', 'last_name')
+        }
+    if dimension == 'service':
+        return dict(Service.objects.filter(pk__in=keys).values_list('pk', 'name'))
+    return {TOTAL: 'Revenue'}
+
+
+@reads_from_replica
+def revenue_chart_data(granularity, start_date, end_date, dimension=None):
+    """Chart-ready series: one label per bucket and one dataset per dimension key"""
+    by_bucket = revenue_by_bucket(granularity, start_date, end_date, dimension)
+    if dimension is None:
+        keys = [TOTAL]
+    else:
+        keys = sorted({key for values in by_bucket.values() for key in values}, key=str)
+    labels = _labels(dimension, [key for key in keys if key is not None])
+    return {
+        'granularity': granularity,
+        'dimension': dimension,
+        'labels': [bucket.isoformat() for bucket in by_bucket],
+        'datasets': [
+            {
+                'key': key,
+                'label': labels.get(key, 'Unassigned'),
+                'data': [str(values.get(key, Decimal('0.00'))) for values in by_bucket.values()],
+            }
+            for key in keys
+        ],
+    }
@@ -0,0 +1,97 @@
+"""
+Payment gateway interface
+
+Charges run in ``payment.process`` jobs on the worker's thread pool, so
+the task's concurrency limit is how many wait on the provider at once.
+``get_gateway()`` returns one shared instance per process; a provider
+client must therefore be thread-safe, and keeps its HTTP connection pool
+between payments.
+"""
+import threading
+import time
+import uuid
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_PAYMENT_GATEWAY = {
+    'BACKEND': 'transaction.gateways.FakeGateway',
+    'OPTIONS': {},
+    'TIMEOUT': 10,  # seconds
+}
+
+GatewayResult = namedtuple('GatewayResult', ['success', 'transaction_id', 'message'])
+
+
+class GatewayError(Exception):
+    """The gateway could not be reached or gave no usable answer; safe to retry"""
+
+
+class PaymentGateway:
+    """
+    Base class for payment providers.
+
+    ``idempotency_key`` must be passed through to the provider so that
+    retrying a charge after a timeout never charges twice. ``timeout`` is
+    in seconds; a call with no answer by then raises GatewayError.
+    """
+
+    def charge(self, amount, method, idempotency_key, timeout):
+        raise NotImplementedError
+
+    def refund(self, transaction_id, amount, idempotency_key, timeout):
+        raise NotImplementedError
+
+
+class FakeGateway(PaymentGateway):
+    """
+    In-process stand-in for a card processor, for development and tests.
+
+    ``latency`` simulates a slow provider; payment methods listed in
+    ``decline_methods`` are declined.
+    """
+
+    def __init__(self, latency=0, decline_methods=()):
+        self.latency = latency
+        self.decline_methods = set(decline_methods)
+        self.charges = {}
+        self.refunds = {}
+        self._lock = threading.Lock()
+
+    def _wait(self, timeout):
+        if self.latency > timeout:
+            time.sleep(timeout)
+            raise GatewayError(f'No answer within {timeout}s')
+        if self.latency:
+            time.sleep(self.latency)
+
+    def charge(self, amount, method, idempotency_key, timeout):
+        self._wait(timeout)
+        with self._lock:
+            if idempotency_key in self.charges:
+                return self.charges[idempotency_key]
+            if method in self.decline_methods:
+                result = GatewayResult(False, None, 'Card declined')
+            else:
+                result = GatewayResult(True, f'fake_{uuid.uuid4().hex}', 'Approved')
+            self.charges[idempotency_key] = result
+            return result
+
+    def refund(self, transaction_id, amount, idempotency_key, timeout):
+        self._wait(timeout)
+        with self._lock:
+            return self.refunds.setdefault(
+                idempotency_key, GatewayResult(True, f'fake_refund_{uuid.uuid4().hex}', 'Refunded')
+            )
+
+
+def gateway_settings():
+    return {**DEFAULT_PAYMENT_GATEWAY, **getattr(settings, 'PAYMENT_GATEWAY', {})}
+
+
+@lru_cache(maxsize=None)
+def get_gateway():
+    config = gateway_settings()
+    return import_string(config['BACKEND'])(**config['OPTIONS'])
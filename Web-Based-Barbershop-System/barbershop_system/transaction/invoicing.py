@@ -0,0 +1,112 @@
+"""
+Batch invoice generation
+
+Invoices are created for completed, uninvoiced bookings in chunks. Each
+chunk takes a block of invoice numbers from InvoiceSequence inside its own
+transaction, so a failed chunk rolls its numbers back with it and the
+sequence stays gap-free.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from booking_management.models import Booking
+from .models import Invoice, InvoiceSequence
+
+INVOICE_SEQUENCE = 'invoice'
+
+
+def allocate_numbers(count, name=INVOICE_SEQUENCE):
+    """
+    Reserve ``count`` consecutive invoice numbers.
+
+    Must run inside the transaction that uses them: the sequence row stays
+    locked until it commits, and a rollback releases the numbers.
+    """
+    InvoiceSequence.objects.get_or_create(name=name)
+    sequence = InvoiceSequence.objects.select_for_update().get(name=name)
+    first = sequence.next_value
+    sequence.next_value = first + count
+    sequence.save(update_fields=['next_value'])
+    return [sequence.format(value) for value in range(first, first + count)]
+
+
+def uninvoiced_bookings(start_date, end_date):
+    return Booking.objects.filter(
+        status='completed', invoice__isnull=True
+    ).between(start_date, end_date)
+
+
+def generate_invoices(start_date, end_date, tax_rate=None, due_days=None, chunk_size=500):
+    """
+    Invoice every completed booking in the range that has no invoice yet.
+
+    Returns the number of invoices created.
+    """
+    tax_rate = Decimal(settings.INVOICE_TAX_RATE if tax_rate is None else tax_rate)
+    due_days = settings.INVOICE_DUE_DAYS if due_days is None else due_days
+    bookings = uninvoiced_bookings(start_date, end_date).order_by('id')
+    created = 0
+    last_id = 0
+
+    while True:
+        with transaction.atomic():
+            # Locking the chunk keeps a concurrent run from invoicing the same bookings
+            chunk = list(
+                bookings.filter(id__gt=last_id)
+                .select_for_update(of=('self',))
+                .values_list('id', 'booking_date', 'service__price')[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+
+            numbers = allocate_numbers(len(chunk))
+            invoices = []
+            for number, (booking_id, booking_date, price) in zip(numbers, chunk):
+                tax_amount, total = Invoice.compute_totals(price, tax_rate)
+                invoices.append(Invoice(
+                    booking_id=booking_id,
+                    invoice_number=number,
+                    due_date=booking_date + timedelta(days=due_days),
+                    subtotal=price,
+                    tax_rate=tax_rate,
+                    tax_amount=tax_amount,
+                    total=total,
+                ))
+            Invoice.objects.bulk_create(invoices, batch_size=chunk_size)
+            created += len(invoices)
+    return created
+
+
+def issue_invoice(booking, tax_rate=None, due_days=None):
+    """
+    Return the booking's invoice, issuing it now if it has none.
+
+    Checkout charges the invoice total, so a booking paid before the
+    batch run gets its invoice here; the batch then skips it.
+    """
+    invoice = Invoice.objects.filter(booking=booking).first()
+    if invoice is not None:
+        return invoice
+    tax_rate = Decimal(settings.INVOICE_TAX_RATE if tax_rate is None else tax_rate)
+    due_days = settings.INVOICE_DUE_DAYS if due_days is None else due_days
+    price = booking.service.price
+    tax_amount, total = Invoice.compute_totals(price, tax_rate)
+    try:
+        with transaction.atomic():
+            return Invoice.objects.create(
+                booking=booking,
+                invoice_number=allocate_numbers(1)[0],
+                due_date=booking.booking_date + timedelta(days=due_days),
+                subtotal=price,
+                tax_rate=tax_rate,
+                tax_amount=tax_amount,
+                discount=Decimal('0.00'),
+                total=total,
+            )
+    except IntegrityError:
+        # A concurrent checkout or batch run issued it first; its number is rolled back with us
+        return Invoice.objects.get(booking=booking)
@@ -0,0 +1,25 @@
+"""
+Background tasks for payments
+"""
+from background.jobs import enqueue_many, task
+from background.models import Job
+from .payments import process_payment, stalled_payments
+
+
+@task('payment.process', concurrency=20)
+def process(payment_id):
+    process_payment(payment_id)
+
+
+def enqueue_stalled_payments(now=None):
+    """
+    Queue another charge for payments whose worker died mid-charge.
+
+    The job queue retries a dead worker's job by itself; this also covers
+    jobs that were lost or gave up. Returns the number of jobs queued.
+    """
+    jobs = [
+        Job(task='payment.process', args=[pk], dedupe_key=f'payment-process:{pk}:{version}')
+        for pk, version in stalled_payments(now).values_list('pk', 'version')
+    ]
+    return len(enqueue_many(jobs))
@@ -0,0 +1,182 @@
+"""
+Double-entry ledger
+
+Every posting is a balanced JournalEntry. Posting also bumps each
+account's running balance and its per-day totals in the same transaction,
+so balances and revenue for a period are read from a handful of rows
+instead of summing ledger lines.
+"""
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import AccountDailyBalance, JournalEntry, LedgerAccount, LedgerLine
+
+CASH = 'cash'
+RECEIVABLE = 'receivable'
+REVENUE = 'revenue'
+DISCOUNTS = 'discounts'
+TAX_PAYABLE = 'tax_payable'
+WRITE_OFFS = 'write_offs'
+
+DEFAULT_ACCOUNTS = [
+    (CASH, 'Cash and bank', 'asset'),
+    (RECEIVABLE, 'Accounts receivable', 'asset'),
+    (REVENUE, 'Service revenue', 'revenue'),
+    (DISCOUNTS, 'Discounts given', 'expense'),
+    (TAX_PAYABLE, 'Sales tax payable', 'liability'),
+    (WRITE_OFFS, 'Write-offs', 'expense'),
+]
+
+ZERO = Value(Decimal(0), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+Line = namedtuple('Line', ['account', 'debit', 'credit'])
+
+
+class UnbalancedEntry(ValueError):
+    pass
+
+
+def debit(account, amount):
+    return Line(account, Decimal(amount), Decimal(0))
+
+
+def credit(account, amount):
+    return Line(account, Decimal(0), Decimal(amount))
+
+
+def post(entry_type, lines, description='', payment=None, idempotency_key=None,
+         entry_date=None, posted_by=None):
+    """
+    Post a balanced journal entry and update the affected balances.
+
+    ``lines`` are Line tuples naming accounts by code. Posting again with
+    the same ``idempotency_key`` returns the existing entry unchanged.
+    """
+    lines = [line for line in lines if line.debit or line.credit]
+    total_debit = sum(line.debit for line in lines)
+    if not lines or total_debit != sum(line.credit for line in lines):
+        raise UnbalancedEntry(f'Debits and credits differ: {lines!r}')
+
+    entry = JournalEntry(
+        entry_type=entry_type,
+        entry_date=entry_date or timezone.localdate(),
+        description=description,
+        payment=payment,
+        idempotency_key=idempotency_key,
+        posted_by=posted_by,
+    )
+    with transaction.atomic():
+        if idempotency_key:
+            try:
+                with transaction.atomic():
+                    entry.save()
+            except IntegrityError:
+                return JournalEntry.objects.get(idempotency_key=idempotency_key)
+        else:
+            entry.save()
+
+        accounts = LedgerAccount.objects.in_bulk([line.account for line in lines], field_name='code')
+        missing = {line.account for line in lines} - set(accounts)
+        if missing:
+            raise LedgerAccount.DoesNotExist(f'Unknown ledger accounts: {sorted(missing)}')
+
+        LedgerLine.objects.bulk_create([
+            LedgerLine(entry=entry, account=accounts[line.account], debit=line.debit, credit=line.credit)
+            for line in lines
+        ])
+
+        totals = defaultdict(lambda: [Decimal(0), Decimal(0)])
+        for line in lines:
+            totals[line.account][0] += line.debit
+            totals[line.account][1] += line.credit
+        for code, (debits, credits) in totals.items():
+            account = accounts[code]
+            LedgerAccount.objects.filter(pk=account.pk).update(
+                balance=F('balance') + account.signed(debits, credits)
+            )
+            _add_to_day(account, entry.entry_date, debits, credits)
+    return entry
+
+
+def _add_to_day(account, date, debits, credits):
+    days = AccountDailyBalance.objects.filter(account=account, date=date)
+    if days.update(debit=F('debit') + debits, credit=F('credit') + credits):
+        return
+    try:
+        with transaction.atomic():
+            AccountDailyBalance.objects.create(account=account, date=date, debit=debits, credit=credits)
+    except IntegrityError:
+        # Another posting created the row first
+        days.update(debit=F('debit') + debits, credit=F('credit') + credits)
+
+
+def record_payment(payment):
+    """
+    Post a completed payment: cash in, revenue and tax out.
+
+    When the booking has an invoice its discount and tax are split out.
+    """
+    invoice = getattr(payment.booking, 'invoice', None)
+    tax = invoice.tax_amount if invoice else Decimal(0)
+    discount = invoice.discount if invoice else Decimal(0)
+    return post('payment', [
+        debit(CASH, payment.amount),
+        debit(DISCOUNTS, discount),
+        credit(REVENUE, payment.amount - tax + discount),
+        credit(TAX_PAYABLE, tax),
+    ], description=f'Payment #{payment.pk}', payment=payment,
+        idempotency_key=f'payment:{payment.pk}:completed')
+
+
+def record_refund(payment, reason=''):
+    """Reverse a payment's posting; payments never posted have nothing to reverse"""
+    original = JournalEntry.objects.filter(idempotency_key=f'payment:{payment.pk}:completed').first()
+    if original is None:
+        return None
+    return post('refund', [
+        Line(line.account.code, line.credit, line.debit)
+        for line in original.lines.select_related('account')
+    ], description=f'Refund of payment #{payment.pk}: {reason}'.rstrip(': '), payment=payment,
+        idempotency_key=f'payment:{payment.pk}:refunded')
+
+
+def post_adjustment(debit_account, credit_account, amount, description, posted_by=None):
+    return post('adjustment', [
+        debit(debit_account, amount),
+        credit(credit_account, amount),
+    ], description=description, posted_by=posted_by)
+
+
+def balance(code):
+    """Current balance of one account (a single-row read)"""
+    return LedgerAccount.objects.values_list('balance', flat=True).get(code=code)
+
+
+def net_revenue(start_date=None, end_date=None):
+    """
+    Revenue less discounts, after refunds.
+
+    Without a date range this reads the running balances; with one it sums
+    the per-day totals, one row per account per day.
+    """
+    if start_date is None and end_date is None:
+        balances = dict(
+            LedgerAccount.objects.filter(code__in=[REVENUE, DISCOUNTS]).values_list('code', 'balance')
+        )
+        return balances.get(REVENUE, Decimal(0)) - balances.get(DISCOUNTS, Decimal(0))
+
+    days = AccountDailyBalance.objects.filter(account__code__in=[REVENUE, DISCOUNTS])
+    if start_date:
+        days = days.filter(date__gte=start_date)
+    if end_date:
+        days = days.filter(date__lte=end_date)
+    totals = days.aggregate(
+        revenue=Coalesce(Sum(F('credit') - F('debit'), filter=Q(account__code=REVENUE)), ZERO),
+        discounts=Coalesce(Sum(F('debit') - F('credit'), filter=Q(account__code=DISCOUNTS)), ZERO),
+    )
+    return totals['revenue'] - totals['discounts']
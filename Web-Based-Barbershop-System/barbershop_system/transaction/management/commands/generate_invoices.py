@@ -0,0 +1,32 @@
+"""
+Create invoices for completed bookings that have none
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from transaction.invoicing import generate_invoices
+
+
+class Command(BaseCommand):
+    help = 'Invoice completed, uninvoiced bookings in a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First booking date (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last booking date (YYYY-MM-DD)')
+        parser.add_argument('--tax-rate', help='Tax rate in percent; defaults to INVOICE_TAX_RATE')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of invoices created per transaction'
+        )
+
+    def handle(self, *args, **options):
+        created = generate_invoices(
+            options['start'],
+            options['end'] or date.today(),
+            tax_rate=options['tax_rate'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Created {created} invoices.'))
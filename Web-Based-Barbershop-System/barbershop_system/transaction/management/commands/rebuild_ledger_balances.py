@@ -0,0 +1,64 @@
+"""
+Recompute running ledger balances from the posted lines
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from transaction.models import AccountDailyBalance, LedgerAccount, LedgerLine
+
+
+class Command(BaseCommand):
+    help = 'Recompute account balances and daily totals from ledger lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted accounts without writing'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        with transaction.atomic():
+            accounts = LedgerAccount.objects.order_by('pk')
+            if not dry_run:
+                # ledger.post() updates the balance after inserting its lines, so a
+                # posting still open waits here and then adds to the rebuilt totals;
+                # one that committed first is already in the sums below
+                accounts = accounts.select_for_update()
+            accounts = list(accounts)
+
+            daily = {}
+            totals = defaultdict(lambda: [Decimal(0), Decimal(0)])
+            for account_id, date, debits, credits in (
+                LedgerLine.objects.order_by()
+                .values_list('account_id', 'entry__entry_date')
+                .annotate(Sum('debit'), Sum('credit'))
+            ):
+                daily[account_id, date] = (debits, credits)
+                totals[account_id][0] += debits
+                totals[account_id][1] += credits
+
+            drifted = []
+            for account in accounts:
+                expected = account.signed(*totals[account.pk])
+                if account.balance != expected:
+                    account.balance = expected
+                    drifted.append(account)
+
+            if not dry_run:
+                LedgerAccount.objects.bulk_update(drifted, ['balance'])
+                AccountDailyBalance.objects.all().delete()
+                AccountDailyBalance.objects.bulk_create([
+                    AccountDailyBalance(account_id=account_id, date=date, debit=debits, credit=credits)
+                    for (account_id, date), (debits, credits) in daily.items()
+                ])
+
+        verb = 'would be corrected' if dry_run else 'corrected'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {len(accounts)} accounts; {len(drifted)} {verb}.'
+        ))
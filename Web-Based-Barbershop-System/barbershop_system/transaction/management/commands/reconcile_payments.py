@@ -0,0 +1,87 @@
+"""
+Check payments against the transaction log and invoices
+"""
+import csv
+import json
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from barbershop_system.routers import use_replica
+from transaction.models import ReconciliationRun
+from transaction.reconciliation import REPORT_FIELDS, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Report payments whose transaction log or invoice disagrees with them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+        parser.add_argument('--output', help='Report file; defaults to standard output')
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only check bookings changed since the last finished run'
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['incremental']:
+            last_run = ReconciliationRun.objects.filter(finished_at__isnull=False).first()
+            since = last_run.started_at if last_run else None
+        # Saved once finished, so the run itself writes nothing before the replica reads
+        run = ReconciliationRun(started_at=timezone.now(), since=since)
+
+        if options['output']:
+            output = open(options['output'], 'w', newline='')
+        else:
+            output = self.stdout
+            output.ending = ''
+        try:
+            writer = CsvReport(output) if options['format'] == 'csv' else JsonReport(output)
+            with use_replica():
+                for _, problems in reconcile(since, options['chunk_size']):
+                    run.bookings_checked += 1
+                    for problem in problems:
+                        run.discrepancies += 1
+                        writer.write(problem)
+            writer.close()
+        finally:
+            if options['output']:
+                output.close()
+
+        run.finished_at = timezone.now()
+        run.save()
+        self.stderr.write(
+            f'Checked {run.bookings_checked} bookings; {run.discrepancies} discrepancies.'
+        )
+
+
+class CsvReport:
+
+    def __init__(self, output):
+        self.writer = csv.writer(output)
+        self.writer.writerow(REPORT_FIELDS)
+
+    def write(self, problem):
+        self.writer.writerow(problem)
+
+    def close(self):
+        pass
+
+
+class JsonReport:
+    """Writes a JSON array one item at a time so the report is never held in memory"""
+
+    def __init__(self, output):
+        self.output = output
+        self.count = 0
+        output.write('[')
+
+    def write(self, problem):
+        self.output.write((',\n' if self.count else '\n') + json.dumps(problem._asdict(), default=str))
+        self.count += 1
+
+    def close(self):
+        self.output.write('\n]\n' if self.count else ']\n')
@@ -0,0 +1,14 @@
+"""
+Queue another charge for payments stuck in 'processing'
+"""
+from django.core.management.base import BaseCommand
+
+from transaction.jobs import enqueue_stalled_payments
+
+
+class Command(BaseCommand):
+    help = 'Queue payment jobs for charges left processing by a worker that died'
+
+    def handle(self, *args, **options):
+        queued = enqueue_stalled_payments()
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} stalled payments.'))
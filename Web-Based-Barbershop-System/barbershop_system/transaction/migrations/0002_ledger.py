@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('account_type', models.CharField(choices=[('asset', 'Asset'), ('liability', 'Liability'), ('equity', 'Equity'), ('revenue', 'Revenue'), ('expense', 'Expense')], max_length=20)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'ledger_accounts',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='JournalEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('payment', 'Payment'), ('refund', 'Refund'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('entry_date', models.DateField(default=django.utils.timezone.localdate)),
+                ('description', models.TextField(blank=True)),
+                ('idempotency_key', models.CharField(blank=True, max_length=200, null=True, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='journal_entries', to='transaction.payment')),
+                ('posted_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='journal_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'journal entries',
+                'db_table': 'journal_entries',
+                'ordering': ['-entry_date', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AccountDailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('debit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('credit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_balances', to='transaction.ledgeraccount')),
+            ],
+            options={
+                'db_table': 'ledger_daily_balances',
+                'ordering': ['account', 'date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('debit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('credit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lines', to='transaction.ledgeraccount')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='transaction.journalentry')),
+            ],
+            options={
+                'db_table': 'ledger_lines',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['entry_date'], name='journal_ent_entry_d_8a53f9_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='accountdailybalance',
+            constraint=models.UniqueConstraint(fields=('account', 'date'), name='ledger_daily_balance_once'),
+        ),
+    ]
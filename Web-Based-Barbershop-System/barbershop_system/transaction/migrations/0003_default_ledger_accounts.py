@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+DEFAULT_ACCOUNTS = [
+    ('cash', 'Cash and bank', 'asset'),
+    ('receivable', 'Accounts receivable', 'asset'),
+    ('revenue', 'Service revenue', 'revenue'),
+    ('discounts', 'Discounts given', 'expense'),
+    ('tax_payable', 'Sales tax payable', 'liability'),
+    ('write_offs', 'Write-offs', 'expense'),
+]
+
+
+def create_accounts(apps, schema_editor):
+    LedgerAccount = apps.get_model('transaction', 'LedgerAccount')
+    for code, name, account_type in DEFAULT_ACCOUNTS:
+        LedgerAccount.objects.get_or_create(code=code, defaults={'name': name, 'account_type': account_type})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0002_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_accounts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0003_default_ledger_accounts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('prefix', models.CharField(default='INV-', max_length=20)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'db_table': 'invoice_sequences',
+            },
+        ),
+    ]
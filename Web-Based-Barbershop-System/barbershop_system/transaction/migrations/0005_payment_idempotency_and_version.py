@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0004_invoice_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=200, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaction', '0005_payment_idempotency_and_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('since', models.DateTimeField(blank=True, null=True)),
+                ('bookings_checked', models.PositiveIntegerField(default=0)),
+                ('discrepancies', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'reconciliation_runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
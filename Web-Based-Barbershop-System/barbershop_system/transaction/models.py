@@ -1,8 +1,27 @@
+from decimal import ROUND_HALF_UP, Decimal
+
 from django.db import models
+from django.db import transaction as db_transaction
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator
+from background.outbox import publish
 from booking_management.models import Booking
 
+CENT = Decimal('0.01')
+
+
+class PaymentError(Exception):
+    pass
+
+
+class InvalidPaymentTransition(PaymentError):
+    pass
+
+
+class PaymentConflict(PaymentError):
+    """Another process changed the payment first"""
+
 
 class Payment(models.Model):
     """Payment transactions"""
@@ -24,6 +43,16 @@ class Payment(models.Model):
         ('refunded', 'Refunded'),
     ]
 
+    # Allowed status changes; pending payments may be completed directly
+    # when paid at the counter, failed ones may be retried and a charge
+    # whose worker died may be picked up again
+    TRANSITIONS = {
+        'pending': {'processing', 'completed', 'failed'},
+        'processing': {'processing', 'completed', 'failed'},
+        'failed': {'processing'},
+        'completed': {'refunded'},
+    }
+
     booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='payment')
     amount = models.DecimalField(
         max_digits=10,
@@ -33,6 +62,8 @@ class Payment(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     transaction_id = models.CharField(max_length=200, unique=True, blank=True, null=True)
+    idempotency_key = models.CharField(max_length=200, unique=True, blank=True, null=True)
+    version = models.PositiveIntegerField(default=0)
     payment_date = models.DateTimeField(null=True, blank=True)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -49,24 +80,89 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment #{self.id} - {self.booking} - ${self.amount}"
 
-    def mark_completed(self):
+    def mark_processing(self):
+        """Mark payment as sent to the gateway"""
+        with db_transaction.atomic():
+            previous_status = self._transition('processing')
+            self._publish('payment.processing', previous_status)
+
+    def mark_completed(self, transaction_id=None):
         """Mark payment as completed"""
-        from django.utils import timezone
-        self.status = 'completed'
-        self.payment_date = timezone.now()
-        self.save()
+        fields = {'payment_date': timezone.now()}
+        if transaction_id:
+            fields['transaction_id'] = transaction_id
+        with db_transaction.atomic():
+            previous_status = self._transition('completed', **fields)
+            from .ledger import record_payment
+            record_payment(self)
+            self._log('payment', self.amount, f'PAY-{self.pk}', 'Payment received')
+            Invoice.objects.filter(booking_id=self.booking_id, is_paid=False).update(
+                is_paid=True, paid_date=self.payment_date, updated_at=self.payment_date
+            )
+            self._publish('payment.completed', previous_status)
 
-    def mark_failed(self, reason=''):
-        """Mark payment as failed"""
-        self.status = 'failed'
-        self.notes = reason
-        self.save()
+    def mark_failed(self, reason='', idempotency_key=None):
+        """Mark payment as failed; a new ``idempotency_key`` makes the next charge a new attempt"""
+        fields = {'notes': reason}
+        if idempotency_key:
+            fields['idempotency_key'] = idempotency_key
+        with db_transaction.atomic():
+            previous_status = self._transition('failed', **fields)
+            self._publish('payment.failed', previous_status, reason=reason)
 
     def refund(self, reason=''):
         """Process refund"""
-        self.status = 'refunded'
-        self.notes = f"Refunded: {reason}"
-        self.save()
+        with db_transaction.atomic():
+            previous_status = self._transition('refunded', notes=f"Refunded: {reason}")
+            from .ledger import record_refund
+            record_refund(self, reason)
+            self._log('refund', -self.amount, f'REF-{self.pk}', f"Refund: {reason}".rstrip(': '))
+            self._publish('payment.refunded', previous_status, reason=reason)
+
+    def _log(self, transaction_type, amount, reference_number, description):
+        Transaction.objects.create(
+            payment=self,
+            transaction_type=transaction_type,
+            amount=amount,
+            reference_number=reference_number,
+            description=description,
+        )
+
+    def _transition(self, status, **fields):
+        """
+        Move to ``status`` and return the previous status.
+
+        The row is only updated if its version still matches the one this
+        instance was loaded with, so concurrent updates cannot overwrite
+        each other.
+        """
+        if status not in self.TRANSITIONS.get(self.status, ()):
+            raise InvalidPaymentTransition(
+                f"Payment #{self.pk} cannot go from {self.status} to {status}"
+            )
+        fields['status'] = status
+        fields['updated_at'] = timezone.now()
+        updated = Payment.objects.filter(pk=self.pk, version=self.version).update(
+            version=models.F('version') + 1, **fields
+        )
+        if not updated:
+            raise PaymentConflict(f"Payment #{self.pk} was changed concurrently")
+        previous_status = self.status
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.version += 1
+        return previous_status
+
+    def _publish(self, event_type, previous_status, **extra):
+        """Record the status change in the outbox (same transaction)"""
+        publish(event_type, self, {
+            'payment_id': self.pk,
+            'booking_id': self.booking_id,
+            'amount': str(self.amount),
+            'previous_status': previous_status,
+            'status': self.status,
+            **extra,
+        })
 
     @property
     def is_paid(self):
@@ -114,6 +210,23 @@ class Transaction(models.Model):
         return f"{self.get_transaction_type_display()} - ${self.amount} - {self.reference_number}"
 
 
+class InvoiceSequence(models.Model):
+    """Gap-free counter for invoice numbers"""
+
+    name = models.CharField(max_length=50, unique=True)
+    prefix = models.CharField(max_length=20, default='INV-')
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        db_table = 'invoice_sequences'
+
+    def __str__(self):
+        return f"{self.name} (next {self.prefix}{self.next_value})"
+
+    def format(self, value):
+        return f"{self.prefix}{value:06d}"
+
+
 class Invoice(models.Model):
     """Invoice for bookings"""
 
@@ -141,13 +254,144 @@ class Invoice(models.Model):
 
     def calculate_total(self):
         """Calculate total amount including tax and discount"""
-        self.tax_amount = self.subtotal * (self.tax_rate / 100)
-        self.total = self.subtotal + self.tax_amount - self.discount
+        self.tax_amount, self.total = self.compute_totals(self.subtotal, self.tax_rate, self.discount)
         return self.total
 
+    @staticmethod
+    def compute_totals(subtotal, tax_rate, discount=Decimal('0.00')):
+        """Return (tax_amount, total) rounded half-up to cents"""
+        subtotal, tax_rate, discount = Decimal(subtotal), Decimal(tax_rate), Decimal(discount)
+        tax_amount = (subtotal * tax_rate / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        return tax_amount, subtotal + tax_amount - discount
+
     def mark_paid(self):
         """Mark invoice as paid"""
-        from django.utils import timezone
         self.is_paid = True
         self.paid_date = timezone.now()
         self.save()
+
+
+class LedgerAccount(models.Model):
+    """Ledger account holding a running balance in its normal direction"""
+
+    ACCOUNT_TYPE_CHOICES = [
+        ('asset', 'Asset'),
+        ('liability', 'Liability'),
+        ('equity', 'Equity'),
+        ('revenue', 'Revenue'),
+        ('expense', 'Expense'),
+    ]
+    DEBIT_NORMAL_TYPES = ('asset', 'expense')
+
+    code = models.SlugField(max_length=50, unique=True)
+    name = models.CharField(max_length=100)
+    account_type = models.CharField(max_length=20, choices=ACCOUNT_TYPE_CHOICES)
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'ledger_accounts'
+        ordering = ['code']
+
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
+    @property
+    def is_debit_normal(self):
+        return self.account_type in self.DEBIT_NORMAL_TYPES
+
+    def signed(self, debit, credit):
+        """Change in balance caused by a debit/credit pair"""
+        return debit - credit if self.is_debit_normal else credit - debit
+
+
+class JournalEntry(models.Model):
+    """Balanced set of ledger lines posted together"""
+
+    ENTRY_TYPE_CHOICES = [
+        ('payment', 'Payment'),
+        ('refund', 'Refund'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPE_CHOICES)
+    entry_date = models.DateField(default=timezone.localdate)
+    description = models.TextField(blank=True)
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.PROTECT,
+        related_name='journal_entries',
+        null=True,
+        blank=True
+    )
+    idempotency_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    posted_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='journal_entries'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'journal_entries'
+        ordering = ['-entry_date', '-id']
+        verbose_name_plural = 'journal entries'
+        indexes = [
+            models.Index(fields=['entry_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_entry_type_display()} entry #{self.pk} - {self.entry_date}"
+
+
+class LedgerLine(models.Model):
+    """One debit or credit of a journal entry"""
+
+    entry = models.ForeignKey(JournalEntry, on_delete=models.CASCADE, related_name='lines')
+    account = models.ForeignKey(LedgerAccount, on_delete=models.PROTECT, related_name='lines')
+    debit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    credit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'ledger_lines'
+
+    def __str__(self):
+        return f"{self.account.code}: Dr {self.debit} / Cr {self.credit}"
+
+
+class AccountDailyBalance(models.Model):
+    """Per-day debit and credit totals of an account, maintained on posting"""
+
+    account = models.ForeignKey(LedgerAccount, on_delete=models.CASCADE, related_name='daily_balances')
+    date = models.DateField()
+    debit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    credit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'ledger_daily_balances'
+        ordering = ['account', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'date'], name='ledger_daily_balance_once'),
+        ]
+
+    def __str__(self):
+        return f"{self.account.code} {self.date}: Dr {self.debit} / Cr {self.credit}"
+
+
+class ReconciliationRun(models.Model):
+    """A run of the payment reconciliation, used as the start of the next incremental run"""
+
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    since = models.DateTimeField(null=True, blank=True)
+    bookings_checked = models.PositiveIntegerField(default=0)
+    discrepancies = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'reconciliation_runs'
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Reconciliation {self.started_at:%Y-%m-%d %H:%M} ({self.discrepancies} discrepancies)"
@@ -0,0 +1,103 @@
+"""
+Payment processing
+
+Checkout only records a pending payment for the booking's invoice total
+and queues a ``payment.process`` job, so a slow gateway never holds up the
+request. The job sends the charge with the payment's idempotency key; a
+timed-out charge is marked failed and retried by the job queue, and the
+gateway returns the original result for the repeated key. A declined
+charge gets a new key, so retrying it (perhaps with another payment
+method) is a new attempt rather than a replay of the decline.
+
+A charge left 'processing' by a worker that died is picked up again once
+PROCESSING_LEASE has passed, with the same key, so it is never charged
+twice.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .gateways import GatewayError, gateway_settings, get_gateway
+from .invoicing import issue_invoice
+from .models import Payment, PaymentConflict
+
+# Well beyond the gateway timeout, so a live worker is never overtaken
+PROCESSING_LEASE = timedelta(minutes=5)
+
+
+def _attempt_key(payment):
+    """Idempotency key for the charge after a decline"""
+    return f"{payment.idempotency_key.partition('#')[0]}#{payment.version + 1}"
+
+
+def start_payment(booking, method, idempotency_key=None):
+    """
+    Return the booking's payment, creating a pending one on first checkout.
+
+    A client's idempotency key is scoped to the booking, as keys from
+    different clients may repeat. Checking out again after a failure
+    switches the payment to ``method``.
+    """
+    payment = Payment.objects.filter(booking=booking).first()
+    if payment is not None:
+        if payment.status == 'failed' and payment.payment_method != method:
+            updated = Payment.objects.filter(pk=payment.pk, version=payment.version).update(
+                payment_method=method, version=payment.version + 1, updated_at=timezone.now()
+            )
+            if updated:
+                payment.payment_method, payment.version = method, payment.version + 1
+        return payment
+    invoice = issue_invoice(booking)
+    try:
+        with transaction.atomic():
+            return Payment.objects.create(
+                booking=booking,
+                amount=invoice.total,
+                payment_method=method,
+                idempotency_key=f'booking:{booking.pk}:{idempotency_key}' if idempotency_key
+                else f'booking:{booking.pk}',
+            )
+    except IntegrityError:
+        # A concurrent checkout (or a replayed request) created it first
+        return Payment.objects.get(booking=booking)
+
+
+def process_payment(payment_id, gateway=None, timeout=None):
+    """
+    Charge a pending, failed or stalled payment through the gateway.
+
+    Raises GatewayError when the gateway times out or is unreachable so
+    the caller can retry; declines are final and only mark the payment
+    failed.
+    """
+    payment = Payment.objects.get(pk=payment_id)
+    stalled = payment.status == 'processing' and payment.updated_at < timezone.now() - PROCESSING_LEASE
+    if payment.status not in ('pending', 'failed') and not stalled:
+        return payment
+    try:
+        payment.mark_processing()
+    except PaymentConflict:
+        # Another worker picked it up
+        return payment
+
+    gateway = gateway or get_gateway()
+    timeout = timeout or gateway_settings()['TIMEOUT']
+    try:
+        result = gateway.charge(payment.amount, payment.payment_method, payment.idempotency_key, timeout=timeout)
+    except GatewayError as exc:
+        payment.mark_failed(f'Gateway error: {exc!r}')
+        raise GatewayError(f'Charging payment #{payment.pk} failed') from exc
+
+    if result.success:
+        payment.mark_completed(result.transaction_id)
+    else:
+        payment.mark_failed(result.message, idempotency_key=_attempt_key(payment))
+    return payment
+
+
+def stalled_payments(now=None):
+    """Payments left 'processing' longer than PROCESSING_LEASE"""
+    return Payment.objects.filter(
+        status='processing', updated_at__lt=(now or timezone.now()) - PROCESSING_LEASE
+    )
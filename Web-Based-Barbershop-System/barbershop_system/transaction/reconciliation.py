@@ -0,0 +1,136 @@
+"""
+Payment reconciliation
+
+Payments, transaction-log totals and invoices are each streamed ordered by
+booking id and merge-joined in one pass, so memory use does not grow with
+the size of the history. Each booking is checked for missing rows,
+mismatched amounts and statuses that disagree.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db.models import DecimalField, Exists, OuterRef, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Invoice, Payment, Transaction
+
+Discrepancy = namedtuple('Discrepancy', ['booking_id', 'kind', 'expected', 'actual', 'detail'])
+
+REPORT_FIELDS = Discrepancy._fields
+ZERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def changed_since(since, booking_ref):
+    """Condition matching rows whose booking had a payment, invoice or transaction change after ``since``"""
+    return (
+        Exists(Payment.objects.filter(booking_id=OuterRef(booking_ref), updated_at__gt=since))
+        | Exists(Invoice.objects.filter(booking_id=OuterRef(booking_ref), updated_at__gt=since))
+        | Exists(Transaction.objects.filter(payment__booking_id=OuterRef(booking_ref), created_at__gt=since))
+    )
+
+
+def payment_stream(since=None, chunk_size=2000):
+    payments = Payment.objects.order_by('booking_id')
+    if since:
+        payments = payments.filter(changed_since(since, 'booking_id'))
+    return payments.values_list('booking_id', 'id', 'amount', 'status').iterator(chunk_size=chunk_size)
+
+
+def transaction_stream(since=None, chunk_size=2000):
+    """Per-booking totals of the transaction log"""
+    transactions = Transaction.objects.filter(payment__isnull=False)
+    if since:
+        transactions = transactions.filter(changed_since(since, 'payment__booking_id'))
+    return (
+        transactions.values_list('payment__booking_id')
+        .annotate(
+            paid=Coalesce(Sum('amount', filter=Q(transaction_type='payment')), ZERO),
+            refunded=Coalesce(Sum('amount', filter=Q(transaction_type='refund')), ZERO),
+            adjusted=Coalesce(Sum('amount', filter=Q(transaction_type='adjustment')), ZERO),
+        )
+        .order_by('payment__booking_id')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def invoice_stream(since=None, chunk_size=2000):
+    invoices = Invoice.objects.order_by('booking_id')
+    if since:
+        invoices = invoices.filter(changed_since(since, 'booking_id'))
+    return invoices.values_list('booking_id', 'invoice_number', 'total', 'is_paid').iterator(chunk_size=chunk_size)
+
+
+def merge_join(*streams):
+    """
+    Walk streams of rows sorted by their first column together.
+
+    Yields ``(key, rows)`` where ``rows`` holds each stream's row for the
+    key, or None where a stream has no row. Keys must be unique per stream.
+    """
+    iterators = [iter(stream) for stream in streams]
+    heads = [next(iterator, None) for iterator in iterators]
+    while any(head is not None for head in heads):
+        key = min(head[0] for head in heads if head is not None)
+        rows = []
+        for index, head in enumerate(heads):
+            if head is not None and head[0] == key:
+                rows.append(head)
+                heads[index] = next(iterators[index], None)
+            else:
+                rows.append(None)
+        yield key, rows
+
+
+def check_booking(booking_id, payment, totals, invoice):
+    """Return the discrepancies for one booking's payment, transaction totals and invoice"""
+    problems = []
+
+    def report(kind, expected, actual, detail):
+        problems.append(Discrepancy(booking_id, kind, expected, actual, detail))
+
+    if payment is None:
+        if totals is not None:
+            report('missing_payment', 'payment', 'none', 'Transactions logged without a payment')
+        if invoice is not None and invoice[3]:
+            report('status_drift', 'unpaid', 'paid', f'Invoice {invoice[1]} is paid but has no payment')
+        return problems
+
+    _, payment_id, amount, status = payment
+    paid, refunded, adjusted = totals[1:] if totals is not None else (Decimal(0), Decimal(0), Decimal(0))
+    settled = status in ('completed', 'refunded')
+
+    if settled and totals is None:
+        report('missing_transaction', amount, 'none', f'Payment #{payment_id} is {status} but nothing was logged')
+    elif settled and paid != amount:
+        report('amount_mismatch', amount, paid, f'Payment #{payment_id} logged amount differs')
+    elif not settled and paid:
+        report('status_drift', status, 'logged', f'Payment #{payment_id} is {status} but a payment was logged')
+    if status == 'refunded' and refunded + amount != 0:
+        report('amount_mismatch', -amount, refunded, f'Payment #{payment_id} refund amount differs')
+
+    if invoice is None:
+        if status == 'completed':
+            report('missing_invoice', 'invoice', 'none', f'Payment #{payment_id} has no invoice')
+        return problems
+
+    _, invoice_number, total, is_paid = invoice
+    if status == 'completed' and total != amount + adjusted:
+        report('amount_mismatch', total, amount + adjusted, f'Invoice {invoice_number} total differs from payment')
+    if status == 'completed' and not is_paid:
+        report('status_drift', 'paid', 'unpaid', f'Invoice {invoice_number} is not marked paid')
+    elif status not in ('completed', 'refunded') and is_paid:
+        report('status_drift', 'unpaid', 'paid', f'Invoice {invoice_number} is paid but payment is {status}')
+    return problems
+
+
+def reconcile(since=None, chunk_size=2000):
+    """
+    Yield ``(booking_id, discrepancies)`` for every booking with a payment,
+    logged transaction or invoice, optionally only those changed after ``since``.
+    """
+    for booking_id, (payment, totals, invoice) in merge_join(
+        payment_stream(since, chunk_size),
+        transaction_stream(since, chunk_size),
+        invoice_stream(since, chunk_size),
+    ):
+        yield booking_id, check_booking(booking_id, payment, totals, invoice)
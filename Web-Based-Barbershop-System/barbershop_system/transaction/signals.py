@@ -0,0 +1,21 @@
+"""
+Signal handlers keeping cached revenue in step with the transaction log
+"""
+from datetime import datetime, time
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from barbershop_system.caching import invalidate
+from .analytics import CACHE_NAMESPACE
+from .models import Transaction
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def transaction_changed(sender, instance, **kwargs):
+    """New rows land in today's open bucket; editing or deleting older ones changes closed buckets"""
+    today = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    if instance.created_at and instance.created_at < today:
+        invalidate(CACHE_NAMESPACE)
@@ -1,3 +1,454 @@
-from django.test import TestCase
+import csv
+import json
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from background.models import Job
+from booking_management.models import Booking, Customer, Service
+from security_management.models import User
+from . import ledger
+from .analytics import buckets_between, revenue_by_bucket, revenue_chart_data
+from .gateways import FakeGateway, GatewayError
+from .invoicing import allocate_numbers, generate_invoices
+from .jobs import enqueue_stalled_payments
+from .payments import PROCESSING_LEASE, process_payment, start_payment
+from .reconciliation import merge_join
+from .models import (
+    AccountDailyBalance, InvalidPaymentTransition, Invoice, JournalEntry, LedgerAccount, Payment,
+    PaymentConflict, ReconciliationRun, Transaction,
+)
+
+
+class LedgerTests(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(
+            first_name='Jo', last_name='Reyes', email='jo@example.com', phone_number='1'
+        )
+        service = Service.objects.create(
+            name='Shave', description='', duration_minutes=30, price=Decimal('25.00')
+        )
+        self.booking = Booking.objects.create(
+            customer=customer, service=service,
+            booking_date=date.today() + timedelta(days=1), booking_time=time(9, 0)
+        )
+        self.payment = Payment.objects.create(
+            booking=self.booking, amount=Decimal('27.00'), payment_method='cash'
+        )
+
+    def test_payment_posts_balanced_entry(self):
+        self.payment.mark_completed()
+        entry = JournalEntry.objects.get()
+        lines = list(entry.lines.all())
+        self.assertEqual(sum(line.debit for line in lines), sum(line.credit for line in lines))
+        self.assertEqual(ledger.balance(ledger.CASH), Decimal('27.00'))
+        self.assertEqual(ledger.balance(ledger.REVENUE), Decimal('27.00'))
+
+    def test_invoice_splits_tax_and_discount(self):
+        Invoice.objects.create(
+            booking=self.booking, invoice_number='INV-1', due_date=date.today(),
+            subtotal=Decimal('25.00'), tax_amount=Decimal('4.00'), discount=Decimal('2.00'),
+            total=Decimal('27.00')
+        )
+        self.payment.mark_completed()
+        self.assertEqual(ledger.balance(ledger.REVENUE), Decimal('25.00'))
+        self.assertEqual(ledger.balance(ledger.TAX_PAYABLE), Decimal('4.00'))
+        self.assertEqual(ledger.balance(ledger.DISCOUNTS), Decimal('2.00'))
+        self.assertEqual(ledger.net_revenue(), Decimal('23.00'))
+
+    def test_refund_reverses_payment(self):
+        self.payment.mark_completed()
+        self.payment.refund('Cancelled')
+        self.assertEqual(ledger.balance(ledger.CASH), 0)
+        self.assertEqual(ledger.net_revenue(), 0)
+        self.assertEqual(ledger.net_revenue(date.today(), date.today()), 0)
+        self.assertEqual(JournalEntry.objects.filter(entry_type='refund').count(), 1)
+
+    def test_unpaid_payment_cannot_be_refunded(self):
+        with self.assertRaises(InvalidPaymentTransition):
+            self.payment.refund('Never charged')
+        self.assertFalse(JournalEntry.objects.exists())
+
+    def test_posting_is_idempotent(self):
+        self.payment.mark_completed()
+        ledger.record_payment(self.payment)
+        self.assertEqual(JournalEntry.objects.count(), 1)
+        self.assertEqual(ledger.balance(ledger.CASH), Decimal('27.00'))
+
+    def test_unbalanced_entry_is_rejected(self):
+        with self.assertRaises(ledger.UnbalancedEntry):
+            ledger.post('adjustment', [ledger.debit(ledger.CASH, 5), ledger.credit(ledger.REVENUE, 4)])
+        self.assertFalse(JournalEntry.objects.exists())
+
+    def test_revenue_by_period_reads_daily_totals(self):
+        yesterday = date.today() - timedelta(days=1)
+        ledger.post('adjustment', [ledger.debit(ledger.CASH, 10), ledger.credit(ledger.REVENUE, 10)],
+                    entry_date=yesterday)
+        self.payment.mark_completed()
+        self.assertEqual(AccountDailyBalance.objects.filter(account__code=ledger.REVENUE).count(), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(ledger.net_revenue(date.today(), date.today()), Decimal('27.00'))
+        self.assertEqual(ledger.net_revenue(yesterday), Decimal('37.00'))
+
+    def test_rebuild_corrects_drifted_balances(self):
+        self.payment.mark_completed()
+        LedgerAccount.objects.filter(code=ledger.CASH).update(balance=Decimal('1.00'))
+        AccountDailyBalance.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_ledger_balances', stdout=out)
+        self.assertIn('1 corrected', out.getvalue())
+        self.assertEqual(ledger.balance(ledger.CASH), Decimal('27.00'))
+        self.assertEqual(ledger.net_revenue(date.today()), Decimal('27.00'))
+
+
+class BatchInvoicingTests(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(
+            first_name='Kim', last_name='Lee', email='kim@example.com', phone_number='1'
+        )
+        self.service = Service.objects.create(
+            name='Cut', description='', duration_minutes=30, price=Decimal('19.99')
+        )
+        self.today = date.today()
+        self.bookings = []
+        for hour in range(9, 14):
+            booking = Booking.objects.create(
+                customer=customer, service=self.service,
+                booking_date=self.today, booking_time=time(hour, 0)
+            )
+            booking.complete()
+            self.bookings.append(booking)
+        Booking.objects.create(
+            customer=customer, service=self.service,
+            booking_date=self.today, booking_time=time(15, 0)
+        )
+
+    def test_invoices_completed_bookings_once(self):
+        self.assertEqual(generate_invoices(self.today, self.today, tax_rate='8.25', chunk_size=2), 5)
+        self.assertEqual(generate_invoices(self.today, self.today, chunk_size=2), 0)
+
+        invoice = Invoice.objects.get(booking=self.bookings[0])
+        self.assertEqual(invoice.tax_amount, Decimal('1.65'))
+        self.assertEqual(invoice.total, Decimal('21.64'))
+        self.assertEqual(invoice.due_date, self.today + timedelta(days=14))
+
+    def test_invoice_numbers_are_gap_free(self):
+        generate_invoices(self.today, self.today, chunk_size=2)
+        Booking.objects.create(
+            customer=self.bookings[0].customer, service=self.service,
+            booking_date=self.today, booking_time=time(16, 0)
+        ).complete()
+        call_command('generate_invoices', start=self.today.isoformat(), stdout=StringIO())
+        self.assertEqual(
+            sorted(Invoice.objects.values_list('invoice_number', flat=True)),
+            [f'INV-{n:06d}' for n in range(1, 7)]
+        )
+
+    def test_failed_chunk_releases_its_numbers(self):
+        try:
+            with transaction.atomic():
+                allocate_numbers(3)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(allocate_numbers(1), ['INV-000001'])
+
+    def test_calculate_total_rounds_to_cents(self):
+        invoice = Invoice(subtotal=Decimal('19.99'), tax_rate=Decimal('8.25'), discount=Decimal('1.00'))
+        self.assertEqual(invoice.calculate_total(), Decimal('20.64'))
+        self.assertEqual(invoice.tax_amount, Decimal('1.65'))
+
+
+class PaymentPipelineTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('lena', password='pw', role='customer')
+        customer = Customer.objects.create(
+            user=self.user, first_name='Lena', last_name='Ortiz', email='lena@example.com', phone_number='1'
+        )
+        service = Service.objects.create(
+            name='Beard trim', description='', duration_minutes=15, price=Decimal('15.00')
+        )
+        self.booking = Booking.objects.create(
+            customer=customer, service=service,
+            booking_date=date.today() + timedelta(days=1), booking_time=time(11, 0)
+        )
+        self.gateway = FakeGateway()
+
+    def _process(self, payment, **kwargs):
+        process_payment(payment.pk, gateway=self.gateway, **kwargs)
+        payment.refresh_from_db()
+        return payment
+
+    def test_successful_charge(self):
+        payment = self._process(start_payment(self.booking, 'credit_card'))
+        self.assertEqual(payment.status, 'completed')
+        self.assertTrue(payment.transaction_id.startswith('fake_'))
+        self.assertEqual(ledger.balance(ledger.CASH), Decimal('15.00'))
+
+    def test_declined_charge(self):
+        self.gateway.decline_methods.add('paypal')
+        payment = self._process(start_payment(self.booking, 'paypal'))
+        self.assertEqual(payment.status, 'failed')
+        self.assertEqual(payment.notes, 'Card declined')
+
+    def test_timed_out_charge_is_retried_with_same_key(self):
+        payment = start_payment(self.booking, 'credit_card')
+        self.gateway.latency = 0.2
+        with self.assertRaises(GatewayError):
+            self._process(payment, timeout=0.01)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+
+        self.gateway.latency = 0
+        payment = self._process(payment)
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(list(self.gateway.charges), [payment.idempotency_key])
+
+    def test_checkout_is_idempotent(self):
+        first = start_payment(self.booking, 'credit_card', idempotency_key='abc')
+        second = start_payment(self.booking, 'debit_card', idempotency_key='abc')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_client_keys_are_scoped_to_the_booking(self):
+        other = Booking.objects.create(
+            customer=self.booking.customer, service=self.booking.service,
+            booking_date=self.booking.booking_date, booking_time=time(14, 0)
+        )
+        first = start_payment(self.booking, 'credit_card', idempotency_key='abc')
+        second = start_payment(other, 'credit_card', idempotency_key='abc')
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(second.booking, other)
+
+    def test_retry_after_decline_is_a_new_attempt_with_the_new_method(self):
+        self.gateway.decline_methods.add('paypal')
+        payment = self._process(start_payment(self.booking, 'paypal'))
+        self.assertEqual(payment.status, 'failed')
+
+        payment = self._process(start_payment(self.booking, 'credit_card'))
+        self.assertEqual((payment.status, payment.payment_method), ('completed', 'credit_card'))
+        self.assertEqual(len(self.gateway.charges), 2)
+
+    def test_stalled_charge_is_picked_up_again_with_the_same_key(self):
+        payment = start_payment(self.booking, 'credit_card')
+        payment.mark_processing()
+        # A worker that is still within its lease is left alone
+        self.assertEqual(self._process(payment).status, 'processing')
+        self.assertEqual(enqueue_stalled_payments(), 0)
+
+        Payment.objects.filter(pk=payment.pk).update(updated_at=timezone.now() - PROCESSING_LEASE * 2)
+        self.assertEqual(enqueue_stalled_payments(), 1)
+        self.assertEqual(enqueue_stalled_payments(), 0)
+        payment = self._process(payment)
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(list(self.gateway.charges), [payment.idempotency_key])
+
+    @override_settings(INVOICE_TAX_RATE='12.00')
+    def test_checkout_charges_the_invoice_total_and_reconciles(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('payments:checkout', args=[self.booking.pk]), {'payment_method': 'credit_card'})
+        with mock.patch('transaction.payments.get_gateway', return_value=self.gateway):
+            call_command('run_jobs', once=True, concurrency=1, stdout=StringIO())
+
+        payment = Payment.objects.get()
+        invoice = Invoice.objects.get(booking=self.booking)
+        self.assertEqual((payment.status, payment.amount), ('completed', Decimal('16.80')))
+        self.assertEqual((invoice.total, invoice.is_paid), (Decimal('16.80'), True))
+        self.assertEqual(generate_invoices(self.booking.booking_date, self.booking.booking_date), 0)
+
+        out = StringIO()
+        call_command('reconcile_payments', format='json', stdout=out, stderr=StringIO())
+        self.assertEqual(json.loads(out.getvalue()), [])
+
+    def test_stale_instance_cannot_overwrite(self):
+        payment = start_payment(self.booking, 'cash')
+        stale = Payment.objects.get(pk=payment.pk)
+        payment.mark_completed()
+        with self.assertRaises(PaymentConflict):
+            stale.mark_failed('Too late')
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+
+    def test_checkout_view_queues_processing(self):
+        self.client.force_login(self.user)
+        url = reverse('payments:checkout', args=[self.booking.pk])
+        with mock.patch('transaction.payments.get_gateway') as get_gateway:
+            for _ in range(2):
+                response = self.client.post(url, {'payment_method': 'credit_card'}, HTTP_IDEMPOTENCY_KEY='k1')
+                self.assertRedirects(response, reverse('booking:booking_detail', args=[self.booking.pk]),
+                                     fetch_redirect_response=False)
+        get_gateway.assert_not_called()
+        payment = Payment.objects.get()
+        self.assertEqual(payment.idempotency_key, f'booking:{self.booking.pk}:k1')
+        self.assertEqual(Job.objects.filter(task='payment.process', args=[payment.pk]).count(), 1)
+
+        with mock.patch('transaction.payments.get_gateway', return_value=self.gateway):
+            call_command('run_jobs', once=True, concurrency=1, stdout=StringIO())
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+
+
+class ReconciliationTests(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(
+            first_name='Max', last_name='Fry', email='max@example.com', phone_number='1'
+        )
+        service = Service.objects.create(
+            name='Wash', description='', duration_minutes=20, price=Decimal('12.00')
+        )
+        self.bookings = [
+            Booking.objects.create(
+                customer=customer, service=service,
+                booking_date=date.today(), booking_time=time(9 + index, 0)
+            )
+            for index in range(4)
+        ]
+        for booking in self.bookings:
+            booking.complete()
+        generate_invoices(date.today(), date.today())
+        self.payments = [
+            Payment.objects.create(booking=booking, amount=Decimal('12.00'), payment_method='cash')
+            for booking in self.bookings
+        ]
+
+    def _report(self, **options):
+        out = StringIO()
+        call_command('reconcile_payments', format='json', stdout=out, stderr=StringIO(), **options)
+        return [(row['booking_id'], row['kind']) for row in json.loads(out.getvalue())]
+
+    def test_consistent_history_has_no_discrepancies(self):
+        for payment in self.payments:
+            payment.mark_completed()
+        self.payments[0].refund('Unhappy')
+        self.assertEqual(self._report(), [])
+
+    def test_discrepancies_are_reported(self):
+        for payment in self.payments:
+            payment.mark_completed()
+        Transaction.objects.filter(payment=self.payments[0]).delete()
+        Transaction.objects.filter(payment=self.payments[1]).update(amount=Decimal('10.00'))
+        Invoice.objects.filter(booking=self.bookings[2]).update(is_paid=False)
+        Invoice.objects.filter(booking=self.bookings[3]).delete()
+
+        self.assertEqual(self._report(), [
+            (self.bookings[0].pk, 'missing_transaction'),
+            (self.bookings[1].pk, 'amount_mismatch'),
+            (self.bookings[2].pk, 'status_drift'),
+            (self.bookings[3].pk, 'missing_invoice'),
+        ])
+
+    def test_csv_report(self):
+        Invoice.objects.filter(booking=self.bookings[0]).update(is_paid=True)
+        out = StringIO()
+        call_command('reconcile_payments', stdout=out, stderr=StringIO())
+        rows = list(csv.reader(StringIO(out.getvalue())))
+        self.assertEqual(rows[0], ['booking_id', 'kind', 'expected', 'actual', 'detail'])
+        self.assertEqual(rows[1][:4], [str(self.bookings[0].pk), 'status_drift', 'unpaid', 'paid'])
+
+    def test_incremental_run_checks_only_changed_bookings(self):
+        self.assertEqual(self._report(incremental=True), [])
+        self.assertEqual(ReconciliationRun.objects.get().bookings_checked, 4)
+
+        Invoice.objects.filter(booking=self.bookings[1]).update(is_paid=True, updated_at=timezone.now())
+        self.assertEqual(self._report(incremental=True), [(self.bookings[1].pk, 'status_drift')])
+        self.assertEqual(ReconciliationRun.objects.first().bookings_checked, 1)
+
+    def test_merge_join_aligns_sparse_streams(self):
+        self.assertEqual(
+            list(merge_join([(1, 'a'), (3, 'c')], [(2, 'x'), (3, 'y')])),
+            [(1, [(1, 'a'), None]), (2, [None, (2, 'x')]), (3, [(3, 'c'), (3, 'y')])]
+        )
+
+
+class RevenueAnalyticsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+        customer = Customer.objects.create(
+            first_name='Ned', last_name='Park', email='ned@example.com', phone_number='1'
+        )
+        self.cut = Service.objects.create(name='Cut', description='', duration_minutes=30, price=Decimal('20.00'))
+        self.shave = Service.objects.create(name='Shave', description='', duration_minutes=30, price=Decimal('10.00'))
+        self.customer = customer
+
+    def _paid(self, service, days_ago, hour):
+        booking = Booking.objects.create(
+            customer=self.customer, service=service,
+            booking_date=self.today - timedelta(days=days_ago), booking_time=time(hour, 0)
+        )
+        payment = Payment.objects.create(booking=booking, amount=service.price, payment_method='cash')
+        payment.mark_completed()
+        Transaction.objects.filter(payment=payment).update(
+            created_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return payment
+
+    def test_daily_buckets_fill_gaps(self):
+        self._paid(self.cut, 2, 9)
+        self._paid(self.shave, 2, 10)
+        self._paid(self.cut, 0, 9)
+        data = revenue_chart_data('day', self.today - timedelta(days=3), self.today)
+        self.assertEqual(len(data['labels']), 4)
+        self.assertEqual(data['datasets'][0]['data'], ['0.00', '30.00', '0.00', '20.00'])
+
+    def test_split_by_service_nets_refunds(self):
+        self._paid(self.cut, 1, 9)
+        self._paid(self.shave, 1, 10).refund('Nicked')
+        data = revenue_chart_data('day', self.today - timedelta(days=1), self.today, 'service')
+        by_label = {dataset['label']: dataset['data'] for dataset in data['datasets']}
+        self.assertEqual(by_label['Cut'][0], '20.00')
+        # The refund was logged today, so it lands in today's bucket
+        self.assertEqual(by_label['Shave'], ['10.00', '-10.00'])
+
+    def test_closed_buckets_stay_cached(self):
+        self._paid(self.cut, 3, 9)
+        start = self.today - timedelta(days=5)
+        revenue_by_bucket('day', start, self.today)
+        with self.assertNumQueries(1):  # only today's open bucket
+            revenue_by_bucket('day', start, self.today)
+        with self.assertNumQueries(0):
+            result = revenue_by_bucket('day', start, self.today - timedelta(days=1))
+        self.assertEqual(result[self.today - timedelta(days=3)], {'total': Decimal('20.00')})
+
+    def test_editing_an_old_transaction_refreshes_its_cached_bucket(self):
+        payment = self._paid(self.cut, 3, 9)
+        day = self.today - timedelta(days=3)
+        self.assertEqual(revenue_by_bucket('day', day, day)[day], {'total': Decimal('20.00')})
+
+        logged = Transaction.objects.get(payment=payment)
+        logged.amount = Decimal('18.00')
+        logged.save()
+        self.assertEqual(revenue_by_bucket('day', day, day)[day], {'total': Decimal('18.00')})
+
+        logged.delete()
+        self.assertEqual(revenue_by_bucket('day', day, day)[day], {})
+
+    def test_weekly_and_monthly_buckets(self):
+        self.assertEqual(buckets_between(date(2024, 1, 3), date(2024, 1, 15), 'week'),
+                         [date(2024, 1, 1), date(2024, 1, 8), date(2024, 1, 15)])
+        self.assertEqual(buckets_between(date(2024, 11, 20), date(2025, 1, 2), 'month'),
+                         [date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1)])
+
+    def test_endpoint_is_staff_only(self):
+        url = reverse('payments:revenue_data')
+        self.client.force_login(User.objects.create_user('cust', password='pw', role='customer'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_user('boss', password='pw', role='admin'))
+        response = self.client.get(url, {'granularity': 'week', 'dimension': 'barber'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['granularity'], 'week')
+        self.assertEqual(self.client.get(url, {'granularity': 'hour'}).status_code, 400)
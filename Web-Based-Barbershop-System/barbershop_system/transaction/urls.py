@@ -0,0 +1,12 @@
+"""
+URL configuration for transaction app
+"""
+from django.urls import path
+from . import views
+
+app_name = 'payments'
+
+urlpatterns = [
+    path('booking/<int:booking_id>/checkout/', views.checkout, name='checkout'),
+    path('analytics/revenue/', views.revenue_data, name='revenue_data'),
+]
@@ -1,3 +1,72 @@
-from django.shortcuts import render
+"""
+Views for transaction app
+"""
+from datetime import date, timedelta
 
-# Create your views here.
+from django.contrib import messages
+from django.http import JsonResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+
+from background.jobs import enqueue
+from booking_management.permissions import booking_access_required
+from security_management.decorators import login_required
+from security_management.principal import get_principal
+from .analytics import DIMENSIONS, GRANULARITIES, revenue_chart_data
+from .models import Payment
+from .payments import start_payment
+
+
+@require_POST
+@login_required
+@booking_access_required('pay for')
+def checkout(request, booking):
+    """Start paying for a booking; the charge itself runs in the background"""
+    payment_method = request.POST.get('payment_method', 'credit_card')
+    if payment_method not in dict(Payment.PAYMENT_METHOD_CHOICES):
+        messages.error(request, 'Please choose a valid payment method.')
+        return redirect('booking:booking_detail', booking_id=booking.id)
+    if booking.status == 'cancelled':
+        messages.error(request, 'Cancelled bookings cannot be paid.')
+        return redirect('booking:booking_detail', booking_id=booking.id)
+
+    payment = start_payment(
+        booking,
+        payment_method,
+        idempotency_key=request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key'),
+    )
+    if payment.status in ('pending', 'failed'):
+        # One job per payment version: a retry after failure queues a new one
+        enqueue('payment.process', payment.pk, dedupe_key=f'payment-process:{payment.pk}:{payment.version}')
+        messages.info(request, 'Your payment is being processed.')
+    elif payment.status == 'processing':
+        messages.info(request, 'Your payment is being processed.')
+    else:
+        messages.info(request, 'This booking has already been paid.')
+    return redirect('booking:booking_detail', booking_id=booking.id)
+
+
+@require_GET
+@login_required
+def revenue_data(request):
+    """Revenue series for the dashboard chart (staff only)"""
+    if not get_principal(request).is_staff_member:
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+
+    granularity = request.GET.get('granularity', 'day')
+    dimension = request.GET.get('dimension') or None
+    try:
+        end_date = date.fromisoformat(request.GET['end']) if 'end' in request.GET else timezone.localdate()
+        start_date = (
+            date.fromisoformat(request.GET['start']) if 'start' in request.GET
+            else end_date - timedelta(days=30)
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD.'}, status=400)
+    if granularity not in GRANULARITIES or dimension not in DIMENSIONS:
+        return JsonResponse({'error': 'Unknown granularity or dimension.'}, status=400)
+    if start_date > end_date or (end_date - start_date).days > 366 * 3:
+        return JsonResponse({'error': 'Choose a range of up to three years.'}, status=400)
+
+    return JsonResponse(revenue_chart_data(granularity, start_date, end_date, dimension))